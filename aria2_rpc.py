@@ -0,0 +1,400 @@
+import base64
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+from http_engine import DownloadCancelled, format_bytes
+
+# Fields the poller asks for; keeps tellActive responses small
+STATUS_KEYS = ['gid', 'status', 'totalLength', 'completedLength', 'downloadSpeed',
+               'errorCode', 'errorMessage', 'followedBy', 'files', 'bittorrent', 'dir']
+
+
+def is_torrent_url(url):
+    return url.startswith("magnet:") or url.endswith(".torrent")
+
+
+class Aria2Error(Exception):
+    def __init__(self, code, message):
+        super().__init__(f"aria2: {message}")
+        self.code = code
+
+
+class Aria2Client:
+    """Minimal aria2 JSON-RPC client over HTTP (urllib, no extra dependency)."""
+    def __init__(self, url='http://127.0.0.1:6800/jsonrpc', secret=None, timeout=10):
+        self.url = url
+        self.secret = secret
+        self.timeout = timeout
+        self.ids = itertools.count(1)
+
+    def _params(self, params):
+        return ([f"token:{self.secret}"] if self.secret else []) + list(params)
+
+    def _post(self, payload):
+        import urllib.request # only needed once aria2 is in use; the app imports this module at startup
+        request = urllib.request.Request(
+            self.url, data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def call(self, method, *params):
+        reply = self._post({'jsonrpc': '2.0', 'id': next(self.ids), 'method': method, 'params': self._params(params)})
+        if 'error' in reply:
+            raise Aria2Error(reply['error'].get('code'), reply['error'].get('message'))
+        return reply['result']
+
+    def multicall(self, calls):
+        """[(method, params), ...] in one HTTP round trip; each result is a value or an Aria2Error."""
+        if not calls:
+            return []
+        # The token goes inside each call; system.multicall itself takes none
+        batch = [{'methodName': method, 'params': self._params(params)} for method, params in calls]
+        reply = self._post({'jsonrpc': '2.0', 'id': next(self.ids), 'method': 'system.multicall', 'params': [batch]})
+        if 'error' in reply:
+            raise Aria2Error(reply['error'].get('code'), reply['error'].get('message'))
+        results = []
+        for item in reply['result']:
+            if isinstance(item, dict) and 'code' in item:
+                results.append(Aria2Error(item['code'], item.get('message')))
+            else:
+                results.append(item[0]) # successful results come wrapped in a list
+        return results
+
+    def get_version(self):
+        return self.call('aria2.getVersion')
+
+    def add_uri(self, uris, options=None):
+        return self.call('aria2.addUri', list(uris), options or {})
+
+    def add_torrent(self, torrent, options=None):
+        # aria2 wants the .torrent file's bytes base64 encoded
+        return self.call('aria2.addTorrent', base64.b64encode(torrent).decode('ascii'), [], options or {})
+
+    def tell_active(self, keys=STATUS_KEYS):
+        return self.call('aria2.tellActive', keys)
+
+    def tell_status(self, gid, keys=STATUS_KEYS):
+        return self.call('aria2.tellStatus', gid, keys)
+
+    def pause(self, gid):
+        return self.call('aria2.forcePause', gid)
+
+    def unpause(self, gid):
+        return self.call('aria2.unpause', gid)
+
+    def remove(self, gid):
+        return self.call('aria2.forceRemove', gid)
+
+    def shutdown(self):
+        return self.call('aria2.shutdown')
+
+
+class Aria2Daemon:
+    """
+    One long-lived aria2c with RPC enabled, so DHT, trackers and TLS state
+    survive between downloads. `session_path` lets aria2 restore unfinished
+    downloads (with their GIDs) after a restart.
+    """
+    def __init__(self, binary='aria2c', port=6800, secret=None, download_dir=None, session_path=None):
+        self.binary = binary
+        self.port = port
+        self.secret = secret or base64.b16encode(os.urandom(12)).decode('ascii').lower()
+        self.download_dir = download_dir
+        self.session_path = session_path
+        self.process = None
+        self.client = Aria2Client(f'http://127.0.0.1:{port}/jsonrpc', secret=self.secret)
+
+    def start(self, timeout=10):
+        cmd = [
+            self.binary,
+            '--enable-rpc=true',
+            f'--rpc-listen-port={self.port}',
+            '--rpc-listen-all=false',
+            f'--rpc-secret={self.secret}',
+            '--continue=true',
+            '--max-concurrent-downloads=5',
+            '--bt-save-metadata=true',
+            '--seed-time=0', # report torrents complete instead of seeding forever
+            '--quiet=true',
+        ]
+        if self.download_dir:
+            cmd.append(f'--dir={self.download_dir}')
+        if self.session_path:
+            if os.path.exists(self.session_path):
+                cmd.append(f'--input-file={self.session_path}')
+            cmd += [f'--save-session={self.session_path}', '--save-session-interval=30']
+        self.process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.client.get_version()
+                return self.client
+            except OSError:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"aria2c exited with code {self.process.returncode}")
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise
+                time.sleep(0.1)
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.client.shutdown() # lets aria2 write the session file
+            self.process.wait(5)
+        except Exception:
+            self.process.kill()
+        self.process = None
+
+
+class Aria2Backend:
+    """
+    Submits downloads to a running aria2 and maps its GIDs onto DBManager
+    task ids. A single poller thread fetches all active downloads with one
+    tellActive, then the remaining tracked GIDs (waiting, paused, finished)
+    with one system.multicall of tellStatus.
+    """
+    def __init__(self, client, db=None, poll_interval=0.5):
+        self.client = client
+        self.db = db
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.jobs = {} # gid: job dict, for downloads being watched
+        self.gids = {} # task_id: gid, kept while paused so a resume finds it
+        self.unsaved = set() # stand-in task ids of downloads without a DB row (see download)
+        self.thread = None
+        self.running = False
+        self.stats = {'polls': 0, 'rpc_requests': 0}
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._poll_loop, daemon=True, name="Aria2Poller")
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+
+    def add(self, task_id, url, folder, on_progress=None, on_complete=None, on_error=None):
+        """Queue url in aria2 (or resume this task's existing GID) and return the GID."""
+        options = {'dir': folder}
+        gid = self._known_gid(task_id)
+        if gid:
+            try:
+                status = self.client.tell_status(gid, ['status'])['status']
+                if status == 'paused':
+                    self.client.unpause(gid)
+                if status in ('paused', 'active', 'waiting'):
+                    self._track(gid, task_id, on_progress, on_complete, on_error)
+                    return gid
+            except Aria2Error:
+                pass # aria2 forgot it (no session file); start over
+
+        if url.endswith('.torrent') and os.path.exists(url):
+            with open(url, 'rb') as f:
+                gid = self.client.add_torrent(f.read(), options)
+        else:
+            # Magnets and .torrent URLs work through addUri too
+            gid = self.client.add_uri([url], options)
+        if self._saves(task_id):
+            self.db.set_aria2_gid(task_id, gid)
+        self._track(gid, task_id, on_progress, on_complete, on_error)
+        return gid
+
+    def _known_gid(self, task_id):
+        with self.lock:
+            if task_id in self.gids:
+                return self.gids[task_id]
+        if self._saves(task_id):
+            state = self.db.get_download_state(task_id)
+            if state and state.get('aria2_gid'):
+                return state['aria2_gid']
+        return None
+
+    def _saves(self, task_id):
+        return self.db is not None and task_id not in self.unsaved
+
+    def _track(self, gid, task_id, on_progress, on_complete, on_error):
+        with self.lock:
+            self.gids[task_id] = gid
+            self.jobs[gid] = {
+                'task_id': task_id,
+                'on_progress': on_progress,
+                'on_complete': on_complete,
+                'on_error': on_error,
+            }
+
+    def pause(self, task_id):
+        gid = self._known_gid(task_id)
+        if gid:
+            try:
+                self.client.pause(gid)
+            except Aria2Error as e:
+                print(f"aria2 pause {gid}: {e}")
+            with self.lock:
+                self.jobs.pop(gid, None)
+
+    def remove(self, task_id):
+        gid = self._known_gid(task_id)
+        if gid:
+            try:
+                self.client.remove(gid)
+            except Aria2Error:
+                pass
+            with self.lock:
+                self.jobs.pop(gid, None)
+                self.gids.pop(task_id, None)
+
+    def task_for(self, gid):
+        with self.lock:
+            job = self.jobs.get(gid)
+        return job['task_id'] if job else None
+
+    def download(self, task_id, url, folder, progress_callback=None, stop_event=None):
+        """
+        Blocking helper for worker threads: returns the file path, raises
+        DownloadCancelled on stop. task_id None is a download without a DB
+        row: nothing is stored for it and a stop removes it from aria2.
+        """
+        if task_id is None:
+            key = object()
+            with self.lock:
+                self.unsaved.add(key)
+            try:
+                return self._download(key, url, folder, progress_callback, stop_event, keep=False)
+            finally:
+                with self.lock:
+                    self.unsaved.discard(key)
+                    self.gids.pop(key, None)
+        return self._download(task_id, url, folder, progress_callback, stop_event, keep=True)
+
+    def _download(self, task_id, url, folder, progress_callback, stop_event, keep):
+        done = threading.Event()
+        outcome = {}
+
+        def complete(filepath, title):
+            outcome['filepath'] = filepath
+            done.set()
+
+        def error(message):
+            outcome['error'] = message
+            done.set()
+
+        self.add(task_id, url, folder, on_progress=progress_callback, on_complete=complete, on_error=error)
+        while not done.wait(0.2):
+            if stop_event is not None and stop_event.is_set():
+                if keep:
+                    self.pause(task_id) # kept in aria2 so the next start resumes it
+                else:
+                    self.remove(task_id)
+                raise DownloadCancelled()
+        if 'error' in outcome:
+            raise Exception(outcome['error'])
+        return outcome['filepath']
+
+    # --- Poller ---
+    def _poll_loop(self):
+        while self.running:
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"aria2 poll error: {e}")
+            time.sleep(self.poll_interval)
+
+    def poll(self):
+        with self.lock:
+            tracked = set(self.jobs)
+        if not tracked:
+            return
+        self.stats['polls'] += 1
+        statuses = {}
+        self.stats['rpc_requests'] += 1
+        for status in self.client.tell_active():
+            statuses[status['gid']] = status
+        rest = [gid for gid in tracked if gid not in statuses]
+        if rest:
+            self.stats['rpc_requests'] += 1
+            for gid, result in zip(rest, self.client.multicall([('aria2.tellStatus', [gid, STATUS_KEYS]) for gid in rest])):
+                if isinstance(result, Aria2Error):
+                    result = {'gid': gid, 'status': 'removed', 'errorMessage': str(result)}
+                statuses[gid] = result
+        for gid in tracked:
+            if gid in statuses:
+                self._handle(gid, statuses[gid])
+
+    def _handle(self, gid, status):
+        with self.lock:
+            job = self.jobs.get(gid)
+        if job is None:
+            return
+        state = status.get('status')
+        total = int(status.get('totalLength') or 0)
+        done = int(status.get('completedLength') or 0)
+
+        if state == 'active' or state == 'waiting':
+            if job['on_progress'] and total:
+                speed = f"{format_bytes(int(status.get('downloadSpeed') or 0))}/s"
+                job['on_progress'](done * 100.0 / total, speed, done, total)
+        elif state == 'complete':
+            followed = status.get('followedBy')
+            if followed:
+                # Magnet metadata finished; the real download has a new GID
+                self._rebind(gid, followed[0], job)
+                return
+            with self.lock:
+                self.jobs.pop(gid, None)
+                self.gids.pop(job['task_id'], None)
+            filepath, title = _result_path(status)
+            if job['on_complete']:
+                job['on_complete'](filepath, title)
+        elif state in ('error', 'removed'):
+            with self.lock:
+                self.jobs.pop(gid, None)
+                self.gids.pop(job['task_id'], None)
+            if job['on_error']:
+                job['on_error'](status.get('errorMessage') or f"aria2 download {state}")
+
+    def _rebind(self, old_gid, new_gid, job):
+        with self.lock:
+            self.jobs.pop(old_gid, None)
+            self.jobs[new_gid] = job
+            self.gids[job['task_id']] = new_gid
+        if self._saves(job['task_id']):
+            self.db.set_aria2_gid(job['task_id'], new_gid)
+
+
+def _result_path(status):
+    # Multi-file torrents land in a directory named after the torrent
+    name = ((status.get('bittorrent') or {}).get('info') or {}).get('name')
+    files = status.get('files') or []
+    if name and len(files) > 1:
+        return os.path.join(status.get('dir') or '', name), name
+    path = files[0]['path'] if files else status.get('dir') or ''
+    return path, os.path.basename(path)
+
+
+def start_aria2_backend(data_dir, download_dir=None, db=None, port=6800):
+    """Launch aria2c for the service if the binary is available; returns (daemon, backend) or (None, None)."""
+    binary = shutil.which('aria2c')
+    if binary is None:
+        return None, None
+    daemon = Aria2Daemon(binary, port=port, download_dir=download_dir,
+                         session_path=os.path.join(data_dir, 'aria2.session'))
+    try:
+        client = daemon.start()
+    except Exception as e:
+        print(f"aria2c unavailable: {e}")
+        return None, None
+    backend = Aria2Backend(client, db=db)
+    backend.start()
+    return daemon, backend
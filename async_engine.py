@@ -0,0 +1,126 @@
+import asyncio
+import codecs
+import os
+import threading
+
+from downloader_engine import DownloaderEngine
+
+
+class AsyncDownloaderEngine(DownloaderEngine):
+    """
+    asyncio mode of DownloaderEngine: aria2c / yt-dlp run as
+    create_subprocess_exec children whose output is parsed on one event loop,
+    at most `max_concurrent` at a time. stop() kills running processes
+    right away instead of waiting for their next line of output.
+    """
+    def __init__(self, output_callback=None, max_concurrent=3, kill_timeout=3.0, **kwargs):
+        super().__init__(output_callback, **kwargs)
+        self.max_concurrent = max_concurrent
+        self.kill_timeout = kill_timeout
+        self.loop = None
+        self.tasks = set()
+
+    def stop(self):
+        """Cancel everything; safe to call from any thread."""
+        self.stop_event.set() # also stops in-process direct file downloads
+        if self.loop is not None and not self.loop.is_closed():
+            try:
+                self.loop.call_soon_threadsafe(self._cancel_all)
+            except RuntimeError:
+                pass # loop already finished
+
+    def _cancel_all(self):
+        for task in list(self.tasks):
+            task.cancel()
+
+    async def run_cmd(self, cmd):
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT
+            )
+        except FileNotFoundError:
+            self.log(f"[Error] Command not found: {cmd[0]}")
+            self.log("Please ensure the binary is installed or bundled.")
+            return None
+
+        parser = self.make_parser()
+        decoder = codecs.getincrementaldecoder('utf-8')('replace') # chunks can split a character
+        try:
+            # Chunks are parsed as they arrive; \r redraws never end a readline()
+            while True:
+                chunk = await process.stdout.read(4096)
+                if not chunk:
+                    break
+                parser.feed(decoder.decode(chunk))
+            parser.close()
+            return await process.wait()
+        except asyncio.CancelledError:
+            await self._terminate(process)
+            self.log("[Stopped] Download cancelled.")
+            raise
+
+    async def _terminate(self, process):
+        if process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), self.kill_timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+    async def detect_and_download(self, url, folder):
+        url = url.strip()
+        if not url:
+            return
+
+        os.makedirs(folder, exist_ok=True)
+        cmd = self.build_command(url, folder)
+        if cmd is None:
+            # SegmentedDownloader is blocking; it watches stop_event itself
+            await asyncio.get_running_loop().run_in_executor(None, self.download_file, url, folder)
+        elif cmd[0] == 'aria2c' and self.aria2 is not None:
+            # So is the shared aria2 backend: the torrent goes to its aria2c instead of a new process
+            await asyncio.get_running_loop().run_in_executor(None, self.download_torrent, url, folder)
+        else:
+            self.log(f"[{'Torrent' if cmd[0] == 'aria2c' else 'Video'}] Starting: {url}")
+            await self.run_cmd(cmd)
+
+    async def _run_item(self, semaphore, idx, total, url, folder):
+        async with semaphore:
+            if self.stop_event.is_set():
+                return
+            self.log(f"--- Item {idx}/{total} ---")
+            await self.detect_and_download(url, folder)
+            self.log(f"--- Item {idx} Finished ---")
+
+    async def process_queue_async(self, url_queue, folder=None):
+        folder = folder or self.get_download_folder()
+        total = len(url_queue)
+        self.log(f"Processing queue: {total} items")
+        self.loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        for idx, url in enumerate(url_queue, start=1):
+            task = asyncio.ensure_future(self._run_item(semaphore, idx, total, url, folder))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        if self.stop_event.is_set():
+            self._cancel_all() # stop() came in before the loop was known
+        results = await asyncio.gather(*list(self.tasks), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception) and not isinstance(result, asyncio.CancelledError):
+                self.log(f"[Error] {result}")
+
+        self.log("All tasks completed.")
+
+    def process_queue(self, url_queue, folder=None):
+        """Blocking entry point with the same signature as the thread engine."""
+        asyncio.run(self.process_queue_async(url_queue, folder))
+
+    def start_in_background(self, url_queue, folder=None):
+        thread = threading.Thread(target=self.process_queue, args=(url_queue, folder), daemon=True)
+        thread.start()
+        return thread
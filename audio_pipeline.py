@@ -0,0 +1,155 @@
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+from http_engine import DownloadCancelled, format_bytes, make_session
+
+try:
+    import resource # POSIX only
+except ImportError:
+    resource = None
+
+# yt-dlp format for audio mode: compact codecs first, so most downloads need no encoder
+AUDIO_FORMAT = 'bestaudio[acodec^=mp4a]/bestaudio[acodec=opus]/bestaudio[acodec=vorbis]/bestaudio/best'
+# Kept as downloaded (at most remuxed into an audio container)
+PASSTHROUGH_CODECS = {'mp4a', 'aac', 'opus', 'vorbis', 'mp3'}
+PASSTHROUGH_EXTS = {'m4a', 'mp3', 'opus', 'ogg', 'oga', 'webm', 'weba', 'aac'}
+# Containers ffmpeg can decode from a pipe as bytes arrive; MP4/MOV may keep their index at the end
+STREAMABLE_EXTS = {'webm', 'weba', 'mkv', 'mka', 'ogg', 'oga', 'opus', 'mp3', 'flac', 'wav', 'aac', 'ts'}
+TRANSCODE_CODEC = 'mp3'
+TRANSCODE_BITRATE = 192 # kbit/s
+# What each mode skips compared to the old path (full download, then a 192k MP3 re-encode)
+AVOIDED = {'passthrough': 're-encode', 'stream': 'source on disk', 'transcode': None}
+
+
+def audio_codec(fmt):
+    codec = (fmt.get('acodec') or '').split('.')[0].lower()
+    return None if codec in ('', 'none') else codec
+
+
+def plan_audio(fmt):
+    """
+    How to turn the selected format into an audio file:
+    'passthrough' - codec is fine as it is; keep or remux without re-encoding
+    'stream'      - needs encoding and arrives over plain HTTP; encode while downloading
+    'transcode'   - needs encoding but cannot be piped (HLS, MP4 container); convert afterwards
+    """
+    codec, ext = audio_codec(fmt), (fmt.get('ext') or '').lower()
+    if codec in PASSTHROUGH_CODECS or (codec is None and ext in PASSTHROUGH_EXTS):
+        return 'passthrough'
+    if fmt.get('url') and fmt.get('protocol', 'https') in ('http', 'https') and ext in STREAMABLE_EXTS:
+        return 'stream'
+    return 'transcode'
+
+
+def audio_postprocessor(ydl, mode):
+    """yt-dlp ExtractAudio step for a passthrough or post-download transcode."""
+    from yt_dlp.postprocessor import FFmpegExtractAudioPP
+    if mode == 'passthrough':
+        # 'best' copies the stream, and skips entirely when the file is already m4a/mp3/opus/ogg
+        return FFmpegExtractAudioPP(ydl, preferredcodec='best')
+    return FFmpegExtractAudioPP(ydl, preferredcodec=TRANSCODE_CODEC, preferredquality=str(TRANSCODE_BITRATE))
+
+
+def find_ffmpeg(location=None):
+    """ffmpeg binary from a file or directory location (yt-dlp's ffmpeg_location), else PATH."""
+    if location:
+        if os.path.isdir(location):
+            location = os.path.join(location, 'ffmpeg')
+        if os.path.exists(location):
+            return location
+    return shutil.which('ffmpeg')
+
+
+class CpuMeter:
+    """
+    CPU seconds spent by the calling thread plus child processes (ffmpeg)
+    since creation. Children are counted process-wide, so ffmpeg runs of
+    other tasks finishing at the same time are included too.
+    """
+    def __init__(self):
+        self.thread_start = time.thread_time()
+        self.children_start = self._children()
+
+    @staticmethod
+    def _children():
+        if resource is None:
+            return 0.0
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+    def elapsed(self):
+        return (time.thread_time() - self.thread_start) + (self._children() - self.children_start)
+
+
+def format_report(report):
+    text = (f"{report['mode']} ({report['codec'] or '?'}), CPU {report['cpu']:.2f}s, "
+            f"peak disk {format_bytes(report['peak_disk'])}, output {format_bytes(report['size'])}")
+    if report.get('avoided'):
+        text += f", avoided {report['avoided']}"
+    return text
+
+
+def stream_transcode(fmt, out_path, ffmpeg, progress_callback=None, stop_event=None, throttle=None,
+                     session=None, chunk_size=64 * 1024, timeout=30):
+    """
+    Fetch fmt['url'] and pipe it straight into an ffmpeg encoder; only the
+    encoded output touches the disk. progress_callback(percent, speed_str)
+    as bytes arrive; throttle(nbytes) after each chunk.
+    """
+    if not ffmpeg:
+        raise Exception("ffmpeg not found; needed to convert this audio format")
+    owned = session is None
+    session = session or make_session(pool_size=1)
+    temp_path = out_path + '.part'
+    process = subprocess.Popen(
+        [ffmpeg, '-hide_banner', '-nostdin', '-loglevel', 'error', '-y', '-i', 'pipe:0',
+         '-vn', '-c:a', 'libmp3lame', '-b:a', f'{TRANSCODE_BITRATE}k', '-f', TRANSCODE_CODEC, temp_path],
+        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    # Drain stderr on the side so a chatty ffmpeg never blocks on a full pipe
+    errors = []
+    reader = threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True)
+    reader.start()
+    try:
+        response = session.get(fmt['url'], headers=fmt.get('http_headers') or {}, stream=True, timeout=timeout)
+        with response:
+            response.raise_for_status()
+            total = fmt.get('filesize') or int(response.headers.get('Content-Length') or 0) or None
+            done, started, last_report = 0, time.monotonic(), 0.0
+            for chunk in response.iter_content(chunk_size):
+                if stop_event is not None and stop_event.is_set():
+                    raise DownloadCancelled()
+                process.stdin.write(chunk)
+                done += len(chunk)
+                if throttle:
+                    throttle(len(chunk))
+                now = time.monotonic()
+                if progress_callback and now - last_report >= 0.25:
+                    last_report = now
+                    speed = done / max(now - started, 1e-6)
+                    progress_callback(done * 100.0 / total if total else 0.0, f"{format_bytes(speed)}/s")
+        process.stdin.close()
+        process.wait()
+        reader.join()
+        if process.returncode != 0:
+            message = b''.join(e for e in errors if e).decode('utf-8', 'replace').strip()
+            raise Exception(f"ffmpeg failed: {message or process.returncode}")
+        os.replace(temp_path, out_path)
+        return out_path
+    except BrokenPipeError:
+        # ffmpeg gave up on the input; its stderr says why
+        process.wait()
+        reader.join()
+        message = b''.join(e for e in errors if e).decode('utf-8', 'replace').strip()
+        raise Exception(f"ffmpeg failed: {message or 'broken pipe'}")
+    finally:
+        if owned:
+            session.close()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -0,0 +1,246 @@
+import threading
+import time
+from datetime import datetime
+
+
+def parse_rate(text):
+    """'512K', '2M', '1.5MB', '0' or '' (unlimited) -> bytes/s or None."""
+    text = str(text or '').strip().upper().rstrip('/S').rstrip('B').rstrip('I')
+    if not text or text == '0':
+        return None
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    if text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(float(text))
+
+
+class TokenBucket:
+    """Debt-style token bucket: reserve() always succeeds and says how long to wait."""
+    def __init__(self, rate=None, burst_seconds=0.5):
+        self.lock = threading.Lock()
+        self.burst_seconds = burst_seconds
+        self.rate = None
+        self.tokens = 0.0
+        self.last = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill()
+            self.rate = rate if rate and rate > 0 else None
+            if self.rate is not None:
+                self.tokens = min(self.tokens, self.rate * self.burst_seconds)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate is not None:
+            self.tokens = min(self.rate * self.burst_seconds, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def reserve(self, count):
+        with self.lock:
+            if self.rate is None:
+                return 0.0
+            self._refill()
+            self.tokens -= count
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class BandwidthManager:
+    """
+    Shared rate limiter for every download worker.
+    Workers call throttle(task_id, nbytes) after each chunk. The global cap
+    (or the schedule entry for the current time of day) is split between
+    registered tasks by weight, never above a task's own cap. With `adaptive`
+    on, a task that measurably cannot use its share (slow server) is held
+    near what it achieves and the rest goes to the others. A network cap
+    (set by the connectivity policy, never saved) lowers the global cap
+    further. Every setter applies to running tasks immediately.
+    """
+    def __init__(self, global_limit=None, schedule=None, adaptive=True, adjust_interval=2.0):
+        self.lock = threading.RLock()
+        self.global_limit = global_limit
+        self.network_limit = None # e.g. mobile data; from NetworkPolicy, not a user setting
+        self.schedule = schedule or [] # [{'start': 'HH:MM', 'end': 'HH:MM', 'limit': bytes/s or None}]
+        self.adaptive = adaptive
+        self.adjust_interval = adjust_interval
+        self.global_bucket = TokenBucket()
+        self.tasks = {} # task_id: {'bucket', 'limit', 'weight', 'allotted', 'bytes', 'measured'}
+        self.next_adjust = time.monotonic() + adjust_interval
+        self.window_start = time.monotonic()
+        self.current_limit = None
+        self.stats = {'throttled': 0, 'waited': 0.0}
+        self.rebalance()
+
+    # --- Configuration (any thread, takes effect at once) ---
+    def set_global_limit(self, limit):
+        with self.lock:
+            self.global_limit = limit or None
+            self.rebalance()
+
+    def set_network_limit(self, limit):
+        with self.lock:
+            self.network_limit = limit or None
+            self.rebalance()
+
+    def set_schedule(self, schedule):
+        with self.lock:
+            self.schedule = list(schedule or [])
+            self.rebalance()
+
+    def set_adaptive(self, adaptive):
+        with self.lock:
+            self.adaptive = adaptive
+            self.rebalance()
+
+    def set_task_limit(self, task_id, limit):
+        with self.lock:
+            if task_id in self.tasks:
+                self.tasks[task_id]['limit'] = limit or None
+                self.rebalance()
+
+    def set_task_weight(self, task_id, weight):
+        with self.lock:
+            if task_id in self.tasks:
+                self.tasks[task_id]['weight'] = max(0.1, float(weight or 1))
+                self.rebalance()
+
+    def register(self, task_id, limit=None, weight=1):
+        with self.lock:
+            self.tasks[task_id] = {
+                'bucket': TokenBucket(),
+                'limit': limit or None,
+                'weight': max(0.1, float(weight or 1)),
+                'allotted': None,
+                'bytes': 0,
+                'measured': None,
+            }
+            self.rebalance()
+
+    def unregister(self, task_id):
+        with self.lock:
+            if self.tasks.pop(task_id, None) is not None:
+                self.rebalance()
+
+    def effective_limit(self, now=None):
+        """Global cap in force right now: a matching schedule entry wins over global_limit; the network cap if lower."""
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        limit = self.global_limit
+        for entry in self.schedule:
+            start, end = _minutes(entry['start']), _minutes(entry['end'])
+            inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+            if inside:
+                limit = entry.get('limit') or None
+                break
+        if self.network_limit and (limit is None or self.network_limit < limit):
+            return self.network_limit
+        return limit
+
+    # --- Worker side ---
+    def throttle(self, task_id, count, stop_event=None):
+        """Account count bytes for task_id and sleep as long as the limits require."""
+        task = self.tasks.get(task_id)
+        if task is None:
+            return
+        now = time.monotonic()
+        if now >= self.next_adjust:
+            with self.lock:
+                if now >= self.next_adjust:
+                    self._measure(now)
+                    self.rebalance()
+        task['bytes'] += count
+        wait = max(task['bucket'].reserve(count), self.global_bucket.reserve(count))
+        if wait <= 0:
+            return
+        self.stats['throttled'] += 1
+        self.stats['waited'] += wait
+        # Sleep in slices so a pause does not wait out a long debt
+        deadline = now + wait
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (stop_event is not None and stop_event.is_set()):
+                return
+            time.sleep(min(remaining, 0.1))
+
+    # --- Allocation ---
+    def _measure(self, now):
+        elapsed = max(now - self.window_start, 1e-6)
+        for task in self.tasks.values():
+            task['measured'] = task['bytes'] / elapsed
+            task['bytes'] = 0
+        self.window_start = now
+        self.next_adjust = now + self.adjust_interval
+
+    def _demand(self, task):
+        # Adaptive: a task well under its allotment is limited elsewhere; leave it some headroom only
+        if not self.adaptive or task['measured'] is None or task['allotted'] is None:
+            return None
+        if task['measured'] < task['allotted'] * 0.9:
+            return max(task['measured'] * 1.25, 16 * 1024)
+        return None
+
+    def rebalance(self):
+        """Water-filling split of the global cap by weight, respecting per-task caps and demand."""
+        with self.lock:
+            limit = self.effective_limit()
+            self.current_limit = limit
+            self.global_bucket.set_rate(limit)
+            caps = {}
+            for task_id, task in self.tasks.items():
+                candidates = [c for c in (task['limit'], self._demand(task)) if c]
+                caps[task_id] = min(candidates) if candidates else None
+
+            allotted = {}
+            if limit is None:
+                # Nothing to share out; only explicit per-task caps apply
+                allotted = {task_id: task['limit'] for task_id, task in self.tasks.items()}
+            else:
+                remaining = float(limit)
+                active = set(self.tasks)
+                while active:
+                    total_weight = sum(self.tasks[t]['weight'] for t in active)
+                    fair = {t: remaining * self.tasks[t]['weight'] / total_weight for t in active}
+                    capped = [t for t in active if caps[t] is not None and caps[t] < fair[t]]
+                    if not capped:
+                        allotted.update(fair)
+                        break
+                    for t in capped:
+                        allotted[t] = caps[t]
+                        remaining -= caps[t]
+                        active.discard(t)
+
+            for task_id, task in self.tasks.items():
+                task['allotted'] = allotted.get(task_id)
+                task['bucket'].set_rate(task['allotted'])
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'limit': self.current_limit,
+                'network_limit': self.network_limit,
+                'adaptive': self.adaptive,
+                'tasks': {
+                    task_id: {
+                        'limit': task['limit'],
+                        'weight': task['weight'],
+                        'allotted': task['allotted'],
+                        'measured': task['measured'],
+                    } for task_id, task in self.tasks.items()
+                },
+            }
+
+    def settings(self):
+        return {'global_limit': self.global_limit, 'schedule': self.schedule, 'adaptive': self.adaptive}
+
+    def apply_settings(self, settings):
+        with self.lock:
+            self.global_limit = settings.get('global_limit') or None
+            self.schedule = list(settings.get('schedule') or [])
+            self.adaptive = settings.get('adaptive', True)
+            self.rebalance()
+
+
+def _minutes(text):
+    hours, minutes = text.split(':')
+    return int(hours) * 60 + int(minutes)
@@ -0,0 +1,97 @@
+"""
+Frame time while refreshing the Active Downloads list with 50 cards.
+Compares a full rebuild (what refresh_active used to do) against keyed
+reconciliation with no changes and with one row added per refresh.
+Needs Kivy/KivyMD and a display (or a virtual one, e.g. xvfb-run).
+
+    python benchmarks/bench_active_refresh.py [--cards 50] [--frames 120]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+
+import main
+
+
+def frame_stats(samples):
+    samples = sorted(samples)
+    return (f"mean={statistics.mean(samples) * 1000:6.2f}ms "
+            f"p95={samples[int(len(samples) * 0.95) - 1] * 1000:6.2f}ms "
+            f"max={samples[-1] * 1000:6.2f}ms")
+
+
+class BenchApp(main.DownloadsApp):
+    def __init__(self, cards, frames, **kwargs):
+        super().__init__(**kwargs)
+        self.cards = cards
+        self.frames = frames
+        self.results = {}
+
+    def on_start(self):
+        # Paused rows so refresh_active never starts real downloads
+        for i in range(self.cards):
+            task_id = main.db.add_task(f"https://example.com/video/{i}")
+            main.db.update_status(task_id, "Paused", i % 100)
+        main.db.flush()
+        self.sm.current = "main"
+        self.refresh_active()
+        self.modes = ['rebuild', 'reconcile', 'reconcile+1']
+        self.start_mode()
+
+    def start_mode(self):
+        self.mode = self.modes.pop(0)
+        self.samples = []
+        self.refresh_times = []
+        self.last = None
+        main.Clock.schedule_interval(self.tick, 0)
+
+    def tick(self, dt):
+        now = time.perf_counter()
+        if self.last is not None:
+            self.samples.append(now - self.last)
+        start = time.perf_counter()
+        if self.mode == 'rebuild':
+            # Emulates the old clear_widgets() + recreate-everything refresh
+            for t_id in list(self.active_cards):
+                self.remove_active_card(t_id)
+        elif self.mode == 'reconcile+1':
+            task_id = main.db.add_task("https://example.com/new")
+            main.db.update_status(task_id, "Paused")
+            main.db.flush()
+        self.refresh_active()
+        self.refresh_times.append(time.perf_counter() - start)
+        self.last = time.perf_counter()
+
+        if len(self.samples) >= self.frames:
+            self.results[self.mode] = (frame_stats(self.samples), statistics.mean(self.refresh_times))
+            if not self.modes:
+                self.stop()
+                return False
+            main.Clock.unschedule(self.tick)
+            self.start_mode()
+            return False
+
+
+def run():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cards', type=int, default=50)
+    parser.add_argument('--frames', type=int, default=120)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp) # get_db_path() resolves relative to the working directory
+        bench = BenchApp(args.cards, args.frames)
+        bench.run()
+        for mode, (frames, refresh) in bench.results.items():
+            print(f"{mode:<12} refresh={refresh * 1000:7.2f}ms frame {frames}")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,117 @@
+"""
+aria2 RPC backend against the fake aria2 server: N downloads tracked by one
+Aria2Backend (tellActive + one tellStatus multicall per poll) versus
+polling every GID with its own tellStatus request. Also checks that a
+paused task resumes under the same GID stored in the database.
+
+    python benchmarks/bench_aria2_rpc.py [--downloads 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aria2_rpc import Aria2Backend, Aria2Client, STATUS_KEYS
+from database import DBManager
+from fake_aria2 import FakeAria2Server
+
+
+def uris(count):
+    links = [f"https://mirror.example.com/file{i}.iso" for i in range(count - 2)]
+    return links + ["magnet:?xt=urn:btih:0123456789abcdef", "https://mirror.example.com/fail.iso"]
+
+
+def run_backend(db, links, size, speed, poll_interval):
+    server = FakeAria2Server(secret='bench', size=size, speed=speed).start()
+    backend = Aria2Backend(Aria2Client(server.url, secret='bench'), db=db, poll_interval=poll_interval)
+    backend.start()
+    finished = threading.Semaphore(0)
+    results = {'complete': 0, 'error': 0}
+
+    def done(kind):
+        def callback(*args):
+            results[kind] += 1
+            finished.release()
+        return callback
+
+    start = time.perf_counter()
+    for link in links:
+        task_id = db.add_task(link)
+        backend.add(task_id, link, '/tmp/aria2-bench', on_complete=done('complete'), on_error=done('error'))
+    for _ in links:
+        finished.acquire()
+    elapsed = time.perf_counter() - start
+    backend.stop()
+    server.stop()
+    return elapsed, server.requests, backend.stats['polls'], results
+
+
+def run_naive(links, size, speed, poll_interval):
+    # One tellStatus round trip per download per poll
+    server = FakeAria2Server(secret='bench', size=size, speed=speed).start()
+    client = Aria2Client(server.url, secret='bench')
+    gids = [client.add_uri([link], {'dir': '/tmp/aria2-bench'}) for link in links]
+    start = time.perf_counter()
+    polls = 0
+    while gids:
+        polls += 1
+        still = []
+        for gid in gids:
+            status = client.tell_status(gid, STATUS_KEYS)
+            if status['status'] == 'complete' and status.get('followedBy'):
+                still.append(status['followedBy'][0])
+            elif status['status'] in ('active', 'waiting', 'paused'):
+                still.append(gid)
+        gids = still
+        time.sleep(poll_interval)
+    elapsed = time.perf_counter() - start
+    server.stop()
+    return elapsed, server.requests, polls
+
+
+def check_resume(db):
+    server = FakeAria2Server(secret='bench', size=64 * 1024 * 1024, speed=8 * 1024 * 1024).start()
+    backend = Aria2Backend(Aria2Client(server.url, secret='bench'), db=db)
+    task_id = db.add_task("https://mirror.example.com/big.iso")
+    gid = backend.add(task_id, "https://mirror.example.com/big.iso", '/tmp/aria2-bench')
+    time.sleep(0.3)
+    backend.pause(task_id)
+    db.flush()
+    # A new backend (e.g. after a service restart) finds the GID through the database
+    backend = Aria2Backend(Aria2Client(server.url, secret='bench'), db=db)
+    resumed = backend.add(task_id, "https://mirror.example.com/big.iso", '/tmp/aria2-bench')
+    server.stop()
+    return gid == resumed, server.calls.get('aria2.addUri', 0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--downloads', type=int, default=50)
+    parser.add_argument('--size', type=int, default=4 * 1024 * 1024)
+    parser.add_argument('--speed', type=int, default=2 * 1024 * 1024, help="bytes/s per download")
+    parser.add_argument('--poll', type=float, default=0.25)
+    args = parser.parse_args()
+
+    links = uris(args.downloads)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DBManager(os.path.join(tmp, 'bench.db'))
+        elapsed, requests, polls, results = run_backend(db, links, args.size, args.speed, args.poll)
+        print(f"batched backend: {elapsed:.2f}s, {polls} polls, {requests} HTTP requests "
+              f"({results['complete']} complete, {results['error']} failed)")
+        n_elapsed, n_requests, n_polls = run_naive(links, args.size, args.speed, args.poll)
+        print(f"per-GID polling: {n_elapsed:.2f}s, {n_polls} polls, {n_requests} HTTP requests")
+        # Both sides also spent one addUri request per download
+        print(f"poll requests per poll: {(requests - len(links)) / max(polls, 1):.1f} "
+              f"vs {(n_requests - len(links)) / max(n_polls, 1):.1f}")
+
+        same_gid, adds = check_resume(db)
+        print(f"resume after pause reuses GID: {same_gid} (addUri calls: {adds})")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+Audio mode benchmark: the old route (download bestaudio in full, then
+FFmpegExtractAudio to 192k MP3) versus the audio pipeline in
+DownloadManager (passthrough / remux / transcode-while-downloading), per
+source codec. Reports wall time, CPU seconds (this process's download
+thread plus ffmpeg) and peak disk use.
+
+Fixtures are generated with ffmpeg into a temp dir and served from a local
+HTTP server capped at --rate bytes/s per connection; yt-dlp's generic
+extractor treats them as direct media links.
+
+    python benchmarks/bench_audio.py [--ffmpeg PATH] [--seconds 120] [--rate 4M]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_pipeline import CpuMeter, find_ffmpeg
+from bandwidth import parse_rate
+from database import DBManager
+from download_service import DownloadManager
+from http_engine import format_bytes
+from progress_bus import ProgressBus
+
+SOURCES = [
+    # (file name, ffmpeg encoder args, what the pipeline should do)
+    ('tone-aac.m4a', ['-c:a', 'aac', '-b:a', '128k'], 'keep as is'),
+    ('tone-opus.webm', ['-c:a', 'libopus', '-b:a', '128k'], 'remux to .opus'),
+    ('tone-flac.flac', ['-c:a', 'flac'], 'stream into mp3 encoder'),
+]
+
+
+class ThrottledHandler(SimpleHTTPRequestHandler):
+    rate = None
+
+    def copyfile(self, source, outputfile):
+        chunk = 64 * 1024
+        while True:
+            data = source.read(chunk)
+            if not data:
+                return
+            outputfile.write(data)
+            if self.rate:
+                time.sleep(len(data) / self.rate)
+
+    def log_message(self, *args):
+        pass
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass # yt-dlp closes probe connections early
+
+
+class QuietLogger:
+    def debug(self, msg): pass
+    def info(self, msg): pass
+    def warning(self, msg): pass
+    def error(self, msg): print(f"yt-dlp Error: {msg}")
+
+
+def make_fixtures(ffmpeg, folder, seconds):
+    for name, codec_args, _ in SOURCES:
+        subprocess.run(
+            [ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', '-f', 'lavfi',
+             '-i', f'anoisesrc=d={seconds}:c=pink:r=44100:a=0.3', '-ac', '2', *codec_args,
+             os.path.join(folder, name)],
+            check=True
+        )
+
+
+def legacy(url, folder, ffmpeg):
+    """What _run_download did before: full download, then a 192k MP3 re-encode."""
+    import yt_dlp
+    downloaded = {}
+
+    def hook(d):
+        if d['status'] == 'finished':
+            downloaded[d['filename']] = d.get('total_bytes') or d.get('downloaded_bytes') or 0
+
+    ydl_opts = {
+        'outtmpl': os.path.join(folder, '%(title)s.%(ext)s'),
+        'progress_hooks': [hook],
+        'logger': QuietLogger(),
+        'quiet': True,
+        'noprogress': True,
+        'ffmpeg_location': ffmpeg,
+        'format': 'bestaudio/best',
+        'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'mp3', 'preferredquality': '192'}],
+    }
+    meter = CpuMeter()
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+    filepath = info['requested_downloads'][0]['filepath']
+    size = os.path.getsize(filepath)
+    return {'mode': 'legacy mp3', 'cpu': meter.elapsed(), 'peak_disk': sum(downloaded.values()) + size, 'size': size}
+
+
+def pipeline(url, folder, ffmpeg):
+    """The current DownloadManager path, run in this thread so CpuMeter sees it."""
+    data_dir = tempfile.mkdtemp(prefix='bench_audio_db_')
+    db = DBManager(os.path.join(data_dir, 'downloads.db'))
+    manager = DownloadManager(db, ProgressBus(), lambda: folder, ffmpeg_location=ffmpeg)
+    states = []
+    manager.state_listeners.append(lambda task_id, state, info: states.append((state, info)))
+    task_id = db.add_task(url, format_type='audio')
+    manager._run_download(task_id, url, threading.Event(), lambda *a: None, lambda msg: print(f"Error: {msg}"))
+    db.close()
+    shutil.rmtree(data_dir, ignore_errors=True)
+    state, info = states[-1]
+    if state != 'completed':
+        raise Exception(info.get('message'))
+    return dict(info['audio'], filepath=info['filepath'])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ffmpeg', help="ffmpeg binary or folder (default: PATH)")
+    parser.add_argument('--seconds', type=int, default=120, help="length of the generated audio")
+    parser.add_argument('--rate', default='4M', help="per-connection bytes/s of the fixture server (0 = unlimited)")
+    args = parser.parse_args()
+
+    ffmpeg = find_ffmpeg(args.ffmpeg)
+    if not ffmpeg:
+        sys.exit("ffmpeg not found (use --ffmpeg)")
+    try:
+        import yt_dlp # noqa: F401
+    except ImportError:
+        sys.exit("yt-dlp is not installed (pip install -r requirements.txt)")
+
+    fixtures = tempfile.mkdtemp(prefix='bench_audio_src_')
+    make_fixtures(ffmpeg, fixtures, args.seconds)
+    ThrottledHandler.rate = parse_rate(args.rate)
+    server = QuietServer(('127.0.0.1', 0), partial(ThrottledHandler, directory=fixtures))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"{args.seconds}s of stereo audio per source, served at {args.rate}/s\n")
+    print(f"{'source':<16} {'route':<12} {'wall':>7} {'CPU':>7} {'peak disk':>11} {'output':>11}  result")
+
+    try:
+        for name, _, expected in SOURCES:
+            source_size = os.path.getsize(os.path.join(fixtures, name))
+            for label, run in (('before', legacy), ('after', pipeline)):
+                folder = tempfile.mkdtemp(prefix='bench_audio_out_')
+                try:
+                    start = time.perf_counter()
+                    report = run(f"{base}/{name}", folder, ffmpeg)
+                    wall = time.perf_counter() - start
+                finally:
+                    shutil.rmtree(folder, ignore_errors=True)
+                result = report['mode'] if label == 'before' else f"{report['mode']}: {expected}"
+                print(f"{name:<16} {label:<12} {wall:6.2f}s {report['cpu']:6.2f}s "
+                      f"{format_bytes(report['peak_disk']):>11} {format_bytes(report['size']):>11}  {result}")
+            print(f"{'':<16} source {format_bytes(source_size)}\n")
+    finally:
+        server.shutdown()
+        shutil.rmtree(fixtures, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+BandwidthManager benchmark: simulated downloads pushing chunks through
+throttle() as fast as their (fake) network allows.
+
+  1. three tasks, weights 1/1/2, under a global cap -> shares ~25/25/50%
+  2. one task's server is slow -> adaptive mode hands its unused share to the others
+  3. the global cap changes mid-run -> running tasks follow within a second or two
+  4. a schedule entry covering "now" overrides the global cap
+
+    python benchmarks/bench_bandwidth.py [--limit 3M] [--seconds 6]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bandwidth import BandwidthManager, parse_rate
+from http_engine import format_bytes
+
+CHUNK = 16 * 1024
+
+
+class FakeTask(threading.Thread):
+    """Reads CHUNK-sized pieces from a 'network' capped at network_rate (None = fast)."""
+    def __init__(self, manager, task_id, stop_event, weight=1, limit=None, network_rate=None):
+        super().__init__(daemon=True)
+        self.manager = manager
+        self.task_id = task_id
+        self.stop_event = stop_event
+        self.network_rate = network_rate
+        self.bytes = 0
+        self.lock = threading.Lock()
+        manager.register(task_id, limit=limit, weight=weight)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            if self.network_rate:
+                time.sleep(CHUNK / self.network_rate)
+            with self.lock:
+                self.bytes += CHUNK
+            self.manager.throttle(self.task_id, CHUNK, self.stop_event)
+        self.manager.unregister(self.task_id)
+
+    def take(self):
+        with self.lock:
+            count, self.bytes = self.bytes, 0
+        return count
+
+
+def run_phase(label, tasks, seconds):
+    for task in tasks:
+        task.take()
+    start = time.monotonic()
+    time.sleep(seconds)
+    elapsed = time.monotonic() - start
+    rates = [task.take() / elapsed for task in tasks]
+    total = sum(rates)
+    shares = '  '.join(f"#{task.task_id} {format_bytes(rate):>10}/s ({rate * 100 / total:4.1f}%)" for task, rate in zip(tasks, rates))
+    print(f"{label:<28} total {format_bytes(total):>10}/s  {shares}")
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--limit', default='3M', help="global cap")
+    parser.add_argument('--seconds', type=float, default=6.0, help="measurement window per phase")
+    args = parser.parse_args()
+    limit = parse_rate(args.limit)
+    warmup = 2.5 # one adjust interval plus slack
+
+    print(f"global cap {format_bytes(limit)}/s, chunk {format_bytes(CHUNK)}\n")
+
+    # 1. Weighted shares
+    manager = BandwidthManager(global_limit=limit)
+    stop = threading.Event()
+    tasks = [FakeTask(manager, 1, stop), FakeTask(manager, 2, stop), FakeTask(manager, 3, stop, weight=2)]
+    for task in tasks:
+        task.start()
+    time.sleep(warmup)
+    run_phase("weights 1/1/2", tasks, args.seconds)
+
+    # 3. Runtime change on the same tasks
+    manager.set_global_limit(limit // 3)
+    time.sleep(warmup)
+    run_phase(f"cap -> {format_bytes(limit // 3)}/s", tasks, args.seconds)
+    manager.set_global_limit(None)
+    time.sleep(1)
+    run_phase("cap removed", tasks, 1)
+    stop.set()
+    for task in tasks:
+        task.join()
+
+    # 2. A slow server: static split vs adaptive
+    slow_rate = limit // 10
+    for adaptive in (False, True):
+        manager = BandwidthManager(global_limit=limit, adaptive=adaptive)
+        stop = threading.Event()
+        tasks = [FakeTask(manager, 1, stop), FakeTask(manager, 2, stop), FakeTask(manager, 3, stop, network_rate=slow_rate)]
+        for task in tasks:
+            task.start()
+        time.sleep(warmup * 2)
+        label = f"slow #3, {'adaptive' if adaptive else 'static split'}"
+        run_phase(label, tasks, args.seconds)
+        stop.set()
+        for task in tasks:
+            task.join()
+
+    # 4. Schedule entry around the current time beats the global cap
+    now = datetime.now()
+    window = {
+        'start': (now - timedelta(minutes=5)).strftime('%H:%M'),
+        'end': (now + timedelta(minutes=5)).strftime('%H:%M'),
+        'limit': limit // 2,
+    }
+    manager = BandwidthManager(global_limit=limit, schedule=[window])
+    stop = threading.Event()
+    tasks = [FakeTask(manager, 1, stop)]
+    tasks[0].start()
+    time.sleep(1)
+    run_phase(f"schedule {window['start']}-{window['end']}", tasks, args.seconds / 2)
+    stop.set()
+    tasks[0].join()
+
+    print(f"\nschedule: 23:00-07:00 covers 02:00 -> "
+          f"{BandwidthManager(schedule=[{'start': '23:00', 'end': '07:00', 'limit': 1}]).effective_limit(now.replace(hour=2))}"
+          f", 12:00 -> {BandwidthManager(schedule=[{'start': '23:00', 'end': '07:00', 'limit': 1}]).effective_limit(now.replace(hour=12))}")
+
+
+if __name__ == '__main__':
+    main()
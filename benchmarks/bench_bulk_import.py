@@ -0,0 +1,140 @@
+"""
+Bulk import: a 10k-line link list added the old way (one add_download per
+line: validate, dedup.add() with its own commit, then a refresh_active
+query) versus bulk_import.import_links() streaming the same file into one
+executemany transaction and a single refresh.
+
+The list mixes plain file links, video pages (some repeated under another
+spelling), shared-text lines with a link inside, a few links already in
+the database, and lines that are not usable links. Everything runs offline.
+
+    python benchmarks/bench_bulk_import.py [--lines 10000]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulk_import import check_link, import_links, iter_links, summary
+from database import DBManager
+from dedup import DedupIndex, media_key
+
+ACTIVE_STATUSES = ['Pending', 'Downloading', 'Paused', 'Error'] # what refresh_active lists
+ALREADY_ADDED = 200 # links put in the database before each run
+
+
+def make_lines(count, seed=1):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.45:
+            lines.append(f"https://cdn.example.com/files/{i}/video-{i}.mp4")
+        elif kind < 0.7:
+            video = f"{i:011d}"[-11:]
+            lines.append(rng.choice([
+                f"https://www.youtube.com/watch?v={video}",
+                f"https://youtu.be/{video}?si=share{i}",
+            ]))
+        elif kind < 0.8:
+            lines.append(f"Check this out: https://vimeo.com/{100000 + i} (via Share)")
+        elif kind < 0.9 and lines:
+            # The same link again, spelled differently
+            lines.append(rng.choice(lines[-50:]).replace("https://cdn.", "https://www.cdn.") + "?utm_source=list")
+        elif kind < 0.95:
+            lines.append(rng.choice(["ftp://old.example.com/file.zip", "just a note", "https://example.com/a.torrent", ""]))
+        else:
+            lines.append(f"https://cdn.example.com/files/old/{i % ALREADY_ADDED}.mp4")
+    return lines
+
+
+def fresh_db(work, name):
+    db = DBManager(os.path.join(work, f'{name}.db'))
+    dedup = DedupIndex(db)
+    db.add_tasks([(url, media_key(url)) for url in (f"https://cdn.example.com/files/old/{i}.mp4" for i in range(ALREADY_ADDED))])
+    return db, dedup
+
+
+def per_line(db, dedup, path):
+    """The old add_download loop, one link at a time."""
+    added = refreshes = 0
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            url = line.strip()
+            if not url or check_link(url):
+                continue
+            _, duplicate = dedup.add(url)
+            added += duplicate is None
+            db.get_tasks(ACTIVE_STATUSES, top_level_only=True) # refresh_active after every add
+            refreshes += 1
+    return added, refreshes
+
+
+def bulk(db, dedup, path):
+    with open(path, encoding='utf-8') as f:
+        result = import_links(dedup, f)
+    db.flush()
+    db.get_tasks(ACTIVE_STATUSES, top_level_only=True) # one refresh at the end
+    return result
+
+
+def count_tasks(db):
+    db.flush()
+    return db.cursor.execute('SELECT COUNT(*) FROM downloads').fetchone()[0] - ALREADY_ADDED
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=10000)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='bench_bulk_')
+    try:
+        path = os.path.join(work, 'links.txt')
+        lines = make_lines(args.lines)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        print(f"{args.lines} lines, {os.path.getsize(path) / 1024:.0f} KiB; {ALREADY_ADDED} links already in the database")
+        media_key("https://example.com/") # load extractors outside the timings
+        usable = sum(1 for _, reason in iter_links(lines) if not reason)
+        print(f"{usable} usable links\n")
+
+        db, dedup = fresh_db(work, 'per_line')
+        commits = db.writer.stats['commits']
+        start = time.perf_counter()
+        added, refreshes = per_line(db, dedup, path)
+        elapsed = time.perf_counter() - start
+        print(f"before (per line):  {elapsed:6.2f}s  {db.writer.stats['commits'] - commits:>6} commits  "
+              f"{refreshes:>6} refreshes  {count_tasks(db)} tasks added")
+        db.close()
+
+        db, dedup = fresh_db(work, 'bulk')
+        commits = db.writer.stats['commits']
+        start = time.perf_counter()
+        result = bulk(db, dedup, path)
+        elapsed = time.perf_counter() - start
+        print(f"after (bulk):       {elapsed:6.2f}s  {db.writer.stats['commits'] - commits:>6} commits  "
+              f"{1:>6} refreshes  {count_tasks(db)} tasks added")
+        print(f"  {summary(result)}")
+        db.close()
+
+        # Separate run: tracemalloc slows every allocation down
+        db, dedup = fresh_db(work, 'bulk_memory')
+        tracemalloc.start()
+        bulk(db, dedup, path)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"  peak Python memory during the import: {peak / 1024 ** 2:.1f} MiB")
+        db.close()
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+History query benchmark over a large downloads table: the old full
+SELECT * versus the indexed keyset pages used by the Files tab.
+
+    python benchmarks/bench_db_queries.py [--rows 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DBManager
+
+
+def timed(fn, repeat=5):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def populate(db, rows):
+    rng = random.Random(42)
+    statuses = ['Completed'] * 95 + ['Error'] * 3 + ['Paused'] * 2
+
+    def insert(conn):
+        conn.executemany(
+            'INSERT INTO downloads (url, title, status, progress, file_path, timestamp) '
+            "VALUES (?, ?, ?, 100, ?, datetime('2024-01-01', ?))",
+            (
+                (f"https://example.com/v/{i}", f"Video {i}", rng.choice(statuses),
+                 f"/sdcard/Download/downloads/video_{i}.mp4", f"+{i // 3} minutes")
+                for i in range(rows)
+            )
+        )
+    db.writer.call(insert)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--page', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DBManager(os.path.join(tmp, 'bench.db'))
+        populate(db, args.rows)
+        # A handful of live tasks, as refresh_active sees them
+        for i in range(20):
+            db.add_task(f"https://example.com/live/{i}")
+
+        t, rows = timed(lambda: db.get_tasks('Completed'))
+        print(f"get_tasks('Completed') full scan  : {t * 1000:8.2f} ms ({len(rows)} rows)")
+
+        t, (rows, cursor) = timed(lambda: db.get_tasks_page('Completed', limit=args.page))
+        print(f"get_tasks_page first page         : {t * 1000:8.2f} ms ({len(rows)} rows)")
+
+        # Walk deep into history to show page cost does not grow with offset
+        deep_cursor = cursor
+        for _ in range(500):
+            _, deep_cursor = db.get_tasks_page('Completed', limit=args.page, cursor=deep_cursor)
+        t, (rows, _) = timed(lambda: db.get_tasks_page('Completed', limit=args.page, cursor=deep_cursor))
+        print(f"get_tasks_page after 500 pages    : {t * 1000:8.2f} ms ({len(rows)} rows)")
+
+        active = ['Pending', 'Downloading', 'Paused', 'Error']
+        t, rows = timed(lambda: db.get_tasks(active))
+        print(f"get_tasks(active statuses)        : {t * 1000:8.2f} ms ({len(rows)} rows)")
+
+        plan = db.conn.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM downloads WHERE status = ? '
+            'AND (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT 50',
+            ('Completed', '9999', 0)
+        ).fetchall()
+        print("page query plan:", "; ".join(row[3] for row in plan))
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Progress-hook write benchmark: legacy per-hook UPDATE + commit versus the
+coalescing DBWriter, with 1, 10 and 50 concurrent simulated downloads.
+
+    python benchmarks/bench_db_writes.py [--hooks 1000]
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DBManager
+
+
+class LegacyDB:
+    """The old DBManager write path: shared cursor, commit on every update."""
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.cursor = self.conn.cursor()
+        self.lock = threading.Lock() # the old code had none; needed to run at all
+        self.commits = 0
+
+    def update_status(self, task_id, status, progress=None):
+        with self.lock:
+            self.cursor.execute('UPDATE downloads SET status = ?, progress = ? WHERE id = ?', (status, progress, task_id))
+            self.conn.commit()
+            self.commits += 1
+
+
+def simulate(update, task_ids, hooks, legacy):
+    latencies = []
+    lat_lock = threading.Lock()
+
+    def worker(task_id):
+        local = []
+        for i in range(hooks):
+            val = i * 100.0 / hooks
+            start = time.perf_counter()
+            # The legacy hook only wrote on 5% buckets; the new one writes every tick
+            if not legacy or int(val) % 5 == 0:
+                update(task_id, "Downloading", val)
+            local.append(time.perf_counter() - start)
+        with lat_lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in task_ids]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, latencies
+
+
+def report(name, concurrency, elapsed, commits, latencies):
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<8} n={concurrency:<3} wall={elapsed:7.3f}s commits={commits:<6} "
+          f"commits/s={commits / elapsed:9.1f} hook mean={statistics.mean(latencies) * 1e6:8.1f}us "
+          f"p95={p95 * 1e6:8.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hooks', type=int, default=1000, help="progress hooks per download")
+    args = parser.parse_args()
+
+    for concurrency in (1, 10, 50):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DBManager(os.path.join(tmp, 'bench.db'))
+            task_ids = [db.add_task(f"https://example.com/{i}") for i in range(concurrency)]
+            db.flush()
+            base = db.writer.stats['commits']
+            elapsed, lat = simulate(db.update_status, task_ids, args.hooks, legacy=False)
+            db.flush()
+            report("writer", concurrency, elapsed, db.writer.stats['commits'] - base, lat)
+            db.close()
+
+            legacy = LegacyDB(os.path.join(tmp, 'bench.db'))
+            elapsed, lat = simulate(legacy.update_status, task_ids, args.hooks, legacy=True)
+            report("legacy", concurrency, elapsed, legacy.commits, lat)
+            legacy.conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Deduplication check:
+
+  1. media keys: different spellings of the same link map to one key (offline)
+  2. lookup cost: DedupIndex.add() for a duplicate against 1k and 10k rows
+  3. end to end with DownloadManager against local servers:
+     - re-adding a finished HLS stream under a tracking-param link: no network at all
+     - a different URL that extracts to the same media: no segments fetched
+     - two direct links serving the same bytes: the second file becomes a hard link
+
+    python benchmarks/bench_dedup.py [--rows 10000]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DBManager
+from dedup import media_key
+from download_service import DownloadManager
+from hls_fixture import HlsFixtureServer
+from progress_bus import ProgressBus
+
+SAME_MEDIA = [
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://youtu.be/dQw4w9WgXcQ?si=Ab12Cd34",
+    "https://m.youtube.com/watch?v=dQw4w9WgXcQ&feature=share",
+    "https://www.youtube.com/shorts/dQw4w9WgXcQ",
+    "https://example.com/files/talk.mp4?utm_source=newsletter&utm_medium=email",
+    "https://www.example.com/files/talk.mp4#t=30",
+    "magnet:?xt=urn:btih:C12FE1C06BBA254A9DC9F519B335AA7C1367A88A&dn=ubuntu",
+    "magnet:?dn=ubuntu-iso&xt=urn:btih:c12fe1c06bba254a9dc9f519b335aa7c1367a88a&tr=udp://tracker",
+]
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass # the range probe hangs up early
+
+
+def lookup_cost(rows):
+    data_dir = tempfile.mkdtemp(prefix='bench_dedup_')
+    db = DBManager(os.path.join(data_dir, 'downloads.db'))
+    manager = DownloadManager(db, ProgressBus(), lambda: data_dir)
+    def fill(conn):
+        conn.executemany(
+            "INSERT INTO downloads (id, url, status, progress, format, quality) VALUES (?, ?, 'Completed', 100, 'video', 'best')",
+            [(i, f"https://example.com/v/{i}") for i in range(1, rows + 1)]
+        )
+        conn.executemany(
+            "INSERT INTO media_index (media_key, task_id) VALUES (?, ?)",
+            [(f"url:https://example.com/v/{i}", i) for i in range(1, rows + 1)]
+        )
+    db.writer.call(fill)
+    url = f"https://www.example.com/v/{rows // 2}?utm_source=x"
+    manager.dedup.add(url) # warm up extractor matching
+    start = time.perf_counter()
+    for _ in range(200):
+        manager.dedup.add(url)
+    per_add = (time.perf_counter() - start) / 200
+    plan = db.cursor.execute(
+        "EXPLAIN QUERY PLAN SELECT downloads.* FROM media_index JOIN downloads ON downloads.id = media_index.task_id "
+        "WHERE media_index.media_key = ? AND format = ? AND quality = ?", ('k', 'video', 'best')
+    ).fetchall()
+    plan = ' / '.join(row['detail'] for row in plan)
+    db.close()
+    shutil.rmtree(data_dir, ignore_errors=True)
+    return per_add, plan
+
+
+def run(manager, db, url):
+    """add() + a synchronous download; returns (task_id, duplicate, final state)."""
+    task_id, duplicate = manager.dedup.add(url)
+    if duplicate == 'completed':
+        return task_id, duplicate, db.get_task(task_id)
+    states = []
+    listener = lambda t, state, info: states.append(state) if t == task_id else None
+    manager.state_listeners.append(listener)
+    manager._run_download(task_id, url, threading.Event(), lambda *a: None, lambda msg: print(f"Error: {msg}"))
+    manager.state_listeners.remove(listener)
+    db.flush()
+    return task_id, duplicate, db.get_task(task_id)
+
+
+def end_to_end():
+    work = tempfile.mkdtemp(prefix='bench_dedup_e2e_')
+    folder = os.path.join(work, 'downloads')
+    files = os.path.join(work, 'files')
+    for mirror in ('a', 'b'):
+        os.makedirs(os.path.join(files, mirror))
+        with open(os.path.join(files, mirror, f'release-{mirror}.zip'), 'wb') as f:
+            f.write(b'\x42' * (3 * 1024 * 1024))
+    static = QuietServer(('127.0.0.1', 0), partial(QuietHandler, directory=files))
+    threading.Thread(target=static.serve_forever, daemon=True).start()
+    hls = HlsFixtureServer(segments=20, latency=0.05).start()
+
+    db = DBManager(os.path.join(work, 'downloads.db'))
+    manager = DownloadManager(db, ProgressBus(), lambda: folder)
+    try:
+        start = time.perf_counter()
+        first, _, row = run(manager, db, hls.url)
+        print(f"HLS first download:            task {first}, {row['status']}, {hls.requests} segment requests, "
+              f"{time.perf_counter() - start:.2f}s")
+
+        hls.reset_stats()
+        start = time.perf_counter()
+        task_id, duplicate, row = run(manager, db, hls.url + "?utm_source=share")
+        print(f"same link + tracking param:    task {task_id} ({duplicate}), {hls.requests} segment requests, "
+              f"{(time.perf_counter() - start) * 1000:.1f}ms")
+
+        hls.reset_stats()
+        start = time.perf_counter()
+        task_id, duplicate, row = run(manager, db, hls.url + "?session=2")
+        print(f"other URL, same media id:      task {task_id} ({duplicate or 'new'}), {row['status']}, "
+              f"{hls.requests} segment requests, {time.perf_counter() - start:.2f}s")
+
+        base = f"http://127.0.0.1:{static.server_address[1]}"
+        _, _, row_a = run(manager, db, f"{base}/a/release-a.zip")
+        _, _, row_b = run(manager, db, f"{base}/b/release-b.zip")
+        linked = os.path.samefile(row_a['file_path'], row_b['file_path'])
+        print(f"same bytes from two links:     {os.path.basename(row_b['file_path'])} "
+              f"{'hard-linked to' if linked else 'separate from'} {os.path.basename(row_a['file_path'])} "
+              f"(links: {os.stat(row_b['file_path']).st_nlink})")
+        print(f"\ndedup stats: {manager.dedup.stats}")
+    finally:
+        db.close()
+        hls.stop()
+        static.shutdown()
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    keys = [media_key(url) for url in SAME_MEDIA]
+    print(f"media keys ({(time.perf_counter() - start) * 1000:.0f}ms incl. loading extractors):")
+    for url, key in zip(SAME_MEDIA, keys):
+        print(f"  {key:<48} <- {url}")
+    print(f"  {len(set(keys))} distinct keys for {len(keys)} links\n")
+
+    for rows in sorted({1000, args.rows}):
+        per_add, plan = lookup_cost(rows)
+        print(f"duplicate add against {rows:>6} rows: {per_add * 1000:.2f}ms  ({plan})")
+    print()
+
+    end_to_end()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Subprocess engine benchmark: DownloaderEngine (one blocking thread per
+process, items one after another) versus AsyncDownloaderEngine (one event
+loop, semaphore-bounded) on a queue of fake downloads.
+
+Each item is a python child that prints yt-dlp style progress lines, so
+no network or real binaries are needed. Also measures how long stop()
+takes to end a process that has gone quiet.
+
+    python benchmarks/bench_engine.py [--items 100] [--lines 10] [--interval 0.02] [--concurrency 4]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_engine import AsyncDownloaderEngine
+from downloader_engine import DownloaderEngine
+
+PROGRESS_SCRIPT = (
+    "import sys, time\n"
+    "n, interval = int(sys.argv[1]), float(sys.argv[2])\n"
+    "for i in range(n):\n"
+    "    print(f'[download] {(i + 1) * 100 / n:5.1f}% of 10.00MiB at 1.00MiB/s ETA 00:01', flush=True)\n"
+    "    time.sleep(interval)\n"
+)
+SILENT_SCRIPT = "import time; print('[download] starting', flush=True); time.sleep(float(__import__('sys').argv[1]))"
+
+
+class FakeCommands:
+    """Mixin: every URL maps to the fake progress script instead of yt-dlp."""
+    script = PROGRESS_SCRIPT
+    script_args = ('10', '0.02')
+
+    def build_command(self, url, folder):
+        return [sys.executable, '-c', self.script, *self.script_args]
+
+
+class FakeThreadEngine(FakeCommands, DownloaderEngine):
+    pass
+
+
+class FakeAsyncEngine(FakeCommands, AsyncDownloaderEngine):
+    pass
+
+
+class PeakThreads:
+    def __init__(self):
+        self.peak = threading.active_count()
+        self.running = True
+        self.thread = threading.Thread(target=self._poll, daemon=True)
+        self.thread.start()
+
+    def _poll(self):
+        while self.running:
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(0.005)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        return self.peak
+
+
+def run_queue(label, engine, run):
+    events = []
+    engine.output_callback = lambda line: None
+    engine.progress_callback = events.append
+    threads = PeakThreads()
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    peak = threads.stop()
+    print(f"{label:<22} {elapsed:8.2f}s  {len(events):>6} progress events  peak threads {peak}")
+    return elapsed
+
+
+def thread_pool_queue(engine, urls, concurrency):
+    # What "just use more threads" looks like with the blocking engine
+    folder = engine.get_download_folder()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda url: engine.detect_and_download(url, folder), urls))
+
+
+def cancel_latency(engine, run, quiet_seconds):
+    engine.script = SILENT_SCRIPT
+    engine.script_args = (str(quiet_seconds),)
+    engine.output_callback = lambda line: None
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    time.sleep(0.5) # let the child start and go quiet
+    start = time.perf_counter()
+    if isinstance(engine, AsyncDownloaderEngine):
+        engine.stop()
+    else:
+        engine.stop_event.set()
+    thread.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--lines', type=int, default=10, help="progress lines per item")
+    parser.add_argument('--interval', type=float, default=0.02, help="seconds between lines")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--quiet', type=float, default=3.0, help="silent child duration for the cancel test")
+    args = parser.parse_args()
+
+    urls = [f"https://example.com/watch?v={i}" for i in range(args.items)]
+    script_args = (str(args.lines), str(args.interval))
+    print(f"{args.items} items x {args.lines} lines every {args.interval}s, concurrency {args.concurrency}\n")
+
+    engine = FakeThreadEngine()
+    engine.script_args = script_args
+    sequential = run_queue("thread, sequential", engine, lambda: engine.process_queue(urls))
+
+    engine = FakeThreadEngine()
+    engine.script_args = script_args
+    pooled = run_queue(f"thread pool x{args.concurrency}", engine,
+                       lambda: thread_pool_queue(engine, urls, args.concurrency))
+
+    engine = FakeAsyncEngine(max_concurrent=args.concurrency)
+    engine.script_args = script_args
+    asynced = run_queue(f"asyncio x{args.concurrency}", engine, lambda: engine.process_queue(urls))
+
+    print(f"\nasyncio vs sequential: {sequential / asynced:.1f}x faster; vs thread pool: {pooled / asynced:.2f}x")
+
+    engine = FakeThreadEngine()
+    thread_cancel = cancel_latency(engine, lambda: engine.process_queue(urls[:1]), args.quiet)
+    engine = FakeAsyncEngine(max_concurrent=args.concurrency)
+    async_cancel = cancel_latency(engine, lambda: engine.process_queue(urls[:1]), args.quiet)
+    print(f"\ncancel a quiet process: thread {thread_cancel * 1000:.0f}ms, asyncio {async_cancel * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
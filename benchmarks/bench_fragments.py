@@ -0,0 +1,93 @@
+"""
+Fragment parallelism benchmark: yt-dlp downloading an HLS stream from the
+local fixture server (benchmarks/hls_fixture.py) with the options
+DownloadManager uses, at several `concurrent_fragment_downloads` values.
+
+Needs yt-dlp installed (it is in requirements.txt); no ffmpeg or network.
+
+    python benchmarks/bench_fragments.py [--segments 40] [--size 256K] [--latency 0.15] [--rate 2M] [--fragments 1 2 4 8 16]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bandwidth import parse_rate
+from downloader_engine import HTTP_CHUNK_SIZE
+from hls_fixture import HlsFixtureServer
+from http_engine import format_bytes
+
+
+class QuietLogger:
+    def debug(self, msg): pass
+    def info(self, msg): pass
+    def warning(self, msg): pass
+    def error(self, msg): print(f"yt-dlp Error: {msg}")
+
+
+def download(url, folder, fragments):
+    import yt_dlp
+    ydl_opts = {
+        'outtmpl': os.path.join(folder, '%(title)s.%(ext)s'),
+        'logger': QuietLogger(),
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+        'fixup': 'never', # no ffmpeg here; the fixture is raw TS anyway
+        # Same knobs as DownloadManager._run_download
+        'concurrent_fragment_downloads': fragments,
+        'http_chunk_size': HTTP_CHUNK_SIZE,
+        'buffersize': 64 * 1024,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+        return ydl.prepare_filename(info)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--segments', type=int, default=40)
+    parser.add_argument('--size', default='256K', help="bytes per segment")
+    parser.add_argument('--latency', type=float, default=0.15, help="seconds before each segment's first byte")
+    parser.add_argument('--rate', default='2M', help="per-connection bytes/s (0 = unlimited)")
+    parser.add_argument('--fragments', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    try:
+        import yt_dlp # noqa: F401
+    except ImportError:
+        sys.exit("yt-dlp is not installed (pip install -r requirements.txt)")
+
+    server = HlsFixtureServer(
+        segments=args.segments, segment_size=parse_rate(args.size),
+        latency=args.latency, connection_rate=parse_rate(args.rate)
+    ).start()
+    print(f"{args.segments} segments x {format_bytes(server.segment_size)}, "
+          f"{args.latency * 1000:.0f}ms latency, {args.rate}/s per connection\n")
+
+    baseline = None
+    try:
+        for fragments in args.fragments:
+            folder = tempfile.mkdtemp(prefix='bench_fragments_')
+            server.reset_stats()
+            try:
+                start = time.perf_counter()
+                path = download(server.url, folder, fragments)
+                elapsed = time.perf_counter() - start
+                size = os.path.getsize(path)
+            finally:
+                shutil.rmtree(folder, ignore_errors=True)
+            ok = "ok" if size == server.total_bytes else f"SIZE MISMATCH {size}"
+            baseline = baseline or elapsed
+            print(f"fragments {fragments:>2}: {elapsed:6.2f}s  {format_bytes(size / elapsed):>10}/s  "
+                  f"{baseline / elapsed:4.1f}x  peak in flight {server.peak_in_flight:>2}  {ok}")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Replays captured yt-dlp / aria2c console output (benchmarks/fixtures) through
+ProgressParser: checks the parsed events against what the capture shows,
+then reports how many callbacks the rate cap saves and parse throughput.
+
+    python benchmarks/bench_progress_parser.py [--interval 0.5]
+"""
+import argparse
+import os
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from progress_parser import ProgressParser, parse_aria2_line, parse_duration, parse_size, parse_ytdlp_line
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), newline='') as f:
+        return f.read()
+
+
+def replay(text, interval, line_seconds=0.05):
+    """Feed text in small chunks on a simulated clock advancing `line_seconds` per line."""
+    events, lines = [], []
+    clock = [0.0]
+    parser = ProgressParser(events.append, lines.append, min_interval=interval)
+    with mock.patch('progress_parser.time.monotonic', lambda: clock[0]):
+        for i in range(0, len(text), 97):
+            chunk = text[i:i + 97]
+            clock[0] += line_seconds * (chunk.count('\n') + chunk.count('\r'))
+            parser.feed(chunk)
+        parser.close()
+    return parser, events, lines
+
+
+def check(label, condition):
+    print(f"  {'ok  ' if condition else 'FAIL'} {label}")
+    return condition
+
+
+def verify():
+    ok = True
+    print("parsing")
+    ok &= check("sizes", parse_size('10.50MiB') == 11010048 and parse_size('~ 1.0GiB') == 1024 ** 3 and parse_size('512B') == 512)
+    ok &= check("durations", parse_duration('01:05') == 65 and parse_duration('4m51s') == 291 and parse_duration('1:00:00') == 3600)
+
+    event = parse_ytdlp_line('[download]  45.0% of ~  48.20MiB at    3.10MiB/s ETA 00:08 (frag 54/120)')
+    ok &= check("yt-dlp fragment line", event.percent == 45.0 and event.fragment == (54, 120)
+                and event.eta == 8 and event.speed == parse_size('3.10MiB'))
+    event = parse_ytdlp_line('[download] 100% of   10.50MiB in 00:00:07 at 1.45MiB/s')
+    ok &= check("yt-dlp finished line", event.status == 'finished' and event.total == 11010048)
+    ok &= check("yt-dlp non-progress line", parse_ytdlp_line('[download] Destination: a.mp4') is None)
+    events = parse_aria2_line(fixture('aria2c_readout.txt').splitlines()[1])
+    ok &= check("aria2c two downloads in one readout", [e.key for e in events] == ['2089b0', 'c1d3e2']
+                and events[1].connections == 16 and events[1].eta is not None)
+
+    print("streams")
+    parser, events, lines = replay(fixture('ytdlp_console.txt'), 0.5)
+    ok &= check("yt-dlp --newline: two finished events", sum(e.status == 'finished' for e in events) == 2)
+    ok &= check("yt-dlp --newline: log lines kept", '[Merger] Merging formats into "out.mp4"' in lines
+                and not any('%' in line and 'of' in line for line in lines))
+    _, cr_events, _ = replay(fixture('ytdlp_console_cr.txt'), 0.5)
+    ok &= check("yt-dlp \\r redraws parse like --newline", cr_events == events)
+    _, events, _ = replay(fixture('ytdlp_template.txt'), 0.5)
+    ok &= check("yt-dlp --progress-template JSON", events[-1].status == 'finished'
+                and events[-1].downloaded == events[-1].total and events[0].key == 'clip.mp4')
+    _, events, lines = replay(fixture('aria2c_readout.txt'), 0.5)
+    last = {e.key: e for e in events}
+    ok &= check("aria2c last sample per GID", last['2089b0'].percent == 100 and last['c1d3e2'].connections == 16)
+    ok &= check("aria2c summary kept as log lines", any(line.startswith('2089b0|OK') for line in lines))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--interval', type=float, default=0.5, help="rate cap (seconds) per download")
+    args = parser.parse_args()
+    ok = verify()
+
+    print(f"\nrate cap {args.interval}s, 20 lines/s simulated")
+    for name in ('ytdlp_console.txt', 'ytdlp_console_cr.txt', 'ytdlp_template.txt', 'aria2c_readout.txt'):
+        text = fixture(name)
+        p, events, _ = replay(text, args.interval)
+        start = time.perf_counter()
+        for _ in range(20):
+            replay(text, args.interval)
+        per_mb = (time.perf_counter() - start) / 20 / (len(text) / 1e6)
+        print(f"{name:<22} {p.stats['progress_lines']:>5} progress lines -> {p.stats['events']:>4} events "
+              f"({p.stats['dropped']} dropped), {per_mb * 1000:.0f} ms/MB")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
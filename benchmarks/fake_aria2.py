@@ -0,0 +1,190 @@
+"""
+In-process stand-in for `aria2c --enable-rpc`, for exercising aria2_rpc.py
+without the real binary or any network.
+
+Every added download "transfers" `size` bytes at `speed` bytes/s from the
+moment it is added. Magnet links first complete a metadata download that
+is followedBy the real one, like aria2 does; URIs containing "fail" end
+in an error. Requests are counted per method in `server.calls`,
+HTTP round trips in `server.requests`.
+
+    server = FakeAria2Server(secret='s3cret').start()
+    client = Aria2Client(server.url, secret='s3cret')
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Download:
+    def __init__(self, gid, uri, folder, size, speed):
+        self.gid = gid
+        self.uri = uri
+        self.dir = folder
+        self.size = size
+        self.speed = speed
+        self.done = 0
+        self.started = time.monotonic()
+        self.paused = False
+        self.removed = False
+        self.followed_by = None
+
+    def completed_length(self):
+        if not self.paused and not self.removed:
+            self.done = min(self.size, self.done + int((time.monotonic() - self.started) * self.speed))
+            self.started = time.monotonic()
+        return self.done
+
+    def status(self):
+        done = self.completed_length()
+        if self.removed:
+            state = 'removed'
+        elif 'fail' in self.uri and done >= self.size // 2:
+            state = 'error'
+        elif done >= self.size:
+            state = 'complete'
+        else:
+            state = 'paused' if self.paused else 'active'
+        name = self.uri.rstrip('/').rsplit('/', 1)[-1] or 'file'
+        result = {
+            'gid': self.gid,
+            'status': state,
+            'totalLength': str(self.size),
+            'completedLength': str(done),
+            'downloadSpeed': str(0 if state != 'active' else self.speed),
+            'dir': self.dir,
+            'files': [{'path': f"{self.dir}/{name}", 'length': str(self.size)}],
+        }
+        if state == 'error':
+            result['errorCode'] = '1'
+            result['errorMessage'] = 'Simulated failure'
+        if self.followed_by:
+            result['followedBy'] = [self.followed_by]
+        return result
+
+
+class FakeAria2Server:
+    def __init__(self, port=0, secret=None, size=4 * 1024 * 1024, speed=8 * 1024 * 1024):
+        self.secret = secret
+        self.size = size
+        self.speed = speed
+        self.downloads = {}
+        self.next_gid = 1
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.requests = 0 # HTTP round trips; a multicall counts once
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with server.lock:
+                    server.requests += 1
+                reply = server.handle(json.loads(body))
+                data = json.dumps(reply).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/jsonrpc"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # --- JSON-RPC ---
+    def handle(self, request):
+        try:
+            result = self.dispatch(request['method'], list(request.get('params') or []))
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}
+        except Exception as e:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': 1, 'message': str(e)}}
+
+    def dispatch(self, method, params):
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        if method == 'system.multicall':
+            results = []
+            for call in params[0]:
+                try:
+                    results.append([self.dispatch(call['methodName'], list(call.get('params') or []))])
+                except Exception as e:
+                    results.append({'code': 1, 'message': str(e)})
+            return results
+        if self.secret is not None:
+            if not params or params[0] != f"token:{self.secret}":
+                raise Exception("Unauthorized")
+            params = params[1:]
+        return getattr(self, 'rpc_' + method.replace('aria2.', ''))(*params)
+
+    def _add(self, uri, options):
+        with self.lock:
+            gid = f"{self.next_gid:016x}"
+            self.next_gid += 1
+            download = _Download(gid, uri, (options or {}).get('dir', '.'), self.size, self.speed)
+            self.downloads[gid] = download
+        return download
+
+    def _get(self, gid):
+        if gid not in self.downloads:
+            raise Exception(f"GID {gid} is not found")
+        return self.downloads[gid]
+
+    def rpc_getVersion(self):
+        return {'version': 'fake', 'enabledFeatures': ['BitTorrent']}
+
+    def rpc_addUri(self, uris, options=None):
+        download = self._add(uris[0], options)
+        if uris[0].startswith('magnet:'):
+            # Metadata is tiny and arrives at once; the payload follows under a new GID
+            download.size = 1
+            download.done = 1
+            download.followed_by = self._add(uris[0] + '/payload', options).gid
+        return download.gid
+
+    def rpc_addTorrent(self, torrent, uris=None, options=None):
+        return self._add('torrent', options).gid
+
+    def rpc_tellStatus(self, gid, keys=None):
+        return _pick(self._get(gid).status(), keys)
+
+    def rpc_tellActive(self, keys=None):
+        active = [d.status() for d in list(self.downloads.values())]
+        return [_pick(status, keys) for status in active if status['status'] == 'active']
+
+    def rpc_forcePause(self, gid):
+        download = self._get(gid)
+        download.completed_length()
+        download.paused = True
+        return gid
+
+    def rpc_unpause(self, gid):
+        download = self._get(gid)
+        download.paused = False
+        download.started = time.monotonic()
+        return gid
+
+    def rpc_forceRemove(self, gid):
+        self._get(gid).removed = True
+        return gid
+
+    def rpc_shutdown(self):
+        return 'OK'
+
+
+def _pick(status, keys):
+    return {key: value for key, value in status.items() if not keys or key in keys}
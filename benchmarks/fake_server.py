@@ -0,0 +1,235 @@
+"""
+Local HTTP server with synthetic content for benchmarks, no network needed.
+
+    /files/<size>/<name>          range-capable file (206, ETag, If-Range, HEAD)
+    /plain/<size>/<name>          same bytes, but Range is ignored (always 200)
+    /hls/<segments>/video.m3u8    VOD HLS playlist of <segments> MPEG-TS segments
+    /hls/<segments>/segNNNNN.ts   one segment of `segment_size` bytes
+
+File bytes are a seeded pseudo-random block repeated, so any range can be
+served without keeping the file in memory and expected_sha256() tells
+whether a download came out intact.
+
+Every data request (files and segments, not playlists) waits `latency`
+seconds before the first byte and is then sent at most at `rate` bytes/s
+per connection (None = as fast as possible). Faults are injected by
+counting data requests: every `fail_every`-th one is answered with a 503,
+every `cut_every`-th one sends half its body and drops the connection,
+until `fault_limit` faults have been injected (0 = no limit).
+
+    server = FakeMediaServer(latency=0.05, rate=8 * 1024 ** 2).start()
+    url = server.file_url(64 * 1024 ** 2)
+    server.configure(fail_every=10)
+"""
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TS_PACKET = 188
+BLOCK_SIZE = 1024 * 1024 # period of the synthetic file content
+SEND_CHUNK = 64 * 1024
+LAST_MODIFIED = 'Mon, 01 Jan 2024 00:00:00 GMT'
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass # clients drop keep-alive connections when they are done
+
+
+class FakeMediaServer:
+    def __init__(self, port=0, latency=0.0, rate=None, fail_every=0, cut_every=0, fault_limit=0,
+                 segment_size=256 * 1024, segment_duration=4, seed=1):
+        self.latency = latency
+        self.rate = rate
+        self.fail_every = fail_every
+        self.cut_every = cut_every
+        self.fault_limit = fault_limit
+        self.segment_size = segment_size - segment_size % TS_PACKET
+        self.segment_duration = segment_duration
+        self.seed = seed
+        self.block = random.Random(seed).randbytes(BLOCK_SIZE)
+        # Null TS packets: valid enough for a downloader that only concatenates
+        self.segment = (b'\x47\x1f\xff\x10' + b'\xff' * (TS_PACKET - 4)) * (self.segment_size // TS_PACKET)
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.in_flight = 0
+        self.reset_stats()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.handle(self, head=False)
+
+            def do_HEAD(self):
+                server.handle(self, head=True)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = _Server(('127.0.0.1', port), Handler)
+
+    # --- Control ---
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def file_url(self, size, name='file.bin', ranges=True):
+        return f"{self.base_url}/{'files' if ranges else 'plain'}/{size}/{name}"
+
+    def hls_url(self, segments):
+        return f"{self.base_url}/hls/{segments}/video.m3u8"
+
+    def configure(self, **settings):
+        """Change latency, rate, fail_every, cut_every or fault_limit between runs."""
+        with self.lock:
+            for name, value in settings.items():
+                if name not in ('latency', 'rate', 'fail_every', 'cut_every', 'fault_limit'):
+                    raise ValueError(f"unknown setting {name}")
+                setattr(self, name, value)
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {'requests': 0, 'bytes_sent': 0, 'failed': 0, 'cut': 0, 'peak_in_flight': 0}
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True, name="FakeMediaServer").start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # --- Content ---
+    def etag(self, size):
+        return f'"{self.seed}-{size}"'
+
+    def content(self, start, end):
+        """Bytes start..end (inclusive) of every synthetic file."""
+        out = bytearray()
+        offset = start
+        while offset <= end:
+            pos = offset % BLOCK_SIZE
+            take = min(BLOCK_SIZE - pos, end + 1 - offset)
+            out += self.block[pos:pos + take]
+            offset += take
+        return bytes(out)
+
+    def expected_sha256(self, size):
+        digest = hashlib.sha256()
+        for start in range(0, size, BLOCK_SIZE):
+            digest.update(self.content(start, min(size, start + BLOCK_SIZE) - 1))
+        return digest.hexdigest()
+
+    def playlist(self, segments):
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:3',
+            f'#EXT-X-TARGETDURATION:{self.segment_duration}',
+            '#EXT-X-MEDIA-SEQUENCE:0',
+            '#EXT-X-PLAYLIST-TYPE:VOD',
+        ]
+        for i in range(segments):
+            lines.append(f'#EXTINF:{self.segment_duration:.3f},')
+            lines.append(f'seg{i:05d}.ts')
+        lines.append('#EXT-X-ENDLIST')
+        return '\n'.join(lines) + '\n'
+
+    # --- Requests ---
+    def handle(self, handler, head):
+        parts = handler.path.split('?')[0].strip('/').split('/')
+        try:
+            kind, number, name = parts[0], int(parts[1]), parts[2]
+        except (IndexError, ValueError):
+            handler.send_error(404)
+            return
+        if kind == 'hls' and name.endswith('.m3u8'):
+            data = self.playlist(number).encode('utf-8')
+            self._headers(handler, 200, len(data), 'application/vnd.apple.mpegurl')
+            if not head:
+                handler.wfile.write(data)
+        elif kind == 'hls' and name.startswith('seg') and name.endswith('.ts'):
+            self._serve(handler, head, 200, len(self.segment), 'video/mp2t', lambda start, end: self.segment[start:end + 1])
+        elif kind in ('files', 'plain'):
+            self._serve_file(handler, head, number, ranges=(kind == 'files'))
+        else:
+            handler.send_error(404)
+
+    def _serve_file(self, handler, head, size, ranges):
+        start, end, status = 0, size - 1, 200
+        requested = handler.headers.get('Range')
+        if_range = handler.headers.get('If-Range')
+        if ranges and requested and (not if_range or if_range in (self.etag(size), LAST_MODIFIED)):
+            try:
+                first, last = requested.split('=', 1)[1].split(',')[0].split('-')
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            except ValueError:
+                start, end = 0, size - 1
+            if start > end:
+                handler.send_response(416)
+                handler.send_header('Content-Range', f'bytes */{size}')
+                handler.send_header('Content-Length', '0')
+                handler.end_headers()
+                return
+            status = 206
+        extra = {'ETag': self.etag(size), 'Last-Modified': LAST_MODIFIED}
+        if ranges:
+            extra['Accept-Ranges'] = 'bytes'
+        if status == 206:
+            extra['Content-Range'] = f'bytes {start}-{end}/{size}'
+        self._serve(handler, head, status, end - start + 1, 'application/octet-stream',
+                    lambda a, b: self.content(start + a, start + b), extra)
+
+    def _headers(self, handler, status, length, content_type, extra=None):
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(length))
+        for name, value in (extra or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+
+    def _serve(self, handler, head, status, length, content_type, body, extra=None):
+        """Send a data response of length bytes, body(start, end) giving its slices; applies latency, rate and faults."""
+        if head:
+            self._headers(handler, status, length, content_type, extra)
+            return
+        with self.lock:
+            self.stats['requests'] += 1
+            count = self.stats['requests']
+            faults = self.stats['failed'] + self.stats['cut']
+            allowed = not self.fault_limit or faults < self.fault_limit
+            fail = allowed and self.fail_every and count % self.fail_every == 0
+            cut = allowed and not fail and self.cut_every and count % self.cut_every == 0
+            self.stats['failed' if fail else 'cut'] += bool(fail or cut)
+            self.in_flight += 1
+            self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], self.in_flight)
+            latency, rate = self.latency, self.rate
+        sent = 0
+        try:
+            if latency:
+                time.sleep(latency)
+            if fail:
+                self._headers(handler, 503, 0, 'text/plain', {'Retry-After': '0'})
+                return
+            self._headers(handler, status, length, content_type, extra)
+            limit = length // 2 if cut else length
+            while sent < limit:
+                chunk = body(sent, min(limit, sent + SEND_CHUNK) - 1)
+                handler.wfile.write(chunk)
+                sent += len(chunk)
+                if rate:
+                    time.sleep(len(chunk) / rate)
+            if cut:
+                handler.close_connection = True
+        except (BrokenPipeError, ConnectionResetError):
+            pass # the client gave up (cancel, or a sibling segment failed)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+                self.stats['bytes_sent'] += sent
@@ -0,0 +1,39 @@
+"""
+Local HLS server for exercising fragment downloads without any network.
+
+/video.m3u8 is a VOD media playlist of `segments` MPEG-TS segments of
+`segment_size` bytes each. Every segment request waits `latency` seconds
+before the first byte (a mobile round trip) and is then sent at most at
+`connection_rate` bytes/s (None = as fast as possible), so fetching
+fragments one at a time pays the latency once per segment.
+
+    server = HlsFixtureServer(segments=40, latency=0.15).start()
+    url = server.url  # http://127.0.0.1:PORT/hls/40/video.m3u8
+
+A FakeMediaServer (see fake_server.py) serving one playlist.
+"""
+from fake_server import FakeMediaServer
+
+
+class HlsFixtureServer(FakeMediaServer):
+    def __init__(self, port=0, segments=40, segment_size=256 * 1024, segment_duration=4,
+                 latency=0.15, connection_rate=None):
+        super().__init__(port=port, latency=latency, rate=connection_rate,
+                         segment_size=segment_size, segment_duration=segment_duration)
+        self.segments = segments
+
+    @property
+    def url(self):
+        return self.hls_url(self.segments)
+
+    @property
+    def total_bytes(self):
+        return self.segments * self.segment_size
+
+    @property
+    def requests(self):
+        return self.stats['requests']
+
+    @property
+    def peak_in_flight(self):
+        return self.stats['peak_in_flight']
@@ -0,0 +1,349 @@
+"""
+Reproducible benchmark suite: DownloadManager, its engines and DBManager
+driven headless against a local FakeMediaServer (see fake_server.py).
+
+Each scenario runs in a fresh interpreter so CPU time and peak RSS belong
+to it alone; the server runs in this process and is not counted. Results
+are printed as a table and can be saved as JSON and compared with an
+earlier run:
+
+    python benchmarks/run_benchmarks.py [--out results.json] [--compare old.json]
+        [--only direct_ranges hls] [--repeat 3] [--scale 0.25]
+        [--latency 0.05] [--rate 16M]
+
+Download scenarios report wall time, throughput, time to first byte (the
+telemetry 'connect' phase), CPU seconds, peak RSS, attempts, new
+connections and how many requests reused one, and whether the file came
+out intact; db_writes reports write rates of the DB writer.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bandwidth import parse_rate
+from http_engine import format_bytes
+from fake_server import FakeMediaServer
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+MiB = 1024 * 1024
+
+# name: (what it measures, server settings, downloads); sizes are scaled by --scale
+SCENARIOS = {
+    'direct_ranges': ("one large file, segmented over ranged connections", {}, {'files': [64 * MiB]}),
+    'direct_no_ranges': ("the same file from a server without Range support", {}, {'files': [64 * MiB], 'ranges': False}),
+    'direct_many': ("a queue of small files through the scheduler", {}, {'files': [2 * MiB] * 24}),
+    'direct_faults': ("a large file while every 4th request is cut off halfway, twice",
+                      {'cut_every': 4, 'fault_limit': 2}, {'files': [64 * MiB], 'attempts': 10}),
+    'hls': ("an HLS stream through yt-dlp with parallel fragments", {}, {'segments': 80}),
+    'db_writes': ("DB writer: progress ticks, single and bulk inserts", None, {}),
+}
+# Numbers where a smaller value is better, for --compare
+LOWER_IS_BETTER = ('seconds', 'ttfb_s', 'cpu_s', 'peak_rss', 'attempts', 'commits', 'connections')
+
+
+# --- Child process: one scenario ---
+def usage():
+    if resource is None:
+        return 0.0, None
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = own.ru_maxrss if sys.platform == 'darwin' else own.ru_maxrss * 1024
+    return cpu, rss
+
+
+def sha256_of(path):
+    from dedup import file_hash
+    return file_hash(path)
+
+
+def run_downloads(urls, attempts=1, max_concurrent=3, fragments=None):
+    """Download urls through a DownloadManager; retries a failed task (resuming) up to attempts times."""
+    import queue
+    import net_pool
+    from database import DBManager
+    from download_service import DownloadManager
+    from progress_bus import ProgressBus
+
+    work = tempfile.mkdtemp(prefix='run_benchmarks_')
+    folder = os.path.join(work, 'downloads')
+    db = DBManager(os.path.join(work, 'downloads.db'))
+    if fragments:
+        db.set_setting('fragments', fragments)
+    manager = DownloadManager(db, ProgressBus(), lambda: folder, max_concurrent=max_concurrent)
+    events = queue.Queue()
+    tasks = {db.add_task(url): url for url in urls}
+    tries = dict.fromkeys(tasks, 0)
+    commits = db.writer.stats['commits']
+
+    def start(task_id):
+        tries[task_id] += 1
+        manager.start_download(task_id, tasks[task_id], None,
+                               lambda filepath, title, t=task_id: events.put((t, filepath)),
+                               lambda message, t=task_id: events.put((t, None)))
+
+    cpu, _ = usage()
+    began = time.perf_counter()
+    for task_id in tasks:
+        start(task_id)
+    files, failed = {}, []
+    while len(files) + len(failed) < len(tasks):
+        task_id, filepath = events.get()
+        if filepath is not None:
+            files[task_id] = filepath
+        elif tries[task_id] < attempts:
+            # The worker is still finishing up; the resume state is saved by then
+            while manager.is_running(task_id):
+                time.sleep(0.01)
+            start(task_id)
+        else:
+            failed.append(task_id)
+    seconds = time.perf_counter() - began
+    cpu_end, rss = usage()
+
+    # Metrics rows are written as each worker finishes, just after its callback
+    while any(manager.is_running(task_id) for task_id in tasks):
+        time.sleep(0.01)
+    db.flush()
+    metrics = [db.get_metrics(task_id)[0] for task_id in tasks]
+    size = sum(os.path.getsize(path) for path in files.values())
+    net = net_pool.stats()
+    result = {
+        'seconds': round(seconds, 3),
+        'bytes': size,
+        'throughput_bps': round(size / seconds, 1),
+        'ttfb_s': round(statistics.median(row['connect_s'] for row in metrics), 4),
+        'cpu_s': round(cpu_end - cpu, 3),
+        'peak_rss': rss,
+        'attempts': sum(tries.values()),
+        'failed': len(failed),
+        'commits': db.writer.stats['commits'] - commits,
+        'connections': net['connections'],
+        'reuse_ratio': net['reuse_ratio'],
+        'sha256': sorted(sha256_of(path) for path in files.values()),
+    }
+    db.close()
+    shutil.rmtree(work, ignore_errors=True)
+    return result
+
+
+def run_db_writes(scale):
+    from database import DBManager
+
+    work = tempfile.mkdtemp(prefix='run_benchmarks_db_')
+    db = DBManager(os.path.join(work, 'downloads.db'))
+    result = {}
+    cpu, _ = usage()
+
+    count = max(1, int(500 * scale))
+    start = time.perf_counter()
+    ids = [db.add_task(f"https://example.com/file/{i}.bin") for i in range(count)]
+    result['add_task_per_s'] = round(count / (time.perf_counter() - start), 1)
+
+    rows = [(f"https://example.com/bulk/{i}.bin", None) for i in range(count * 20)]
+    start = time.perf_counter()
+    db.add_tasks(rows)
+    result['add_tasks_rows_per_s'] = round(len(rows) / (time.perf_counter() - start), 1)
+
+    # Progress ticks from 50 concurrent downloads, like progress hooks
+    ticks = max(1, int(400 * scale))
+    commits = db.writer.stats['commits']
+
+    def worker(task_id):
+        for i in range(ticks):
+            db.update_status(task_id, "Downloading", i * 100 / ticks)
+
+    threads = [threading.Thread(target=worker, args=(task_id,)) for task_id in ids[:50]]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    db.flush()
+    elapsed = time.perf_counter() - start
+    result['progress_ticks_per_s'] = round(len(threads) * ticks / elapsed, 1)
+    result['commits'] = db.writer.stats['commits'] - commits
+    cpu_end, rss = usage()
+    result['cpu_s'] = round(cpu_end - cpu, 3)
+    result['peak_rss'] = rss
+    db.close()
+    shutil.rmtree(work, ignore_errors=True)
+    return result
+
+
+def child_main(name, base_url, scale):
+    _, _, downloads = SCENARIOS[name]
+    if name == 'db_writes':
+        return run_db_writes(scale)
+    if 'segments' in downloads:
+        import importlib.util
+        if importlib.util.find_spec('yt_dlp') is None:
+            return {'skipped': "yt-dlp is not installed"}
+        segments = max(1, int(downloads['segments'] * scale))
+        return run_downloads([f"{base_url}/hls/{segments}/video.m3u8"], fragments=4)
+    kind = 'files' if downloads.get('ranges', True) else 'plain'
+    urls = [f"{base_url}/{kind}/{max(1, int(size * scale))}/file{i}.bin" for i, size in enumerate(downloads['files'])]
+    return run_downloads(urls, attempts=downloads.get('attempts', 1))
+
+
+# --- Parent process ---
+def run_scenario(server, name, scale):
+    settings = SCENARIOS[name][1] or {}
+    server.configure(fail_every=settings.get('fail_every', 0), cut_every=settings.get('cut_every', 0),
+                     fault_limit=settings.get('fault_limit', 0))
+    server.reset_stats()
+    run = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', name, '--base', server.base_url, '--scale', str(scale)],
+        capture_output=True, text=True, cwd=ROOT
+    )
+    lines = [line for line in run.stdout.splitlines() if line.startswith('RESULT ')]
+    if run.returncode != 0 or not lines:
+        return {'error': (run.stderr.strip().splitlines() or ['no result'])[-1]}
+    result = json.loads(lines[-1][len('RESULT '):])
+    if SCENARIOS[name][1] is not None:
+        result['server'] = dict(server.stats)
+    return result
+
+
+def check_intact(server, name, result, scale):
+    """Replace the file digests with a yes/no: did every download match what the server sent?"""
+    digests = result.pop('sha256', None)
+    if digests is None:
+        return
+    downloads = SCENARIOS[name][2]
+    if 'segments' in downloads:
+        result['intact'] = result['bytes'] == max(1, int(downloads['segments'] * scale)) * server.segment_size
+    else:
+        expected = sorted(server.expected_sha256(max(1, int(size * scale))) for size in downloads['files'])
+        result['intact'] = digests == expected
+
+
+def median_result(runs):
+    """Numbers are the median over runs; everything else comes from the first run."""
+    merged = dict(runs[0])
+    for key, value in runs[0].items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            values = [run[key] for run in runs if isinstance(run.get(key), (int, float))]
+            merged[key] = statistics.median(values)
+    merged['runs'] = len(runs)
+    return merged
+
+
+def describe(value, key):
+    if value is None:
+        return '-'
+    if key in ('bytes', 'peak_rss'):
+        return format_bytes(value)
+    if key.endswith('_bps'):
+        return format_bytes(value) + '/s'
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def print_results(results, baseline=None):
+    for name, result in results.items():
+        print(f"{name}: {SCENARIOS[name][0]}")
+        if 'error' in result or 'skipped' in result:
+            print(f"  {result.get('error') or result.get('skipped')}")
+            continue
+        old = (baseline or {}).get(name, {})
+        for key, value in result.items():
+            if key in ('server', 'runs'):
+                continue
+            line = f"  {key:<22} {describe(value, key):>14}"
+            previous = old.get(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and isinstance(previous, (int, float)) and previous:
+                change = (value - previous) / previous * 100
+                better = change < 0 if key in LOWER_IS_BETTER else change > 0
+                line += f"   was {describe(previous, key):>14} ({change:+.1f}%{', better' if better and abs(change) >= 5 else ''})"
+            print(line)
+        if result.get('server'):
+            server = result['server']
+            print(f"  server: {server['requests']} requests, {format_bytes(server['bytes_sent'])} sent, "
+                  f"{server['failed']} failed, {server['cut']} cut, peak {server['peak_in_flight']} in flight")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=ROOT).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmark suite against a local fake media server")
+    parser.add_argument('--only', nargs='+', choices=list(SCENARIOS), help="scenarios to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per scenario; numbers are the median")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply file sizes, segment and row counts")
+    parser.add_argument('--latency', type=float, default=0.05, help="server seconds before the first byte")
+    parser.add_argument('--rate', default='16M', help="server bytes/s per connection (K/M/G suffix, 0 = unlimited)")
+    parser.add_argument('--out', help="write results as JSON")
+    parser.add_argument('--compare', help="JSON from an earlier run to compare against")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--base', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print('RESULT ' + json.dumps(child_main(args.child, args.base, args.scale)))
+        return
+
+    rate = parse_rate(args.rate) or None
+    server = FakeMediaServer(latency=args.latency, rate=rate).start()
+    names = args.only or list(SCENARIOS)
+    results = {}
+    try:
+        for name in names:
+            runs = []
+            for _ in range(args.repeat):
+                result = run_scenario(server, name, args.scale)
+                check_intact(server, name, result, args.scale)
+                runs.append(result)
+                if 'error' in result or 'skipped' in result:
+                    break
+            results[name] = median_result(runs) if len(runs) > 1 else runs[0]
+    finally:
+        server.stop()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+
+    if args.out:
+        report = {
+            'meta': {
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+                'settings': {'scale': args.scale, 'latency': args.latency, 'rate': rate, 'repeat': args.repeat},
+            },
+            'results': results,
+        }
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\nSaved {args.out}")
+
+
+if __name__ == '__main__':
+    main()
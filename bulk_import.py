@@ -0,0 +1,101 @@
+"""
+Bulk add: links from pasted text, a text file or a share intent are read
+line by line, validated with the same rules as a single add, deduplicated
+against each other and the database, and inserted in one transaction.
+"""
+import io
+import re
+
+from dedup import media_key
+
+# A link inside a line of shared text ("Check this out: https://... via App")
+LINK_RE = re.compile(r'(?:https?|magnet|ftp|file):\S+', re.IGNORECASE)
+# Punctuation that ends a sentence rather than the link
+TRAILING = '.,;:!?\'")]}>'
+LOOKUP_BATCH = 1000 # links matched against the database per query batch
+
+
+def iter_lines(source):
+    """Lines of source without loading it all: pasted text, an open file or any iterable of lines."""
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    for line in source:
+        yield line.decode('utf-8', 'replace') if isinstance(line, bytes) else line
+
+
+def check_link(url):
+    """None if url can be downloaded, else why not (same rules as the single add)."""
+    if not (url.startswith("http://") or url.startswith("https://")):
+        return "only HTTP/HTTPS supported"
+    if url.lower().endswith(".torrent"):
+        return "torrent links are not supported"
+    return None
+
+
+def iter_links(source):
+    """Yields (url, None) for each usable link in source and (text, reason) for each rejected one."""
+    for line in iter_lines(source):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        found = False
+        for match in LINK_RE.finditer(line):
+            found = True
+            url = match.group(0).rstrip(TRAILING)
+            yield url, check_link(url)
+        if not found:
+            yield line[:80], "no link"
+
+
+def import_links(dedup, source, format_type='video', quality='best', fragments=None):
+    """
+    Add every link in source as a task. Returns
+    {'added': [ids], 'queued': [ids], 'completed': [ids], 'repeated': n, 'invalid': n, 'errors': [(text, reason)]}
+    where queued/completed are existing tasks for the same media and repeated counts
+    links that occur more than once in source.
+    """
+    result = {'added': [], 'queued': [], 'completed': [], 'repeated': 0, 'invalid': 0, 'errors': []}
+    seen = set()
+    batch = []
+
+    def lookup():
+        found = dedup.match_many(batch, format_type, quality)
+        for (url, key), existing in zip(batch, found):
+            if existing is None:
+                new.append((url, key))
+            else:
+                result[existing[1]].append(existing[0])
+        batch.clear()
+
+    new = []
+    for url, reason in iter_links(source):
+        if reason:
+            result['invalid'] += 1
+            if len(result['errors']) < 20: # enough to show; the count has the rest
+                result['errors'].append((url, reason))
+            continue
+        key = media_key(url)
+        if key in seen:
+            result['repeated'] += 1
+            continue
+        seen.add(key)
+        batch.append((url, key))
+        if len(batch) >= LOOKUP_BATCH:
+            lookup()
+    if batch:
+        lookup()
+    result['added'] = dedup.add_many(new, format_type, quality, fragments)
+    return result
+
+
+def summary(result):
+    parts = [f"{len(result['added'])} added"]
+    if result['queued']:
+        parts.append(f"{len(result['queued'])} already in downloads")
+    if result['completed']:
+        parts.append(f"{len(result['completed'])} already downloaded")
+    if result['repeated']:
+        parts.append(f"{result['repeated']} repeated")
+    if result['invalid']:
+        parts.append(f"{result['invalid']} invalid")
+    return ", ".join(parts)
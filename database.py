@@ -0,0 +1,572 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+
+class DBWriter(threading.Thread):
+    """
+    Single thread that owns the write connection.
+    Column updates are coalesced per (table, task id) and flushed together in one
+    transaction every `flush_interval` seconds, when `max_batch` tasks are
+    pending, or right away for urgent updates (status changes, paths).
+    Anything that needs a result (inserts, deletes) runs through call().
+    Updates to `downloads` are UPDATEs by id; other tables are per-task side
+    tables keyed by task_id and are upserted.
+    """
+    def __init__(self, db_path, flush_interval=0.5, max_batch=100):
+        super().__init__(daemon=True, name="DBWriter")
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.ready = threading.Event()
+        self.stats = {'mutations': 0, 'coalesced': 0, 'commits': 0, 'rows_written': 0}
+
+    # --- Producer side (any thread) ---
+    def update(self, task_id, urgent=False, table='downloads', **columns):
+        self.queue.put(('update', (table, task_id), columns, urgent))
+
+    def call(self, fn):
+        """Run fn(conn) on the writer thread inside a transaction and return its result."""
+        future = Future()
+        self.queue.put(('call', fn, future))
+        return future.result()
+
+    def flush(self):
+        """Block until every update queued so far is committed."""
+        self.call(lambda conn: None)
+
+    def stop(self):
+        self.queue.put(('stop',))
+        self.join()
+
+    # --- Writer thread ---
+    def run(self):
+        # Autocommit mode: transactions are opened explicitly in _transaction
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self.ready.set()
+
+        pending = {} # (table, task_id): {column: value}
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                self._transaction(conn, pending)
+                deadline = None
+                continue
+
+            kind = item[0]
+            if kind == 'update':
+                _, key, columns, urgent = item
+                self.stats['mutations'] += 1
+                if key in pending:
+                    self.stats['coalesced'] += 1
+                    pending[key].update(columns)
+                else:
+                    pending[key] = dict(columns)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if urgent or len(pending) >= self.max_batch:
+                    self._transaction(conn, pending)
+                    deadline = None
+            elif kind == 'call':
+                _, fn, future = item
+                self._transaction(conn, pending, fn, future)
+                deadline = None
+            elif kind == 'stop':
+                self._transaction(conn, pending)
+                break
+        conn.close()
+
+    def _transaction(self, conn, pending, fn=None, future=None):
+        """Write pending updates, plus an optional call, as a single commit."""
+        if not pending and fn is None:
+            return
+        result, error = None, None
+        try:
+            conn.execute('BEGIN')
+            for (table, task_id), columns in pending.items():
+                if table == 'downloads':
+                    assignments = ', '.join(f'{col} = ?' for col in columns)
+                    conn.execute(
+                        f'UPDATE downloads SET {assignments} WHERE id = ?',
+                        (*columns.values(), task_id)
+                    )
+                else:
+                    names = ', '.join(columns)
+                    marks = ', '.join('?' for _ in columns)
+                    updates = ', '.join(f'{col} = excluded.{col}' for col in columns)
+                    conn.execute(
+                        f'INSERT INTO {table} (task_id, {names}) VALUES (?, {marks}) '
+                        f'ON CONFLICT(task_id) DO UPDATE SET {updates}',
+                        (task_id, *columns.values())
+                    )
+                self.stats['rows_written'] += 1
+            if fn is not None:
+                # A failing call must not take the coalesced updates down with it
+                conn.execute('SAVEPOINT call')
+                try:
+                    result = fn(conn)
+                    conn.execute('RELEASE call')
+                except Exception as e:
+                    conn.execute('ROLLBACK TO call')
+                    conn.execute('RELEASE call')
+                    error = e
+            conn.execute('COMMIT')
+            self.stats['commits'] += 1
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            print(f"DB Writer Error: {e}")
+            error = error or e
+        pending.clear()
+        if future is not None:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+# --- Schema Migrations ---
+# Each entry upgrades the schema by one version (PRAGMA user_version).
+# Append new steps; never edit one that has shipped.
+def _migrate_base_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS downloads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL,
+            title TEXT,
+            status TEXT, -- Pending, Downloading, Paused, Completed, Error
+            progress INTEGER DEFAULT 0,
+            file_path TEXT,
+            format TEXT DEFAULT 'video', -- video (mp4), audio (mp3)
+            quality TEXT DEFAULT 'best', -- best, 1080p, 720p, 480p
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Databases from before versioning may lack the format/quality columns
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(downloads)')}
+    if 'format' not in columns:
+        conn.execute("ALTER TABLE downloads ADD COLUMN format TEXT DEFAULT 'video'")
+    if 'quality' not in columns:
+        conn.execute("ALTER TABLE downloads ADD COLUMN quality TEXT DEFAULT 'best'")
+
+
+def _migrate_listing_indexes(conn):
+    # id breaks timestamp ties (CURRENT_TIMESTAMP has 1 s resolution) for keyset paging
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_downloads_status_ts ON downloads (status, timestamp, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_downloads_ts ON downloads (timestamp, id)')
+
+
+def _migrate_download_state(conn):
+    # Byte-level resume data: validators plus a JSON segment map [[start, end, done], ...]
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS download_state (
+            task_id INTEGER PRIMARY KEY,
+            part_path TEXT,
+            total_size INTEGER,
+            etag TEXT,
+            last_modified TEXT,
+            segments TEXT
+        )
+    ''')
+
+
+def _migrate_playlists(conn):
+    # kind: 'single' (one media item) or 'playlist' (parent of fanned-out entries)
+    conn.execute("ALTER TABLE downloads ADD COLUMN kind TEXT DEFAULT 'single'")
+    conn.execute('ALTER TABLE downloads ADD COLUMN parent_id INTEGER')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_downloads_parent ON downloads (parent_id)')
+
+
+def _migrate_aria2_gid(conn):
+    # GID of the task's download inside the long-lived aria2c, for resuming after restarts
+    conn.execute('ALTER TABLE download_state ADD COLUMN aria2_gid TEXT')
+
+
+def _migrate_bandwidth(conn):
+    # App-wide settings as JSON values, plus per-task bandwidth cap (bytes/s, NULL = none) and share weight
+    conn.execute('CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)')
+    conn.execute('ALTER TABLE downloads ADD COLUMN rate_limit INTEGER')
+    conn.execute('ALTER TABLE downloads ADD COLUMN weight REAL DEFAULT 1')
+
+
+def _migrate_fragments(conn):
+    # Per-task HLS/DASH fragment parallelism; NULL follows the global setting
+    conn.execute('ALTER TABLE downloads ADD COLUMN fragments INTEGER')
+
+
+def _migrate_dedup(conn):
+    # Canonical media keys ('Youtube:<id>', 'btih:<hash>', 'url:<normalized>'); a task can have
+    # one from its link and another from extraction. Plus the sha256 of each finished file.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS media_index (
+            media_key TEXT NOT NULL,
+            task_id INTEGER NOT NULL,
+            PRIMARY KEY (media_key, task_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('ALTER TABLE downloads ADD COLUMN content_hash TEXT')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_downloads_content_hash ON downloads (content_hash)')
+
+
+def _migrate_metrics(conn):
+    # Telemetry of each task's latest attempt (see telemetry.py); phase columns are seconds
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS task_metrics (
+            task_id INTEGER PRIMARY KEY,
+            engine TEXT,
+            status TEXT,
+            started REAL,
+            finished REAL,
+            info_cached INTEGER,
+            queue_s REAL,
+            extract_s REAL,
+            connect_s REAL,
+            transfer_s REAL,
+            merge_s REAL,
+            postprocess_s REAL,
+            hash_s REAL,
+            bytes INTEGER,
+            avg_bps REAL,
+            peak_bps REAL,
+            retries INTEGER,
+            pp_cpu_s REAL,
+            error TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_task_metrics_finished ON task_metrics (finished)')
+
+
+def _migrate_retries(conn):
+    # Automatic retries (retry_policy.py): retries spent so far, when the next one is due (epoch seconds), why
+    conn.execute('ALTER TABLE downloads ADD COLUMN retry_count INTEGER DEFAULT 0')
+    conn.execute('ALTER TABLE downloads ADD COLUMN next_attempt REAL')
+    conn.execute('ALTER TABLE downloads ADD COLUMN last_error TEXT')
+
+
+MIGRATIONS = [
+    _migrate_base_schema,
+    _migrate_listing_indexes,
+    _migrate_download_state,
+    _migrate_playlists,
+    _migrate_aria2_gid,
+    _migrate_bandwidth,
+    _migrate_fragments,
+    _migrate_dedup,
+    _migrate_metrics,
+    _migrate_retries,
+]
+
+
+def migrate(conn):
+    """Apply every migration newer than the database's user_version."""
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for step, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        migration(conn)
+        # PRAGMA does not accept bound parameters
+        conn.execute(f'PRAGMA user_version = {step}')
+    return len(MIGRATIONS)
+
+
+# --- Database Manager ---
+class DBManager:
+    def __init__(self, db_path, flush_interval=0.5):
+        self.writer = DBWriter(db_path, flush_interval=flush_interval)
+        self.writer.start()
+        self.writer.ready.wait()
+        self.writer.call(migrate)
+
+        # Reads use their own connection; WAL lets them run alongside the writer
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row # rows support row['status'] as well as unpacking
+        self.cursor = self.conn.cursor()
+        self.read_lock = threading.Lock()
+
+    def add_task(self, url, format_type='video', quality='best', fragments=None, media_key=None):
+        def insert(conn):
+            task_id = conn.execute(
+                'INSERT INTO downloads (url, status, progress, format, quality, fragments) VALUES (?, ?, ?, ?, ?, ?)',
+                (url, 'Pending', 0, format_type, quality, fragments)
+            ).lastrowid
+            if media_key:
+                conn.execute('INSERT OR IGNORE INTO media_index (media_key, task_id) VALUES (?, ?)', (media_key, task_id))
+            return task_id
+        return self.writer.call(insert)
+
+    def update_status(self, task_id, status, progress=None):
+        # Plain progress ticks are coalesced; anything else is flushed promptly
+        if progress is not None:
+            self.writer.update(task_id, urgent=(status != 'Downloading'), status=status, progress=progress)
+        else:
+            self.writer.update(task_id, urgent=True, status=status)
+
+    def update_file_path(self, task_id, path, title):
+        self.writer.update(task_id, urgent=True, file_path=path, title=title)
+
+    def update_task(self, task_id, **columns):
+        self.writer.update(task_id, urgent=True, **columns)
+
+    # --- Playlists ---
+    def add_child_tasks(self, parent_id, entries, format_type='video', quality='best', fragments=None):
+        """Insert one Pending child per (url, title) entry in a single transaction; returns their ids."""
+        def insert(conn):
+            return [
+                conn.execute(
+                    'INSERT INTO downloads (url, title, status, progress, format, quality, parent_id, fragments) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (url, title, 'Pending', 0, format_type, quality, parent_id, fragments)
+                ).lastrowid
+                for url, title in entries
+            ]
+        return self.writer.call(insert)
+
+    def get_children(self, parent_id):
+        with self.read_lock:
+            self.cursor.execute('SELECT * FROM downloads WHERE parent_id = ? ORDER BY id', (parent_id,))
+            return self.cursor.fetchall()
+
+    def add_tasks(self, rows, format_type='video', quality='best', fragments=None):
+        """Insert one Pending task per (url, media_key) row in a single transaction; returns their ids."""
+        def insert(conn):
+            if not rows:
+                return []
+            # Each row's own lastrowid rather than assuming a consecutive range: the app and the
+            # Downloader service each have a writer on this file
+            cursor = conn.cursor()
+            ids = []
+            for url, _ in rows:
+                cursor.execute(
+                    'INSERT INTO downloads (url, status, progress, format, quality, fragments) VALUES (?, ?, ?, ?, ?, ?)',
+                    (url, 'Pending', 0, format_type, quality, fragments)
+                )
+                ids.append(cursor.lastrowid)
+            conn.executemany(
+                'INSERT OR IGNORE INTO media_index (media_key, task_id) VALUES (?, ?)',
+                ((key, task_id) for (_, key), task_id in zip(rows, ids) if key)
+            )
+            return ids
+        return self.writer.call(insert)
+
+    def flush(self):
+        self.writer.flush()
+
+    @staticmethod
+    def _status_clause(status_filter):
+        if isinstance(status_filter, (list, tuple)):
+            placeholders = ','.join('?' for _ in status_filter)
+            return f'status IN ({placeholders})', list(status_filter)
+        if status_filter:
+            return 'status = ?', [status_filter]
+        return None, []
+
+    def get_tasks(self, status_filter=None, top_level_only=False):
+        where, params = self._status_clause(status_filter)
+        clauses = [where] if where else []
+        if top_level_only:
+            # Playlist entries are shown through their parent
+            clauses.append('parent_id IS NULL')
+        query = 'SELECT * FROM downloads'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY timestamp DESC, id DESC'
+        with self.read_lock:
+            self.cursor.execute(query, params)
+            return self.cursor.fetchall()
+
+    def get_tasks_page(self, status_filter=None, limit=50, cursor=None, files_only=False):
+        """
+        Keyset pagination, newest first.
+        Returns (rows, next_cursor); pass next_cursor back to get the following
+        page. next_cursor is None once the last page has been returned.
+        files_only skips playlist parents, which have no file of their own.
+        """
+        where, params = self._status_clause(status_filter)
+        clauses = [where] if where else []
+        if files_only:
+            clauses.append("kind != 'playlist'")
+        if cursor is not None:
+            clauses.append('(timestamp, id) < (?, ?)')
+            params.extend(cursor)
+        query = 'SELECT * FROM downloads'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY timestamp DESC, id DESC LIMIT ?'
+        params.append(limit)
+        with self.read_lock:
+            self.cursor.execute(query, params)
+            rows = self.cursor.fetchall()
+        next_cursor = (rows[-1]['timestamp'], rows[-1]['id']) if len(rows) == limit else None
+        return rows, next_cursor
+
+    def count_tasks(self, status_filter=None):
+        where, params = self._status_clause(status_filter)
+        query = 'SELECT COUNT(*) FROM downloads'
+        if where:
+            query += f' WHERE {where}'
+        with self.read_lock:
+            return self.cursor.execute(query, params).fetchone()[0]
+
+    def delete_task(self, task_id):
+        def delete(conn):
+            # Playlist parents take their entries with them
+            ids = [task_id] + [row[0] for row in conn.execute('SELECT id FROM downloads WHERE parent_id = ?', (task_id,))]
+            marks = ','.join('?' for _ in ids)
+            conn.execute(f'DELETE FROM download_state WHERE task_id IN ({marks})', ids)
+            conn.execute(f'DELETE FROM media_index WHERE task_id IN ({marks})', ids)
+            conn.execute(f'DELETE FROM task_metrics WHERE task_id IN ({marks})', ids)
+            conn.execute(f'DELETE FROM downloads WHERE id IN ({marks})', ids)
+        self.writer.call(delete)
+
+    # --- Resume state ---
+    def get_download_state(self, task_id):
+        with self.read_lock:
+            self.cursor.execute('SELECT * FROM download_state WHERE task_id = ?', (task_id,))
+            row = self.cursor.fetchone()
+        if row is None:
+            return None
+        state = dict(row)
+        state['segments'] = json.loads(row['segments']) if row['segments'] else []
+        return state
+
+    def save_download_state(self, task_id, state):
+        # Coalesced like progress ticks; the latest segment map wins
+        columns = {key: state.get(key) for key in ('part_path', 'total_size', 'etag', 'last_modified')}
+        columns['segments'] = json.dumps(state.get('segments') or [])
+        self.writer.update(task_id, table='download_state', **columns)
+
+    def set_aria2_gid(self, task_id, gid):
+        self.writer.update(task_id, urgent=True, table='download_state', aria2_gid=gid)
+
+    def clear_download_state(self, task_id):
+        self.writer.call(lambda conn: conn.execute('DELETE FROM download_state WHERE task_id = ?', (task_id,)))
+
+    def clear_completed(self):
+        def clear(conn):
+            conn.execute("DELETE FROM downloads WHERE status='Completed'")
+            # Entries whose playlist row is gone would never be listed again
+            conn.execute('DELETE FROM downloads WHERE parent_id IS NOT NULL AND parent_id NOT IN (SELECT id FROM downloads)')
+            conn.execute('DELETE FROM media_index WHERE task_id NOT IN (SELECT id FROM downloads)')
+            conn.execute('DELETE FROM task_metrics WHERE task_id NOT IN (SELECT id FROM downloads)')
+        self.writer.call(clear)
+
+    # --- Settings ---
+    def get_setting(self, key, default=None):
+        with self.read_lock:
+            row = self.cursor.execute('SELECT value FROM settings WHERE key = ?', (key,)).fetchone()
+        return json.loads(row['value']) if row else default
+
+    def set_setting(self, key, value):
+        self.writer.call(lambda conn: conn.execute(
+            'INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+            (key, json.dumps(value))
+        ))
+
+    def get_task(self, task_id):
+        with self.read_lock:
+            self.cursor.execute('SELECT * FROM downloads WHERE id = ?', (task_id,))
+            return self.cursor.fetchone()
+
+    # --- Deduplication (both lookups hit an index) ---
+    def add_media_key(self, task_id, media_key):
+        self.writer.call(lambda conn: conn.execute(
+            'INSERT OR IGNORE INTO media_index (media_key, task_id) VALUES (?, ?)', (media_key, task_id)
+        ))
+
+    def find_duplicate(self, media_key, format_type, quality, status=None, exclude_id=None):
+        """Best existing task for the same media and output: finished first, then the newest."""
+        # Queued status changes must be visible
+        self.flush()
+        query = ('SELECT downloads.* FROM media_index JOIN downloads ON downloads.id = media_index.task_id '
+                 'WHERE media_index.media_key = ? AND format = ? AND quality = ?')
+        params = [media_key, format_type, quality]
+        if status is not None:
+            query += ' AND status = ?'
+            params.append(status)
+        if exclude_id is not None:
+            query += ' AND id != ?'
+            params.append(exclude_id)
+        query += " ORDER BY status = 'Completed' DESC, id DESC LIMIT 1"
+        with self.read_lock:
+            return self.cursor.execute(query, params).fetchone()
+
+    def find_duplicates(self, media_keys, format_type, quality):
+        """find_duplicate() for many keys at once: {media_key: best row} for the keys that have one."""
+        self.flush()
+        keys = list(media_keys)
+        found = {}
+        with self.read_lock:
+            for start in range(0, len(keys), 500): # stay under SQLite's bound-parameter limit
+                chunk = keys[start:start + 500]
+                marks = ','.join('?' for _ in chunk)
+                rows = self.cursor.execute(
+                    'SELECT media_index.media_key AS media_key, downloads.* FROM media_index '
+                    'JOIN downloads ON downloads.id = media_index.task_id '
+                    f'WHERE media_index.media_key IN ({marks}) AND format = ? AND quality = ?',
+                    (*chunk, format_type, quality)
+                ).fetchall()
+                for row in rows:
+                    best = found.get(row['media_key'])
+                    if best is None or (row['status'] == 'Completed', row['id']) > (best['status'] == 'Completed', best['id']):
+                        found[row['media_key']] = row
+        return found
+
+    def find_by_hash(self, content_hash, exclude_id=None):
+        self.flush()
+        with self.read_lock:
+            return self.cursor.execute(
+                "SELECT * FROM downloads WHERE content_hash = ? AND status = 'Completed' AND id != ? LIMIT 1",
+                (content_hash, exclude_id if exclude_id is not None else -1)
+            ).fetchone()
+
+    # --- Telemetry ---
+    def save_metrics(self, task_id, row):
+        self.writer.update(task_id, urgent=True, table='task_metrics', **row)
+
+    def get_metrics(self, task_id=None, since=None, limit=None):
+        """task_metrics rows, most recently finished first."""
+        self.flush()
+        clauses, params = [], []
+        if task_id is not None:
+            clauses.append('task_id = ?')
+            params.append(task_id)
+        if since is not None:
+            clauses.append('finished >= ?')
+            params.append(since)
+        query = 'SELECT * FROM task_metrics'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY finished DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self.read_lock:
+            return self.cursor.execute(query, params).fetchall()
+
+    def metrics_summary(self, phases):
+        """Totals over every task_metrics row: counts by (status, engine), phase sums, bytes, peak, retries, CPU."""
+        self.flush()
+        sums = ', '.join(f'COALESCE(SUM({phase}_s), 0)' for phase in phases)
+        with self.read_lock:
+            by_status = [dict(row) for row in self.cursor.execute(
+                'SELECT status, engine, COUNT(*) AS count FROM task_metrics GROUP BY status, engine ORDER BY status, engine'
+            )]
+            row = self.cursor.execute(
+                f'SELECT COUNT(*), COALESCE(SUM(bytes), 0), COALESCE(MAX(peak_bps), 0), COALESCE(SUM(retries), 0), '
+                f'COALESCE(SUM(pp_cpu_s), 0), {sums} FROM task_metrics'
+            ).fetchone()
+        return {
+            'count': row[0], 'bytes': row[1], 'peak_bps': row[2], 'retries': row[3], 'pp_cpu_s': row[4],
+            'phase_sum': dict(zip(phases, row[5:])), 'by_status': by_status,
+        }
+
+    def close(self):
+        self.writer.stop()
+        self.conn.close()
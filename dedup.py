@@ -0,0 +1,245 @@
+import hashlib
+import os
+from urllib.parse import parse_qsl, urlparse
+
+from info_cache import normalize_url
+
+_extractors = None # see _load_extractors(); loaded on first use
+
+
+def _usable(literal):
+    # 'http' or '://' would let every link through
+    return len(literal) >= 4 and literal not in 'https://www.'
+
+
+def _requirements(items, sre_parse):
+    """Candidate prefilters for a parsed pattern: tuples of literals, one of which every match contains."""
+    runs, candidates = [''], []
+
+    def walk(items):
+        # Literals in the main sequence (and in plain groups within it) are required;
+        # a branch requires one of its alternatives, anything inside a repeat may be skipped
+        for op, arg in items:
+            if op is sre_parse.LITERAL:
+                runs[-1] += chr(arg).lower()
+            elif op is sre_parse.SUBPATTERN:
+                walk(arg[-1])
+            else:
+                runs.append('')
+                if op is sre_parse.BRANCH:
+                    options = [_best(_requirements(branch, sre_parse)) for branch in arg[1]]
+                    if None not in options:
+                        candidates.append(tuple(literal for option in options for literal in option))
+
+    walk(items)
+    return candidates + [(run,) for run in runs if _usable(run)]
+
+
+def _best(candidates):
+    # The candidate whose shortest literal is longest rules out the most links
+    return max(candidates, key=lambda c: (min(map(len, c)), -len(c))) if candidates else None
+
+
+def _required_literals(pattern):
+    """Literals (lowercased) of which every match of pattern contains at least one, or None."""
+    try:
+        from re import _parser as sre_parse
+    except ImportError: # Python < 3.11
+        import sre_parse
+    try:
+        return _best(_requirements(sre_parse.parse(pattern), sre_parse))
+    except Exception:
+        return None
+
+
+def _load_extractors():
+    """
+    yt-dlp's extractors (minus Generic) plus a prefilter: most _VALID_URL
+    patterns contain a fixed host like 'vimeo.com/', so one substring test
+    per distinct literal rules out nearly all extractors without running
+    their regexes. Returns (extractors, {first 4 chars: [(literal, indices)]},
+    always-checked indices).
+    """
+    try:
+        from yt_dlp.extractor import gen_extractor_classes
+    except ImportError:
+        return [], [], []
+    extractors, by_literal, unfiltered = [], {}, []
+    for ie in gen_extractor_classes():
+        if ie.ie_key() == 'Generic':
+            continue
+        index = len(extractors)
+        extractors.append(ie)
+        owner = next(c.__name__ for c in ie.__mro__ if 'suitable' in c.__dict__)
+        patterns = ie._VALID_URL
+        required = None
+        # Extractors with their own suitable() may accept more than _VALID_URL says
+        if owner in ('InfoExtractor', 'LazyLoadExtractor') and patterns:
+            patterns = [patterns] if isinstance(patterns, str) else list(patterns)
+            required = [_required_literals(p) for p in patterns]
+        if not required or None in required:
+            unfiltered.append(index)
+            continue
+        for literal in {literal for r in required for literal in r}:
+            by_literal.setdefault(literal, []).append(index)
+    # Literals are looked up by their first 4 characters, so a URL costs one dict probe per position
+    by_prefix = {}
+    for literal, indices in by_literal.items():
+        by_prefix.setdefault(literal[:4], []).append((literal, indices))
+    return extractors, by_prefix, unfiltered
+
+
+def media_key(url):
+    """
+    Offline canonical key for url: 'Extractor:id' when a yt-dlp extractor
+    recognizes the link (short links, mobile hosts and tracking params all
+    map to the same id), 'btih:<hash>' for magnets, else the normalized URL.
+    """
+    global _extractors
+    url = url.strip()
+    if url.startswith('magnet:'):
+        for key, value in parse_qsl(urlparse(url).query):
+            if key == 'xt' and value.lower().startswith('urn:btih:'):
+                return 'btih:' + value[9:].lower()
+    if _extractors is None:
+        _extractors = _load_extractors()
+    extractors, by_prefix, unfiltered = _extractors
+    lowered = url.lower()
+    candidates = set(unfiltered)
+    for pos in range(len(lowered) - 3):
+        for literal, indices in by_prefix.get(lowered[pos:pos + 4], ()):
+            if lowered.startswith(literal, pos):
+                candidates.update(indices)
+    # yt-dlp's order decides which extractor wins
+    for index in sorted(candidates):
+        ie = extractors[index]
+        if ie.suitable(url):
+            media_id = ie.get_temp_id(url)
+            if media_id:
+                return f"{ie.ie_key()}:{media_id}"
+            break
+    return 'url:' + normalize_url(url)
+
+
+def info_media_key(info):
+    """Key from an extracted info dict; the extractor's own id beats anything guessed from the URL."""
+    if info.get('extractor_key') and info.get('id'):
+        return f"{info['extractor_key']}:{info['id']}"
+    return None
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _same_file(a, b):
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+
+class DedupIndex:
+    """
+    Duplicate checks via the media_index table (media key -> tasks) and the
+    indexed content_hash column, each a single index lookup. add() resolves
+    a pasted URL to an existing task before any network work: a finished
+    file is reused, a queued or paused copy of the same media absorbs the
+    new add. Extraction adds the extractor's exact key, and a finished file
+    whose bytes already exist is hard-linked instead of kept twice.
+    """
+    def __init__(self, db):
+        self.db = db
+        self.stats = {'added': 0, 'merged': 0, 'known': 0, 'reused': 0, 'linked': 0}
+
+    def add(self, url, format_type='video', quality='best', fragments=None):
+        """Returns (task_id, duplicate): duplicate is None for a new task, 'completed' or 'queued' otherwise."""
+        key = media_key(url)
+        existing = self.db.find_duplicate(key, format_type, quality)
+        if existing is not None:
+            if existing['status'] != 'Completed':
+                self.stats['merged'] += 1
+                return existing['id'], 'queued'
+            if existing['file_path'] and os.path.exists(existing['file_path']):
+                self.stats['known'] += 1
+                return existing['id'], 'completed'
+        self.stats['added'] += 1
+        return self.db.add_task(url, format_type, quality, fragments, media_key=key), None
+
+    def match_many(self, links, format_type='video', quality='best'):
+        """add()'s duplicate check for many (url, media_key) links with one query: (task_id, 'queued'|'completed') or None each."""
+        existing = self.db.find_duplicates({key for _, key in links}, format_type, quality)
+        matches = []
+        for _, key in links:
+            row = existing.get(key)
+            if row is None:
+                matches.append(None)
+            elif row['status'] != 'Completed':
+                self.stats['merged'] += 1
+                matches.append((row['id'], 'queued'))
+            elif row['file_path'] and os.path.exists(row['file_path']):
+                self.stats['known'] += 1
+                matches.append((row['id'], 'completed'))
+            else:
+                matches.append(None) # finished, but the file is gone: download again
+        return matches
+
+    def add_many(self, links, format_type='video', quality='best', fragments=None):
+        """Insert (url, media_key) links already checked with match_many(); returns the new task ids."""
+        self.stats['added'] += len(links)
+        return self.db.add_tasks(links, format_type, quality, fragments)
+
+    def known_media(self, task_id, info, format_type, quality):
+        """After extraction: store the exact key, and return a finished task with the same media, if any."""
+        key = info_media_key(info)
+        if key is None:
+            return None
+        self.db.add_media_key(task_id, key)
+        existing = self.db.find_duplicate(key, format_type, quality, status='Completed', exclude_id=task_id)
+        if existing is not None and existing['file_path'] and os.path.exists(existing['file_path']):
+            return existing
+        return None
+
+    def reuse(self, task_id, existing, folder):
+        """Path for task_id's copy of an already finished file: the file itself, or a hard link into folder."""
+        self.stats['reused'] += 1
+        source = existing['file_path']
+        self.db.update_task(task_id, content_hash=existing['content_hash'])
+        if os.path.dirname(os.path.abspath(source)) == os.path.abspath(folder):
+            return source
+        target = os.path.join(folder, os.path.basename(source))
+        if os.path.exists(target):
+            return target
+        try:
+            os.link(source, target)
+            return target
+        except OSError:
+            return source # no hard links here (e.g. FAT/sdcard); point at the existing file
+
+    def record_file(self, task_id, filepath):
+        """Hash a finished file; if the same bytes already exist elsewhere, keep one copy hard-linked."""
+        if not filepath or not os.path.isfile(filepath):
+            return False
+        digest = file_hash(filepath)
+        self.db.update_task(task_id, content_hash=digest)
+        existing = self.db.find_by_hash(digest, exclude_id=task_id)
+        if existing is None or not existing['file_path'] or not os.path.isfile(existing['file_path']):
+            return False
+        source = existing['file_path']
+        if _same_file(source, filepath) or os.path.getsize(source) != os.path.getsize(filepath):
+            return False
+        temp = filepath + '.link'
+        try:
+            os.link(source, temp)
+            os.replace(temp, filepath)
+        except OSError:
+            if os.path.exists(temp):
+                os.remove(temp)
+            return False
+        self.stats['linked'] += 1
+        print(f"Task {task_id}: same content as task {existing['id']}, hard-linked")
+        return True
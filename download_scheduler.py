@@ -0,0 +1,149 @@
+import heapq
+import itertools
+import threading
+from urllib.parse import urlparse
+
+
+class DownloadScheduler:
+    """
+    Bounded worker pool for download jobs.
+    Jobs wait in a priority queue (lower number = higher priority, FIFO
+    within the same priority) and are started as soon as both a global
+    slot and a slot for the job's host are free. While held, queued jobs
+    stay queued; `boost` adds slots on top of max_concurrent.
+    """
+    def __init__(self, max_concurrent=3, per_host_limit=2):
+        self.max_concurrent = max_concurrent
+        self.per_host_limit = per_host_limit
+        self.hold = False
+        self.boost = 0
+        self.lock = threading.RLock()
+        self.queue = [] # heap of (priority, seq, task_id)
+        self.jobs = {} # task_id: queued job
+        self.running = {} # task_id: (thread, host)
+        self.host_counts = {} # host: running jobs
+        self.counter = itertools.count()
+
+    @staticmethod
+    def host_of(url):
+        try:
+            return (urlparse(url).hostname or "").lower()
+        except Exception:
+            return ""
+
+    def submit(self, task_id, url, target, args=(), priority=0):
+        """
+        Queue a job. Returns False if the task is already queued or running,
+        except that a running job may queue its own task again: it starts
+        once the current run returns.
+        """
+        with self.lock:
+            running = self.running.get(task_id)
+            if task_id in self.jobs or (running and running[0] is not threading.current_thread()):
+                return False
+            self.jobs[task_id] = {
+                'host': self.host_of(url),
+                'target': target,
+                'args': args,
+            }
+            heapq.heappush(self.queue, (priority, next(self.counter), task_id))
+            self._dispatch()
+            return True
+
+    def cancel(self, task_id):
+        """Drop a job that has not started yet. Returns True if it was queued."""
+        with self.lock:
+            if task_id not in self.jobs:
+                return False
+            del self.jobs[task_id]
+            # Stale heap entries are skipped in _dispatch
+            return True
+
+    def is_queued(self, task_id):
+        with self.lock:
+            return task_id in self.jobs
+
+    def is_running(self, task_id):
+        with self.lock:
+            entry = self.running.get(task_id)
+            return entry is not None and entry[0].is_alive()
+
+    def running_count(self):
+        with self.lock:
+            return len(self.running)
+
+    def queued_count(self):
+        with self.lock:
+            return len(self.jobs)
+
+    def running_ids(self):
+        with self.lock:
+            return list(self.running)
+
+    def queued_ids(self):
+        with self.lock:
+            return list(self.jobs)
+
+    def set_limits(self, max_concurrent=None, per_host_limit=None):
+        with self.lock:
+            if max_concurrent is not None:
+                self.max_concurrent = max(1, int(max_concurrent))
+            if per_host_limit is not None:
+                self.per_host_limit = max(1, int(per_host_limit))
+            self._dispatch()
+
+    def set_hold(self, hold):
+        """Stop (True) or resume (False) starting queued jobs; running ones are not touched."""
+        with self.lock:
+            self.hold = hold
+            self._dispatch()
+
+    def set_boost(self, extra):
+        with self.lock:
+            self.boost = max(0, int(extra or 0))
+            self._dispatch()
+
+    def _dispatch(self):
+        # Caller holds self.lock
+        if self.hold:
+            return
+        skipped = []
+        while self.queue and len(self.running) < self.max_concurrent + self.boost:
+            entry = heapq.heappop(self.queue)
+            task_id = entry[2]
+            job = self.jobs.get(task_id)
+            if job is None:
+                continue # cancelled
+            if task_id in self.running or self.host_counts.get(job['host'], 0) >= self.per_host_limit:
+                skipped.append(entry)
+                continue
+            del self.jobs[task_id]
+            self._start(task_id, job)
+        for entry in skipped:
+            heapq.heappush(self.queue, entry)
+
+    def _start(self, task_id, job):
+        host = job['host']
+        thread = threading.Thread(
+            target=self._run,
+            args=(task_id, job),
+            daemon=True
+        )
+        self.running[task_id] = (thread, host)
+        self.host_counts[host] = self.host_counts.get(host, 0) + 1
+        thread.start()
+
+    def _run(self, task_id, job):
+        try:
+            job['target'](*job['args'])
+        except Exception as e:
+            print(f"Scheduler: task {task_id} crashed: {e}")
+        finally:
+            with self.lock:
+                _, host = self.running.pop(task_id, (None, job['host']))
+                remaining = self.host_counts.get(host, 1) - 1
+                if remaining > 0:
+                    self.host_counts[host] = remaining
+                else:
+                    self.host_counts.pop(host, None)
+                self._dispatch()
@@ -0,0 +1,1135 @@
+import copy
+import heapq
+import os
+import threading
+import time
+
+from download_scheduler import DownloadScheduler
+from aria2_rpc import is_torrent_url
+from audio_pipeline import (
+    AUDIO_FORMAT, AVOIDED, CpuMeter, audio_codec, audio_postprocessor, find_ffmpeg, format_report, plan_audio,
+    stream_transcode,
+)
+from bandwidth import BandwidthManager
+from dedup import DedupIndex
+from downloader_engine import DEFAULT_FRAGMENTS, HTTP_CHUNK_SIZE, MAX_FRAGMENTS
+from http_engine import SegmentedDownloader, is_direct_file_url
+import net_pool
+from platform_utils import TransferWakeLock
+from retry_policy import PERMANENT, HostBreakers, RetryPolicy, host_of
+from telemetry import TaskMetrics, format_row
+
+
+def _call_now(fn, delay=0):
+    if delay:
+        threading.Timer(delay, fn).start()
+    else:
+        fn()
+
+
+def is_playlist_info(info):
+    return info.get('_type') in ('playlist', 'multi_video')
+
+
+class SerialDispatcher(threading.Thread):
+    """
+    Headless stand-in for Kivy's Clock: runs dispatched callbacks one at a
+    time on a single thread, optionally after a delay.
+    """
+    def __init__(self):
+        super().__init__(daemon=True, name="Dispatcher")
+        self.lock = threading.Condition()
+        self.timers = [] # heap of (due, seq, fn)
+        self.seq = 0
+        self.running = True
+
+    def __call__(self, fn, delay=0):
+        with self.lock:
+            self.seq += 1
+            heapq.heappush(self.timers, (time.monotonic() + delay, self.seq, fn))
+            self.lock.notify()
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            self.lock.notify()
+
+    def run(self):
+        while True:
+            with self.lock:
+                while self.running and (not self.timers or self.timers[0][0] > time.monotonic()):
+                    timeout = self.timers[0][0] - time.monotonic() if self.timers else None
+                    self.lock.wait(timeout)
+                if not self.running:
+                    return
+                _, _, fn = heapq.heappop(self.timers)
+            try:
+                fn()
+            except Exception as e:
+                print(f"Dispatch error: {e}")
+
+
+# --- Download Manager (Centralized Thread Management) ---
+class DownloadManager:
+    """
+    Runs downloads on a bounded worker pool. Has no UI dependencies: the
+    caller supplies `dispatch(fn, delay=0)` to run callbacks on its own
+    thread (Kivy's Clock in the app, a SerialDispatcher headless),
+    plus optional notifier/on_busy/on_idle hooks for the platform (the
+    wakelock, held only while bytes flow) and a NetworkMonitor whose plan
+    pauses, throttles or widens the pool.
+    """
+    def __init__(self, db, progress_bus, download_folder, info_cache=None, direct_engine=None,
+                 aria2=None, bandwidth=None, dispatch=None, notifier=None, on_busy=None, on_idle=None,
+                 max_concurrent=3, per_host_limit=2, retry_policy=None, breakers=None, network=None,
+                 ffmpeg_location=None):
+        self.db = db
+        self.progress_bus = progress_bus
+        self.download_folder = download_folder
+        self.info_cache = info_cache
+        # Cached DNS answers for every worker; connections and TLS sessions are shared via net_pool too
+        net_pool.install()
+        self.direct_engine = direct_engine or SegmentedDownloader()
+        self.aria2 = aria2 # Aria2Backend for magnets/torrents, when an aria2c is running
+        # Shared by all workers; limits set here apply to running tasks at once
+        self.bandwidth = bandwidth or BandwidthManager()
+        self.bandwidth.apply_settings(self.db.get_setting('bandwidth', {}))
+        # Global fragment parallelism; a task's own `fragments` column wins
+        self.fragments = self.db.get_setting('fragments', DEFAULT_FRAGMENTS)
+        self.dispatch = dispatch or _call_now
+        self.notifier = notifier
+        self.wake = TransferWakeLock(on_busy, on_idle) if on_busy and on_idle else None
+        # Failed tasks come back by themselves unless the error is permanent
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breakers = breakers or HostBreakers()
+        self.ffmpeg_location = ffmpeg_location # file or folder; None = ffmpeg on PATH
+        self.audio_reports = {} # task_id: CPU/disk report of its audio extraction, until completion
+        self.dedup = DedupIndex(db)
+        self.state_listeners = [] # fn(task_id, state, info) for queued/downloading/paused/completed/error
+        # Bounded pool: queued tasks start automatically as slots free up
+        self.scheduler = DownloadScheduler(
+            max_concurrent=max_concurrent,
+            per_host_limit=per_host_limit
+        )
+        self.stop_events = {} # task_id: event
+        self.queued_at = {} # task_id: time.time() it was handed to the scheduler
+        # Workers register retries and network requeues while the dispatch thread pauses tasks;
+        # retry_waits, interrupted and the stop/cancel step of stop_download change only under this lock
+        self.state_lock = threading.RLock()
+        self.retry_waits = {} # task_id: token of the pending retry (a stale dispatch sees another token)
+        self.metrics = {} # task_id: TaskMetrics of the running attempt
+        self.playlists = {} # parent task_id: playlist run state (dispatch thread only)
+        self.interrupted = set() # running tasks stopped by the network plan, to be queued again
+        self.network = network
+        self.network_plan = None
+        if network is not None:
+            network.set_policy(self.db.get_setting('network', {}))
+            network.listeners.append(lambda plan, conditions: self.dispatch(lambda: self._apply_network(plan)))
+            if network.current is not None:
+                self._apply_network(network.current)
+
+    def start_download(self, task_id, url, on_progress, on_complete, on_error, priority=0):
+        if self.is_running(task_id):
+            return
+
+        task = self.db.get_task(task_id)
+        if task and task['kind'] == 'playlist':
+            self._start_playlist(task_id, on_progress, on_complete, on_error)
+            return
+
+        # Stays 'Pending' while waiting for a slot so it is re-queued after a restart
+        self.db.update_status(task_id, "Pending")
+        # Progress reaches the caller through the bus, drained on its own schedule
+        self.progress_bus.subscribe(task_id, on_progress)
+
+        # A retry that was still waiting when the app stopped keeps its backoff
+        wait = (task['next_attempt'] or 0) - time.time() if task else 0
+        if wait > 0:
+            self._wait_for_retry(task_id, url, on_complete, on_error, wait, f"Retry in {wait:.0f}s")
+            return
+        self._queue(task_id, url, on_complete, on_error, priority)
+
+    def _queue(self, task_id, url, on_complete, on_error, priority=0):
+        stop_event = threading.Event()
+        self.stop_events[task_id] = stop_event
+        self.queued_at[task_id] = time.time()
+        # Before submit: a free slot starts the worker inside it, and its 'downloading' must come last
+        self._set_state(task_id, 'queued')
+        self.scheduler.submit(
+            task_id,
+            url,
+            self._run_download,
+            args=(task_id, url, stop_event, on_complete, on_error),
+            priority=priority
+        )
+        if self.network_plan and self.network_plan['mode'] == 'pause':
+            self._publish_held(task_id)
+
+    def stop_download(self, task_id):
+        run = self.playlists.pop(task_id, None)
+        if run is not None:
+            for child_id in run['progress']:
+                self.stop_download(child_id)
+            self.progress_bus.discard(task_id)
+            self.db.update_status(task_id, "Paused")
+            self._set_state(task_id, 'paused')
+            return
+        with self.state_lock:
+            if self.retry_waits.pop(task_id, None) is not None:
+                # Waiting for a retry: pausing cancels it, resuming starts right away
+                self._pause_waiting(task_id)
+                return
+            self.interrupted.discard(task_id) # the user's pause wins over a network requeue
+            if task_id in self.stop_events:
+                # A worker about to wait for a retry sees this too (_wait_for_retry)
+                self.stop_events[task_id].set()
+                # We don't necessarily join here to avoid blocking UI, 
+                # the thread will exit on its own check.
+            cancelled = self.scheduler.cancel(task_id)
+        if cancelled:
+            # Never started, so no hook will mark it paused
+            self.queued_at.pop(task_id, None)
+            self.db.update_status(task_id, "Paused")
+            self._set_state(task_id, 'paused')
+
+    def is_running(self, task_id):
+        if task_id in self.playlists or task_id in self.retry_waits:
+            return True
+        # Queued tasks count as running so the card shows them as active
+        return self.scheduler.is_running(task_id) or self.scheduler.is_queued(task_id)
+
+    def is_queued(self, task_id):
+        return self.scheduler.is_queued(task_id)
+
+    def check_active_count(self):
+        # Number of downloads currently holding a worker slot
+        return self.scheduler.running_count()
+
+    # --- Bandwidth ---
+    def set_global_limit(self, limit):
+        self.bandwidth.set_global_limit(limit)
+        self.db.set_setting('bandwidth', self.bandwidth.settings())
+
+    def set_schedule(self, schedule):
+        self.bandwidth.set_schedule(schedule)
+        self.db.set_setting('bandwidth', self.bandwidth.settings())
+
+    def set_task_limit(self, task_id, limit):
+        self.bandwidth.set_task_limit(task_id, limit)
+        self.db.update_task(task_id, rate_limit=limit or None)
+
+    def set_task_weight(self, task_id, weight):
+        self.bandwidth.set_task_weight(task_id, weight)
+        self.db.update_task(task_id, weight=weight)
+
+    def bandwidth_snapshot(self):
+        return self.bandwidth.snapshot()
+
+    def set_fragments(self, fragments):
+        """Global HLS/DASH fragment parallelism; applies to downloads started from now on."""
+        self.fragments = max(1, min(int(fragments), MAX_FRAGMENTS))
+        self.db.set_setting('fragments', self.fragments)
+
+    def set_task_fragments(self, task_id, fragments):
+        # None goes back to the global setting
+        self.db.update_task(task_id, fragments=max(1, min(int(fragments), MAX_FRAGMENTS)) if fragments else None)
+
+    # --- Network and power ---
+    def set_network_policy(self, **settings):
+        if self.network is None:
+            return None
+        plan = self.network.set_policy(settings)
+        self.db.set_setting('network', self.network.policy.settings())
+        return plan
+
+    def network_snapshot(self):
+        return self.network.snapshot() if self.network is not None else None
+
+    def _apply_network(self, plan):
+        self.network_plan = plan
+        self.bandwidth.set_network_limit(plan['limit'])
+        self.scheduler.set_boost(plan['boost'])
+        held = plan['mode'] == 'pause'
+        self.scheduler.set_hold(held)
+        if not held:
+            return
+        # Running downloads stop where they are and wait in the queue; all engines resume from there
+        with self.state_lock:
+            for task_id in self.scheduler.running_ids():
+                if task_id in self.stop_events:
+                    self.interrupted.add(task_id)
+                    self.stop_events[task_id].set()
+        for task_id in self.scheduler.queued_ids():
+            self._publish_held(task_id)
+
+    def _requeue_interrupted(self, task_id, url, on_complete, on_error):
+        """Worker side of a network pause: True if task_id was stopped by the plan and is queued again."""
+        with self.state_lock:
+            if task_id not in self.interrupted:
+                return False
+            # Back into the held queue, resumed when the plan allows
+            self.interrupted.discard(task_id)
+            print(f"Task {task_id} held by the network plan")
+            self.db.update_status(task_id, "Pending")
+            self.queued_at.pop(task_id, None)
+            self._queue(task_id, url, on_complete, on_error)
+            return True
+
+    def _publish_held(self, task_id):
+        task = self.db.get_task(task_id)
+        self.progress_bus.publish(task_id, (task['progress'] or 0) if task else 0, self.network_plan['reason'])
+
+    def _set_state(self, task_id, state, **info):
+        for listener in list(self.state_listeners):
+            try:
+                listener(task_id, state, info)
+            except Exception as e:
+                print(f"State listener error: {e}")
+
+    def _notify(self, title, message, progress, task_id):
+        if self.notifier:
+            try: self.notifier(title, message, progress, task_id)
+            except: pass
+
+    # --- Playlists: entries fan out into child tasks that share the worker pool ---
+    def _fan_out(self, task_id, info, dl_format, dl_quality, stop_event, on_complete, on_error):
+        entries = []
+        for entry in info.get('entries') or []:
+            if stop_event.is_set():
+                raise Exception("Download Cancelled")
+            if not entry:
+                continue
+            entry_url = entry.get('webpage_url') or entry.get('url')
+            if entry_url:
+                entries.append((entry_url, entry.get('title')))
+        if not entries:
+            raise Exception("Playlist has no entries")
+
+        self.db.add_child_tasks(task_id, entries, format_type=dl_format, quality=dl_quality,
+                                fragments=self.db.get_task(task_id)['fragments'])
+        self.db.update_task(task_id, kind='playlist', title=info.get('title') or info.get('id'))
+        self.db.flush()
+        print(f"Task {task_id}: playlist expanded into {len(entries)} entries")
+        # Keep the parent's existing progress subscription (on_progress=None)
+        self.dispatch(lambda: self._start_playlist(task_id, None, on_complete, on_error))
+
+    def _start_playlist(self, parent_id, on_progress, on_complete, on_error):
+        if on_progress is not None:
+            self.progress_bus.subscribe(parent_id, on_progress)
+        children = self.db.get_children(parent_id)
+        run = {
+            'progress': {c['id']: (100 if c['status'] == 'Completed' else (c['progress'] or 0)) for c in children},
+            'failed': set(),
+            'on_complete': on_complete,
+            'on_error': on_error,
+        }
+        self.playlists[parent_id] = run
+        self.db.update_status(parent_id, "Downloading")
+        self._set_state(parent_id, 'downloading')
+
+        pending = [c for c in children if c['status'] != 'Completed']
+        if not pending:
+            self._finish_playlist(parent_id)
+            return
+        for child in pending:
+            self._start_entry(parent_id, child['id'], child['url'])
+        self._publish_playlist(parent_id)
+
+    def _start_entry(self, parent_id, child_id, url):
+        run = self.playlists.get(parent_id)
+        if run is None:
+            return # paused or removed meanwhile
+        self.start_download(
+            child_id,
+            url,
+            on_progress=lambda progress, speed: self._on_entry_progress(parent_id, child_id, progress),
+            on_complete=lambda filepath, title: self._on_entry_done(parent_id, child_id, None),
+            on_error=lambda error_msg: self._on_entry_done(parent_id, child_id, error_msg)
+        )
+
+    def _on_entry_progress(self, parent_id, child_id, progress):
+        run = self.playlists.get(parent_id)
+        if run is None:
+            return
+        run['progress'][child_id] = progress
+        self._publish_playlist(parent_id)
+
+    def _on_entry_done(self, parent_id, child_id, error_msg):
+        run = self.playlists.get(parent_id)
+        if run is None:
+            return
+        if error_msg is None:
+            run['progress'][child_id] = 100
+        else:
+            # Entries are retried like any task; this is the final failure
+            run['failed'].add(child_id)
+
+        self._publish_playlist(parent_id)
+        if all(progress >= 100 or c_id in run['failed'] for c_id, progress in run['progress'].items()):
+            self._finish_playlist(parent_id)
+
+    def _publish_playlist(self, parent_id):
+        run = self.playlists[parent_id]
+        values = list(run['progress'].values())
+        aggregate = sum(values) / len(values) if values else 0
+        done = sum(1 for v in values if v >= 100)
+        self.progress_bus.publish(parent_id, aggregate, f"{done}/{len(values)} items")
+        self.db.update_status(parent_id, "Downloading", aggregate)
+
+    def _finish_playlist(self, parent_id):
+        run = self.playlists.pop(parent_id)
+        self.progress_bus.discard(parent_id)
+        if run['failed']:
+            error_msg = f"{len(run['failed'])} of {len(run['progress'])} items failed"
+            self.db.update_status(parent_id, "Error")
+            self._set_state(parent_id, 'error', message=error_msg)
+            run['on_error'](error_msg)
+            return
+        task = self.db.get_task(parent_id)
+        folder = self.download_folder()
+        title = task['title'] if task and task['title'] else folder
+        self.db.update_status(parent_id, "Completed", 100)
+        self.db.update_file_path(parent_id, folder, title)
+        self.db.flush()
+        self._set_state(parent_id, 'completed', filepath=folder, title=title)
+        run['on_complete'](folder, title)
+
+    # --- Retries ---
+    def _wait_for_retry(self, task_id, url, on_complete, on_error, delay, message, stop_event=None):
+        """
+        Keep task_id active but idle for delay seconds, then queue it again.
+        Workers pass their stop_event: a pause that came in after their last
+        check turns the retry into a pause.
+        """
+        with self.state_lock:
+            if stop_event is not None and stop_event.is_set():
+                self._pause_waiting(task_id)
+                return
+            token = object()
+            self.retry_waits[task_id] = token
+            self.db.update_status(task_id, "Pending")
+            self._set_state(task_id, 'retrying', delay=round(delay, 1), message=message)
+        task = self.db.get_task(task_id)
+        self.progress_bus.publish(task_id, (task['progress'] or 0) if task else 0, message)
+        self.dispatch(lambda: self._retry_due(task_id, token, url, on_complete, on_error), delay)
+
+    def _retry_due(self, task_id, token, url, on_complete, on_error):
+        with self.state_lock:
+            if self.retry_waits.get(task_id) is not token:
+                return # paused or removed while waiting
+            del self.retry_waits[task_id]
+            self._queue(task_id, url, on_complete, on_error)
+
+    def _pause_waiting(self, task_id):
+        self.db.update_task(task_id, next_attempt=None)
+        self.db.update_status(task_id, "Paused")
+        self.progress_bus.discard(task_id)
+        self._set_state(task_id, 'paused')
+
+    # --- Extraction ---
+    def _extract(self, ydl, url):
+        """Unprocessed info dict for url: from the cache, else a flat extraction pass."""
+        # Retries, resumes and duplicate adds skip extraction and go straight
+        # to format selection + transfer when the info dict is cached.
+        cached = self.info_cache.get(url) if self.info_cache else None
+        if cached is not None:
+            print(f"Info cache hit: {url} ({self.info_cache.summary()})")
+            return cached, True
+
+        # process=False stops before format selection and leaves playlist entries unresolved
+        info = ydl.extract_info(url, download=False, process=False)
+        # Playlist entries can be lazy generators; only single items are cached
+        if info and self.info_cache and not is_playlist_info(info):
+            self.info_cache.put(url, ydl.sanitize_info(info))
+            print(f"Info cache miss: {url} ({self.info_cache.summary()})")
+        return info, False
+
+    def _process(self, ydl, url, info, cached, metrics):
+        try:
+            return ydl.process_ie_result(info, download=True)
+        except Exception as e:
+            if not cached or "Download Cancelled" in str(e):
+                raise
+            # Signed media URLs may have expired since; extract again
+            print(f"Cached info failed ({e}), re-extracting")
+            metrics.retries += 1
+            self.info_cache.invalidate(url)
+            with metrics.timed('extract'):
+                info, _ = self._extract(ydl, url)
+            return ydl.process_ie_result(info, download=True) if info else None
+
+    def _process_audio(self, ydl, url, info, cached, task_id, report_progress, stop_event, throttle, finished_files):
+        """
+        Audio mode: m4a/opus/vorbis/mp3 sources are kept or remuxed, never
+        re-encoded. Other codecs are piped into the encoder as they download
+        when the container allows it, else converted after the download.
+        Records CPU time, peak disk use and the step avoided versus the old
+        download-then-re-encode path in audio_reports.
+        """
+        metrics = self.metrics[task_id]
+        meter = CpuMeter()
+        # Selection only; process_ie_result mutates the dict it is given
+        selected = ydl.process_ie_result(copy.deepcopy(info), download=False)
+        mode = plan_audio(selected)
+        print(f"Task {task_id} audio: {mode} ({audio_codec(selected) or selected.get('ext')})")
+
+        if mode == 'stream':
+            filepath = os.path.splitext(ydl.prepare_filename(selected))[0] + '.mp3'
+            try:
+                stream_transcode(selected, filepath, find_ffmpeg(self.ffmpeg_location),
+                                 progress_callback=report_progress, stop_event=stop_event, throttle=throttle)
+            except Exception as e:
+                if not cached or "Download Cancelled" in str(e):
+                    raise
+                # Signed media URLs may have expired since; extract again
+                print(f"Cached info failed ({e}), re-extracting")
+                metrics.retries += 1
+                self.info_cache.invalidate(url)
+                with metrics.timed('extract'):
+                    info, _ = self._extract(ydl, url)
+                selected = ydl.process_ie_result(info, download=False)
+                stream_transcode(selected, filepath, find_ffmpeg(self.ffmpeg_location),
+                                 progress_callback=report_progress, stop_event=stop_event, throttle=throttle)
+            # The source never touches the disk
+            peak_disk = os.path.getsize(filepath)
+        else:
+            ydl.add_post_processor(audio_postprocessor(ydl, mode), when='post_process')
+            info = self._process(ydl, url, info, cached, metrics)
+            if not info:
+                raise Exception("No info extracted")
+            requested = info.get('requested_downloads') or [info]
+            filepath = requested[0].get('filepath') or ydl.prepare_filename(info)
+            # Source and converted output exist together until the source is deleted
+            peak_disk = sum(finished_files.values())
+            if filepath not in finished_files:
+                peak_disk += os.path.getsize(filepath)
+
+        report = {
+            'mode': mode,
+            'codec': audio_codec(selected) or selected.get('ext'),
+            'cpu': round(meter.elapsed(), 3),
+            'peak_disk': peak_disk,
+            'size': os.path.getsize(filepath),
+            'avoided': AVOIDED[mode],
+        }
+        self.audio_reports[task_id] = report
+        if mode == 'stream':
+            # ffmpeg encoded while downloading, outside yt-dlp's postprocessor hooks
+            metrics.pp_cpu += report['cpu']
+        print(f"Task {task_id} audio: {format_report(report)}")
+        return filepath, selected.get('title') or os.path.basename(filepath)
+
+    def _run_download(self, task_id, url, stop_event, on_complete, on_error):
+        host = host_of(url)
+        wait = self.breakers.wait_time(host)
+        if wait > 0:
+            # The host keeps failing: wait out its cooldown without spending a retry
+            self.queued_at.pop(task_id, None)
+            self._wait_for_retry(task_id, url, on_complete, on_error, wait, f"{host} unavailable, retry in {wait:.0f}s",
+                                 stop_event)
+            return
+
+        task_data = self.db.get_task(task_id)
+        # Rows are sqlite3.Row, so columns are looked up by name
+        dl_format = task_data['format'] or 'video'
+        dl_quality = task_data['quality'] or 'best'
+        fragments = task_data['fragments'] or self.fragments
+
+        folder = self.download_folder()
+        os.makedirs(folder, exist_ok=True)
+
+        self.db.update_status(task_id, "Downloading")
+        self._set_state(task_id, 'downloading')
+        self.bandwidth.register(task_id, limit=task_data['rate_limit'], weight=task_data['weight'])
+        metrics = self.metrics[task_id] = TaskMetrics(task_id, self.queued_at.pop(task_id, None))
+
+        def throttle(count):
+            metrics.add_bytes(count)
+            if self.wake:
+                self.wake.pulse()
+            self.bandwidth.throttle(task_id, count, stop_event)
+
+        pins = [] # wakelock pins taken by this task; a postprocessor that raises never reports 'finished'
+
+        def postprocessor_hook(d):
+            metrics.postprocessor_hook(d)
+            # ffmpeg merges and converts without receiving a byte; keep the CPU awake for it
+            if self.wake and d['status'] == 'started':
+                pins.append(d.get('postprocessor'))
+                self.wake.pin()
+            elif self.wake and d['status'] == 'finished' and pins:
+                pins.pop()
+                self.wake.unpin()
+
+        accounted = {} # file: bytes already passed to the bandwidth manager
+        finished_files = {} # finished file: size, for the audio disk report
+
+        class MyLogger:
+            # Retries arrive as debug (downloads) or warning (extractors) messages
+            def debug(self, msg): metrics.log_message(msg)
+            def info(self, msg): print(f"yt-dlp: {msg}")
+            def warning(self, msg):
+                metrics.log_message(msg)
+                print(f"yt-dlp Warning: {msg}")
+            def error(self, msg): print(f"yt-dlp Error: {msg}")
+
+        def report_progress(val, speed, fname=''):
+            # Cheap: the DB writer and the progress bus both keep only the latest value
+            self.db.update_status(task_id, "Downloading", val)
+            self.progress_bus.publish(task_id, val, speed)
+            # Only update notification periodically to avoid overhead
+            if int(val) % 5 == 0:
+                 display_title = fname if fname else "Downloading..."
+                 self._notify(display_title, f"{int(val)}% - {speed}", val, task_id)
+
+        def progress_hook(d):
+            if stop_event.is_set():
+                raise Exception("Download Cancelled")
+
+            if d['status'] == 'downloading':
+                p_str = d.get('_percent_str', '0%').strip().replace('%', '')
+                try: val = float(p_str)
+                except: val = 0.0
+
+                speed = d.get('_speed_str', 'Busy...').strip()
+                # Try to parse filename from hook
+                fname = d.get('filename', '')
+                if fname: fname = os.path.basename(fname)
+                report_progress(val, speed, fname)
+
+                # yt-dlp reports totals; the limiter wants what arrived since the last hook
+                downloaded = d.get('downloaded_bytes') or 0
+                key = d.get('tmpfilename') or d.get('filename')
+                delta = downloaded - accounted.get(key, 0)
+                accounted[key] = downloaded
+                if delta > 0:
+                    throttle(delta)
+
+                # yt-dlp resumes its own .part files; we just record how far it got
+                total = d.get('total_bytes') or d.get('total_bytes_estimate')
+                if total and d.get('tmpfilename'):
+                    self.db.save_download_state(task_id, {
+                        'part_path': d['tmpfilename'],
+                        'total_size': int(total),
+                        'segments': [[0, int(total) - 1, d.get('downloaded_bytes') or 0]],
+                    })
+
+            elif d['status'] == 'finished':
+                # This hook is called when the download of a component is finished
+                finished_files[d['filename']] = d.get('total_bytes') or d.get('downloaded_bytes') or 0
+
+        ydl_opts = {
+            'outtmpl': os.path.join(folder, '%(title)s.%(ext)s'),
+            'progress_hooks': [progress_hook],
+            'postprocessor_hooks': [postprocessor_hook],
+            'logger': MyLogger(),
+            'nocheckcertificate': True,
+            'ignoreerrors': False,
+            'no_warnings': True,
+            'quiet': True,
+            'no_color': True,
+            # HLS/DASH: fetch several fragments at once instead of one round trip each
+            'concurrent_fragment_downloads': fragments,
+            # Plain streams: ranged requests, each with a larger read buffer
+            'http_chunk_size': HTTP_CHUNK_SIZE,
+            'buffersize': 64 * 1024,
+        }
+
+        if self.ffmpeg_location:
+            ydl_opts['ffmpeg_location'] = self.ffmpeg_location
+
+        if dl_format == 'audio':
+            # Conversion is picked per format in _process_audio, not as a fixed postprocessor
+            ydl_opts['format'] = AUDIO_FORMAT
+        else:
+            # Video handling
+            if dl_quality == '1080p':
+                ydl_opts['format'] = 'bestvideo[height<=1080]+bestaudio/best'
+            elif dl_quality == '720p':
+                ydl_opts['format'] = 'bestvideo[height<=720]+bestaudio/best'
+            elif dl_quality == '480p':
+                ydl_opts['format'] = 'bestvideo[height<=480]+bestaudio/best'
+            else:
+                ydl_opts['format'] = 'bestvideo+bestaudio/best'
+
+        known = None # finished task with the same media, found after extraction
+        status, error = 'error', None # what the metrics row records
+        try:
+            self._notify("Download Started", url[:30] + "...", 0, task_id)
+
+            if self.aria2 is not None and is_torrent_url(url):
+                # Handed to the long-lived aria2c; a pause keeps its GID for resuming
+                metrics.engine = 'aria2'
+                metrics.begin_transfer()
+
+                def aria2_progress(val, speed, done, total):
+                    before = metrics.bytes
+                    metrics.track_total(done)
+                    if self.wake and metrics.bytes > before:
+                        self.wake.pulse()
+                    report_progress(val, speed)
+
+                filepath = self.aria2.download(
+                    task_id, url, folder,
+                    progress_callback=aria2_progress,
+                    stop_event=stop_event
+                )
+                final_title = os.path.basename(filepath)
+            elif is_direct_file_url(url):
+                # Plain file link: segmented multi-connection fetch, no extraction needed.
+                # A saved segment map (pause, crash, app kill) resumes only the missing ranges.
+                metrics.engine = 'direct'
+                metrics.begin_transfer()
+                filepath = self.direct_engine.download(
+                    url, folder,
+                    progress_callback=lambda val, speed, done, total: report_progress(val, speed),
+                    stop_event=stop_event,
+                    state=self.db.get_download_state(task_id),
+                    on_state=lambda state: self.db.save_download_state(task_id, state),
+                    throttle=throttle
+                )
+                final_title = os.path.basename(filepath)
+            else:
+                import yt_dlp # heavy; direct file links never need it
+                net_pool.register_ytdlp()
+                metrics.engine = 'yt-dlp'
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    with metrics.timed('extract'):
+                        info, cached = self._extract(ydl, url)
+                    metrics.info_cached = cached
+                    if info and is_playlist_info(info) and task_data['parent_id'] is None:
+                        metrics.engine = 'playlist'
+                        status = 'fanned out'
+                        self._fan_out(task_id, info, dl_format, dl_quality, stop_event, on_complete, on_error)
+                        return
+                    known = self.dedup.known_media(task_id, info, dl_format, dl_quality) if info else None
+                    metrics.begin_transfer()
+                    if known is not None:
+                        # Same media already finished under another link: no transfer at all
+                        metrics.engine = 'dedup'
+                        print(f"Task {task_id}: already downloaded as task {known['id']}")
+                        filepath = self.dedup.reuse(task_id, known, folder)
+                        final_title = known['title'] or os.path.basename(filepath)
+                    elif info and dl_format == 'audio':
+                        filepath, final_title = self._process_audio(
+                            ydl, url, info, cached, task_id, report_progress, stop_event, throttle, finished_files
+                        )
+                    else:
+                        if info:
+                            info = self._process(ydl, url, info, cached, metrics)
+                        if not info:
+                            raise Exception("No info extracted")
+                        filepath = ydl.prepare_filename(info)
+                        final_title = info.get('title', os.path.basename(filepath))
+
+            status = 'completed'
+            self.breakers.record_success(host)
+            if task_data['retry_count'] or task_data['next_attempt']:
+                self.db.update_task(task_id, retry_count=0, next_attempt=None, last_error=None)
+            self.db.update_status(task_id, "Completed", 100)
+            self.db.update_file_path(task_id, filepath, final_title)
+            self.db.clear_download_state(task_id)
+            self.db.flush() # History refresh below must see the row as Completed
+            self.progress_bus.discard(task_id)
+            self._set_state(task_id, 'completed', filepath=filepath, title=final_title,
+                            audio=self.audio_reports.pop(task_id, None))
+            self.dispatch(lambda: on_complete(filepath, final_title))
+
+            self._notify("Download Complete", final_title, -1, task_id)
+
+            # Hashing waits until the user has the file; a byte-identical copy becomes a hard link
+            if known is None:
+                try:
+                    with metrics.timed('hash'):
+                        self.dedup.record_file(task_id, filepath)
+                except OSError as e:
+                    print(f"Task {task_id}: could not hash {filepath}: {e}")
+
+        except Exception as e:
+            err_str = str(e)
+            cancelled = "Download Cancelled" in err_str
+            if cancelled and self._requeue_interrupted(task_id, url, on_complete, on_error):
+                status = 'held'
+            elif cancelled:
+                status = 'paused'
+                print(f"Task {task_id} stopped by user")
+                self.db.update_status(task_id, "Paused")
+                self.progress_bus.discard(task_id)
+                self._set_state(task_id, 'paused')
+                self._notify("Download Paused", "Tap to resume in app", -1, task_id)
+            else:
+                error = err_str[:500]
+                retries = task_data['retry_count'] or 0
+                kind, delay = self.retry_policy.next_retry(e, retries)
+                if kind != PERMANENT:
+                    self.breakers.record_failure(host)
+                if delay is not None:
+                    status = 'retrying'
+                    retries += 1
+                    print(f"Task {task_id} {kind} error, retry {retries}/{self.retry_policy.max_retries} "
+                          f"in {delay:.0f}s: {e}")
+                    self.db.update_task(task_id, retry_count=retries, next_attempt=time.time() + delay, last_error=error)
+                    self._wait_for_retry(task_id, url, on_complete, on_error, delay,
+                                         f"Retry {retries}/{self.retry_policy.max_retries} in {delay:.0f}s", stop_event)
+                else:
+                    print(f"Task {task_id} Error ({kind}): {e}")
+                    # A manual retry starts with a fresh budget
+                    self.db.update_task(task_id, retry_count=0, next_attempt=None, last_error=error)
+                    self.db.update_status(task_id, "Error")
+                    self.progress_bus.discard(task_id)
+                    self._set_state(task_id, 'error', message=err_str)
+                    self.dispatch(lambda: on_error(err_str))
+                    self._notify("Download Failed", "Tap to retry", -1, task_id)
+        finally:
+            for _ in pins:
+                self.wake.unpin()
+            self.bandwidth.unregister(task_id)
+            row = self.metrics.pop(task_id).row(status, error)
+            self.db.save_metrics(task_id, row)
+            print(f"Task {task_id} metrics: {format_row(row)}")
+
+
+
+# --- Headless service ---
+class DownloadService:
+    """
+    Owns the database, caches and a DownloadManager without any UI and
+    exposes them over JSON-RPC (see rpc.py). Runs in the Android background
+    service, in `python service.py serve`, or embedded in another process.
+    """
+    def __init__(self, data_dir, download_dir=None, progress_hz=10,
+                 max_concurrent=3, per_host_limit=2, notifier=None, wakelock=None, network=None, use_aria2=True,
+                 ffmpeg_location=None):
+        from database import DBManager
+        from info_cache import InfoCache
+        from progress_bus import ProgressBus
+
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        self.download_dir = download_dir
+        self.progress_interval = 1.0 / progress_hz
+        self.db = DBManager(os.path.join(data_dir, 'downloads.db'))
+        try:
+            self.info_cache = InfoCache(os.path.join(data_dir, 'info_cache.db'))
+        except Exception as e:
+            print(f"Info cache disabled: {e}")
+            self.info_cache = None
+        self.progress_bus = ProgressBus()
+        self.dispatcher = SerialDispatcher()
+        self.wakelock = wakelock
+        self.network = network # NetworkMonitor, started by serve()
+        self.aria2_daemon, self.aria2 = None, None
+        if use_aria2:
+            from aria2_rpc import start_aria2_backend
+            self.aria2_daemon, self.aria2 = start_aria2_backend(data_dir, download_dir=download_dir, db=self.db)
+        self.manager = DownloadManager(
+            self.db, self.progress_bus, self.get_download_folder,
+            info_cache=self.info_cache,
+            aria2=self.aria2,
+            dispatch=self.dispatcher,
+            notifier=notifier,
+            on_busy=wakelock.acquire if wakelock else None,
+            on_idle=wakelock.release if wakelock else None,
+            max_concurrent=max_concurrent,
+            per_host_limit=per_host_limit,
+            network=network,
+            ffmpeg_location=ffmpeg_location
+        )
+        self.manager.state_listeners.append(self._on_state)
+        self.progress_bus.watch(self._on_progress)
+        self.states = {} # task_id: last state, for clients that connect mid-download
+        self.rpc = None
+        self.running = False
+
+    def get_download_folder(self):
+        if self.download_dir:
+            return self.download_dir
+        from platform_utils import get_download_folder
+        return get_download_folder(fallback_dir=self.data_dir)
+
+    @property
+    def endpoint_path(self):
+        return os.path.join(self.data_dir, 'rpc.json')
+
+    def serve(self, port=0):
+        from rpc import JsonRpcServer
+        self.running = True
+        self.dispatcher.start()
+        threading.Thread(target=self._pump_progress, daemon=True, name="ProgressPump").start()
+        self.rpc = JsonRpcServer({
+            'ping': lambda: True,
+            'add': self.add,
+            'import_links': self.import_links,
+            'start': self.start,
+            'pause': self.pause,
+            'resume': self.start,
+            'remove': self.remove,
+            'list': self.list,
+            'get': self.get,
+            'active': self.active,
+            'set_limits': self.set_limits,
+            'set_global_limit': self.manager.set_global_limit,
+            'set_schedule': self.manager.set_schedule,
+            'set_task_limit': self.manager.set_task_limit,
+            'set_task_weight': self.manager.set_task_weight,
+            'bandwidth': self.bandwidth,
+            'set_fragments': self.manager.set_fragments,
+            'set_task_fragments': self.manager.set_task_fragments,
+            'stats': self.stats,
+            'metrics': self.metrics,
+            'network': self.manager.network_snapshot,
+            'set_network_policy': self.set_network_policy,
+        }, self.endpoint_path, port=port)
+        self.rpc.start()
+        if self.network is not None:
+            self.network.start()
+        self.recover()
+
+    def stop(self):
+        self.running = False
+        if self.rpc:
+            self.rpc.stop()
+        if self.network is not None:
+            self.network.stop()
+        for task_id in list(self.manager.stop_events):
+            # Waiting retries stay Pending with their next_attempt and resume after a restart
+            if task_id not in self.manager.retry_waits:
+                self.manager.stop_download(task_id)
+        self.dispatcher.stop()
+        if self.aria2:
+            self.aria2.stop()
+            self.aria2_daemon.stop()
+        self.db.close()
+
+    def recover(self):
+        # Tasks that were waiting or transferring when the last process died
+        for task in self.db.get_tasks(['Pending', 'Downloading'], top_level_only=True):
+            print(f"Resuming task {task['id']} after restart")
+            self.dispatcher(lambda task_id=task['id']: self.start(task_id))
+
+    # --- API (called on RPC connection threads) ---
+    def add(self, url, format='video', quality='best', priority=0, fragments=None):
+        task_id, duplicate = self.manager.dedup.add(url, format, quality, fragments)
+        if duplicate == 'completed':
+            print(f"{url} is already downloaded (task {task_id})")
+        else:
+            # A queued duplicate is the same task; starting a running one is a no-op
+            self.start(task_id, priority)
+        return task_id
+
+    def import_links(self, path=None, text=None, format='video', quality='best', priority=0, fragments=None):
+        """Bulk add from a text file on this device or pasted text; returns bulk_import.import_links()'s result."""
+        from bulk_import import import_links
+        if path:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                result = import_links(self.manager.dedup, f, format, quality, fragments)
+        else:
+            result = import_links(self.manager.dedup, text or '', format, quality, fragments)
+        for task_id in result['added'] + result['queued']:
+            self.start(task_id, priority)
+        return result
+
+    def start(self, task_id, priority=0):
+        task = self.db.get_task(task_id)
+        if task is None:
+            return False
+        if task['status'] == 'Completed':
+            return False
+        # The manager is driven from the dispatcher thread only
+        self.dispatcher(lambda: self.manager.start_download(
+            task_id, task['url'],
+            on_progress=None,
+            on_complete=lambda filepath, title: None,
+            on_error=lambda error_msg: None,
+            priority=priority
+        ))
+        return True
+
+    def pause(self, task_id):
+        self.dispatcher(lambda: self.manager.stop_download(task_id))
+        return True
+
+    def remove(self, task_id):
+        def remove():
+            self.manager.stop_download(task_id)
+            if self.aria2:
+                self.aria2.remove(task_id)
+            self.db.delete_task(task_id)
+            self.states.pop(task_id, None)
+        self.dispatcher(remove)
+        return True
+
+    def list(self, status=None, limit=50, top_level_only=True):
+        rows = self.db.get_tasks(status, top_level_only=top_level_only)
+        return [dict(row) for row in rows[:limit]]
+
+    def get(self, task_id):
+        row = self.db.get_task(task_id)
+        return dict(row) if row else None
+
+    def active(self):
+        return {str(task_id): state for task_id, state in self.states.items() if state in ('queued', 'downloading', 'retrying')}
+
+    def set_limits(self, max_concurrent=None, per_host_limit=None):
+        self.manager.scheduler.set_limits(max_concurrent=max_concurrent, per_host_limit=per_host_limit)
+        return True
+
+    def set_network_policy(self, metered=None, metered_limit=None, low_battery=None, burst=None):
+        settings = {'metered': metered, 'metered_limit': metered_limit, 'low_battery': low_battery, 'burst': burst}
+        # metered_limit 0 turns throttling into plain allowing
+        return self.manager.set_network_policy(**{k: v for k, v in settings.items() if v is not None})
+
+    def bandwidth(self):
+        snapshot = self.manager.bandwidth_snapshot()
+        # JSON object keys must be strings
+        snapshot['tasks'] = {str(task_id): task for task_id, task in snapshot['tasks'].items()}
+        return snapshot
+
+    def stats(self):
+        return {
+            'running': self.manager.check_active_count(),
+            'queued': self.manager.scheduler.queued_count(),
+            'progress_bus': dict(self.progress_bus.stats),
+            'db_writer': dict(self.db.writer.stats),
+            'info_cache': dict(self.info_cache.stats) if self.info_cache else None,
+            'aria2': dict(self.aria2.stats) if self.aria2 else None,
+            'dedup': dict(self.manager.dedup.stats),
+            'fragments': self.manager.fragments,
+            'net_pool': net_pool.stats(),
+            'network': self.manager.network_plan,
+        }
+
+    # --- Events ---
+    def metrics(self, task_id=None, since=None, limit=None, format='rows'):
+        """Per-task telemetry: rows (JSON objects), 'jsonl' text, or 'prom' for a Prometheus scrape."""
+        import io
+        from telemetry import PHASES, export_jsonl, prometheus_text
+        if format == 'prom':
+            return prometheus_text(self.db.metrics_summary(PHASES))
+        rows = self.db.get_metrics(task_id, since=since, limit=limit)
+        if format == 'jsonl':
+            out = io.StringIO()
+            export_jsonl(rows, out)
+            return out.getvalue()
+        return [dict(row) for row in rows]
+
+    def _on_state(self, task_id, state, info):
+        self.states[task_id] = state
+        if self.rpc:
+            self.rpc.notify('state', dict(info, task_id=task_id, state=state))
+
+    def _on_progress(self, task_id, progress, speed):
+        if self.rpc:
+            self.rpc.notify('progress', {'task_id': task_id, 'progress': progress, 'speed': speed})
+
+    def _pump_progress(self):
+        # Same latest-value throttling the UI applies, but for RPC subscribers
+        while self.running:
+            self.progress_bus.drain()
+            time.sleep(self.progress_interval)
+
+
+# --- Client side ---
+class RemoteDownloadManager:
+    """
+    Same interface as DownloadManager, backed by a DownloadService in another
+    process. Progress is fed into the caller's ProgressBus and completion
+    callbacks go through `dispatch`, just like the in-process manager.
+    """
+    def __init__(self, client, progress_bus, dispatch=None):
+        self.client = client
+        self.progress_bus = progress_bus
+        self.dispatch = dispatch or _call_now
+        self.states = {} # task_id: last state reported by the service
+        self.callbacks = {} # task_id: (on_complete, on_error)
+
+    def connect(self, timeout=10):
+        self.client.wait_ready(timeout)
+        # The listener syncs state on every (re)connect
+        self.client.subscribe(self._on_event)
+
+    def _sync(self):
+        active = {int(task_id): state for task_id, state in self.client.call('active').items()}
+        # Keep tasks we just asked for; the service may not have reported them yet
+        for task_id in list(self.states):
+            if task_id not in active and task_id not in self.callbacks:
+                self.states.pop(task_id, None)
+        self.states.update(active)
+
+    def start_download(self, task_id, url, on_progress, on_complete, on_error, priority=0):
+        if self.is_running(task_id):
+            return
+        self.progress_bus.subscribe(task_id, on_progress)
+        self.callbacks[task_id] = (on_complete, on_error)
+        self.states[task_id] = 'queued'
+        try:
+            if not self.client.call('start', task_id=task_id, priority=priority):
+                # Unknown or already completed on the service side
+                self.states.pop(task_id, None)
+                self.callbacks.pop(task_id, None)
+        except Exception as e:
+            self.states.pop(task_id, None)
+            err_str = f"Download service unavailable: {e}"
+            self.dispatch(lambda: on_error(err_str))
+
+    def stop_download(self, task_id):
+        try:
+            self.client.call('pause', task_id=task_id)
+        except Exception as e:
+            print(f"Pause failed: {e}")
+
+    def set_global_limit(self, limit):
+        self.client.call('set_global_limit', limit=limit)
+
+    def set_schedule(self, schedule):
+        self.client.call('set_schedule', schedule=schedule)
+
+    def set_task_limit(self, task_id, limit):
+        self.client.call('set_task_limit', task_id=task_id, limit=limit)
+
+    def set_task_weight(self, task_id, weight):
+        self.client.call('set_task_weight', task_id=task_id, weight=weight)
+
+    def set_fragments(self, fragments):
+        self.client.call('set_fragments', fragments=fragments)
+
+    def set_task_fragments(self, task_id, fragments):
+        self.client.call('set_task_fragments', task_id=task_id, fragments=fragments)
+
+    def bandwidth_snapshot(self):
+        snapshot = self.client.call('bandwidth')
+        snapshot['tasks'] = {int(task_id): task for task_id, task in snapshot['tasks'].items()}
+        return snapshot
+
+    def set_network_policy(self, **settings):
+        return self.client.call('set_network_policy', **settings)
+
+    def network_snapshot(self):
+        return self.client.call('network')
+
+    def is_running(self, task_id):
+        return self.states.get(task_id) in ('queued', 'downloading', 'retrying')
+
+    def is_queued(self, task_id):
+        return self.states.get(task_id) == 'queued'
+
+    def check_active_count(self):
+        return sum(1 for state in self.states.values() if state == 'downloading')
+
+    def _on_event(self, method, params):
+        # Listener thread
+        if method == 'connected':
+            # Service may have restarted; whatever it runs now is the truth
+            self._sync()
+        elif method == 'progress':
+            self.progress_bus.publish(params['task_id'], params['progress'], params['speed'])
+        elif method == 'state':
+            task_id, state = params['task_id'], params['state']
+            self.states[task_id] = state
+            if state in ('completed', 'error', 'paused'):
+                self.progress_bus.discard(task_id)
+                on_complete, on_error = self.callbacks.pop(task_id, (None, None))
+                if state == 'completed' and on_complete:
+                    self.dispatch(lambda: on_complete(params.get('filepath'), params.get('title')))
+                elif state == 'error' and on_error:
+                    self.dispatch(lambda: on_error(params.get('message')))
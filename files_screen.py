@@ -0,0 +1,293 @@
+"""
+Files tab: the history of finished downloads. Imported the first time the
+tab is opened, so none of its widgets (or RecycleView) cost anything at startup.
+"""
+import os
+
+from kivy.metrics import dp
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.utils import platform
+from kivymd.app import MDApp
+from kivymd.toast import toast
+from kivymd.uix.boxlayout import MDBoxLayout
+from kivymd.uix.button import MDFlatButton, MDIconButton, MDRaisedButton
+from kivymd.uix.card import MDCard
+from kivymd.uix.dialog import MDDialog
+from kivymd.uix.floatlayout import MDFloatLayout
+from kivymd.uix.label import MDLabel
+from kivymd.uix.relativelayout import MDRelativeLayout
+
+
+# --- History (virtualized) ---
+# HistoryItem is a RecycleView viewclass: a handful of instances are created
+# and re-bound to whichever rows are on screen.
+class HistoryItem(RecycleDataViewBehavior, MDCard):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.task_id = None
+        self.filepath = ""
+        self.title = ""
+        
+        self.orientation = "horizontal"
+        self.padding = dp(15)
+        self.spacing = dp(12)
+        self.size_hint_y = None
+        self.height = dp(90)
+        self.elevation = 2
+        self.radius = [15]
+        self.md_bg_color = (0.12, 0.12, 0.15, 1)
+        self.line_color = (0.2, 0.7, 0.8, 0.2)
+        self.line_width = 1
+        
+        # File icon with background
+        icon_container = MDRelativeLayout(size_hint=(None, None), size=(dp(50), dp(50)))
+        icon_bg = MDCard(
+            md_bg_color=(0.2, 0.7, 0.8, 0.2),
+            radius=[12],
+            size_hint=(1, 1)
+        )
+        icon = MDIconButton(
+            icon="file-check-outline",
+            theme_text_color="Custom",
+            text_color=(0.2, 0.7, 0.8, 1),
+            disabled=True,
+            icon_size="28sp",
+            pos_hint={'center_x': 0.5, 'center_y': 0.5}
+        )
+        icon_container.add_widget(icon_bg)
+        icon_container.add_widget(icon)
+        self.add_widget(icon_container)
+        
+        # Text Info
+        text_box = MDBoxLayout(orientation="vertical", spacing=dp(4))
+        self.title_label = MDLabel(
+            text="",
+            font_style="Subtitle2",
+            theme_text_color="Primary",
+            bold=True,
+            shorten=True,
+            shorten_from="right"
+        )
+        self.path_label = MDLabel(
+            text="",
+            font_style="Caption",
+            theme_text_color="Hint",
+            shorten=True,
+            shorten_from="right"
+        )
+        text_box.add_widget(self.title_label)
+        text_box.add_widget(self.path_label)
+        self.add_widget(text_box)
+        
+        # Actions - Fixed width issue by using adaptive_width
+        actions = MDBoxLayout(
+            orientation="horizontal", 
+            adaptive_width=True, 
+            spacing=dp(4),
+            pos_hint={"center_y": .5}
+        )
+        
+        open_btn = MDIconButton(
+            icon="open-in-new", 
+            theme_text_color="Custom", 
+            text_color=MDApp.get_running_app().theme_cls.primary_color,
+            icon_size="24sp",
+            size_hint=(None, None),
+            size=(dp(48), dp(48)),
+        )
+        open_btn.bind(on_release=self.open_file)
+        
+        share_btn = MDIconButton(
+            icon="share-variant-outline", 
+            theme_text_color="Custom", 
+            text_color=(0.2, 0.7, 1, 1),
+            icon_size="24sp",
+            size_hint=(None, None),
+            size=(dp(48), dp(48)),
+        )
+        share_btn.bind(on_release=self.share_file)
+        
+        del_btn = MDIconButton(
+            icon="delete-outline", 
+            theme_text_color="Custom", 
+            text_color=(1, 0.3, 0.3, 1),
+            icon_size="24sp",
+            size_hint=(None, None),
+            size=(dp(48), dp(48)),
+        )
+        del_btn.bind(on_release=self.confirm_delete)
+        
+        actions.add_widget(open_btn)
+        actions.add_widget(share_btn)
+        actions.add_widget(del_btn)
+        self.add_widget(actions)
+
+    def refresh_view_attrs(self, rv, index, data):
+        # Called whenever this instance is re-bound to another row
+        self.rv = rv
+        self.task_id = data['task_id']
+        self.title = data['title']
+        self.filepath = data['filepath']
+        self.title_label.text = self.title
+        self.path_label.text = self.filepath
+        return super().refresh_view_attrs(rv, index, data)
+
+    def open_file(self, instance):
+        self.rv.open_file(self.filepath)
+
+    def share_file(self, instance):
+        self.rv.share_file(self.filepath)
+    
+    def confirm_delete(self, instance):
+        # Capture the row now: this widget may be recycled while the dialog is open
+        task_id, filepath = self.task_id, self.filepath
+        self.dialog = MDDialog(
+            title="Delete File?",
+            text=f"Are you sure you want to delete '{self.title}'?\nThis will remove it from history and storage.",
+            buttons=[
+                MDFlatButton(text="CANCEL", on_release=lambda x: self.dialog.dismiss()),
+                MDRaisedButton(text="DELETE", md_bg_color=(0.9, 0.1, 0.1, 1), on_release=lambda x: self.delete_file(task_id, filepath)),
+            ],
+        )
+        self.dialog.open()
+
+    def delete_file(self, task_id, filepath):
+        abs_path = os.path.abspath(filepath)
+        print(f"DEBUG: Attempting to delete file at: {abs_path}")
+        
+        if hasattr(self, 'dialog') and self.dialog:
+            self.dialog.dismiss()
+        
+        # 1. Delete from Database
+        try:
+            self.rv.db.delete_task(task_id)
+            db_deleted = True
+        except Exception as e:
+            print(f"DB Delete Error: {e}")
+            db_deleted = False
+
+        # 2. Delete Physical File
+        file_deleted = False
+        if os.path.exists(abs_path):
+            try:
+                os.remove(abs_path)
+                file_deleted = True
+            except Exception as e:
+                print(f"OS Remove Error: {e}")
+                # Try Android specific if on platform
+                if platform == 'android':
+                    try:
+                        from jnius import autoclass
+                        File = autoclass('java.io.File')
+                        f = File(abs_path)
+                        if f.delete():
+                            file_deleted = True
+                    except: pass
+        
+        # 3. Final Feedback
+        if db_deleted and file_deleted:
+            toast("Deleted from History and Storage")
+        elif db_deleted:
+            if os.path.exists(abs_path):
+                toast("History record removed but file deletion failed (Permission?)")
+            else:
+                toast("History record removed (File was already missing)")
+        else:
+            toast("Failed to delete record from database")
+
+        if db_deleted:
+            self.rv.remove_task(task_id)
+
+class HistoryView(RecycleView):
+    """Completed downloads, fetched from the DB one keyset page at a time as the user scrolls."""
+    PAGE_SIZE = 40
+    LOAD_THRESHOLD = 0.15 # scroll_y below which the next page is fetched
+
+    def __init__(self, db, open_file, share_file, on_empty=None, **kwargs):
+        super().__init__(**kwargs)
+        self.viewclass = HistoryItem
+        self.db = db
+        self.open_file = open_file
+        self.share_file = share_file
+        self.on_empty = on_empty
+        self.cursor = None
+        self.exhausted = True
+        layout = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, dp(90)),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+            spacing=dp(12),
+            padding=[dp(15), dp(5), dp(15), dp(20)]
+        )
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+        self.bind(scroll_y=self._on_scroll)
+
+    def reload(self):
+        self.cursor = None
+        self.exhausted = False
+        self.data = []
+        self.load_more()
+        self.scroll_y = 1
+        self._check_empty()
+
+    def load_more(self):
+        if self.exhausted:
+            return
+        rows, self.cursor = self.db.get_tasks_page('Completed', limit=self.PAGE_SIZE, cursor=self.cursor, files_only=True)
+        self.exhausted = self.cursor is None
+        self.data.extend({
+            'task_id': task['id'],
+            'title': task['title'] if task['title'] else task['url'],
+            'filepath': task['file_path'] if task['file_path'] else "Unknown",
+        } for task in rows)
+
+    def remove_task(self, task_id):
+        self.data = [row for row in self.data if row['task_id'] != task_id]
+        self._check_empty()
+
+    def _on_scroll(self, instance, value):
+        if value <= self.LOAD_THRESHOLD and not self.exhausted:
+            self.load_more()
+
+    def _check_empty(self):
+        if self.on_empty:
+            self.on_empty(not self.data)
+
+
+class FilesTab(MDBoxLayout):
+    """Toolbar with Clear All, the history list, and an empty state behind it."""
+    def __init__(self, db, open_file, share_file, on_clear, **kwargs):
+        super().__init__(orientation='vertical', **kwargs)
+
+        # History Toolbar with Clear All
+        toolbar = MDBoxLayout(size_hint_y=None, height=dp(60), padding=dp(15), md_bg_color=(0.1,0.1,0.1,1))
+        toolbar.add_widget(MDLabel(text="Downloaded Files", font_style="H6", theme_text_color="Primary", bold=True))
+
+        clear_btn = MDIconButton(icon="delete-sweep", theme_text_color="Error", on_release=on_clear)
+        toolbar.add_widget(clear_btn)
+
+        self.add_widget(toolbar)
+
+        # Empty state sits behind the list and is shown only when there is no history
+        history_body = MDFloatLayout()
+        self.history_empty = MDBoxLayout(orientation="vertical", spacing=dp(10), padding=dp(30), size_hint_y=None, height=dp(200), pos_hint={'top': 1}, opacity=0)
+        empty_icon = MDIconButton(icon="folder-open-outline", theme_text_color="Hint", disabled=True, icon_size="64sp", pos_hint={'center_x': 0.5})
+        empty_label = MDLabel(text="No downloads yet", halign="center", theme_text_color="Hint", font_style="Subtitle1")
+        self.history_empty.add_widget(empty_icon)
+        self.history_empty.add_widget(empty_label)
+        history_body.add_widget(self.history_empty)
+
+        self.history_view = HistoryView(db, open_file, share_file, on_empty=self._set_history_empty)
+        history_body.add_widget(self.history_view)
+        self.add_widget(history_body)
+
+    def reload(self):
+        # Only the first page is read here; the rest loads as the list scrolls
+        self.history_view.reload()
+
+    def _set_history_empty(self, empty):
+        self.history_empty.opacity = 1 if empty else 0
@@ -0,0 +1,340 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+
+# Links with these extensions are fetched directly instead of going through yt-dlp
+DIRECT_FILE_EXTENSIONS = {
+    'zip', 'rar', '7z', 'tar', 'gz', 'bz2', 'xz', 'apk', 'exe', 'msi', 'dmg',
+    'iso', 'img', 'bin', 'pdf', 'epub', 'deb', 'rpm', 'jar',
+}
+
+
+class DownloadCancelled(Exception):
+    def __init__(self):
+        # Same text the yt-dlp hook raises, so callers handle both alike
+        super().__init__("Download Cancelled")
+
+
+class SourceChanged(IOError):
+    """A range request got the whole file back: it changed on the server since the segment map was made."""
+
+
+def is_direct_file_url(url):
+    path = urlparse(url).path.lower()
+    return '.' in path and path.rsplit('.', 1)[-1] in DIRECT_FILE_EXTENSIONS
+
+
+def format_bytes(num):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(num) < 1024 or unit == 'GiB':
+            return f"{num:.2f}{unit}" if unit != 'B' else f"{int(num)}B"
+        num /= 1024.0
+
+
+def make_session(pool_size=8):
+    """requests session on the process-wide pool: keep-alive connections per host, shared by every engine."""
+    # requests costs ~0.1s to import; only pay for it once something is downloaded
+    import net_pool
+    return net_pool.session(per_host=pool_size)
+
+
+def _filename_from(response, url):
+    disposition = response.headers.get('Content-Disposition', '')
+    match = re.search(r"filename\*?=(?:UTF-8'')?\"?([^\";]+)\"?", disposition, re.IGNORECASE)
+    name = unquote(match.group(1)) if match else unquote(os.path.basename(urlparse(url).path))
+    name = os.path.basename(name.strip())
+    return name or "download"
+
+
+def _pwrite(fd, data, offset, lock):
+    if hasattr(os, 'pwrite'):
+        os.pwrite(fd, data, offset)
+    else:
+        # Windows has no pwrite; serialize seek + write
+        with lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            os.write(fd, data)
+
+
+class SegmentedDownloader:
+    """
+    Multi-connection downloader for direct HTTP(S) file links.
+    Probes for range support, splits the body into byte ranges fetched in
+    parallel over pooled keep-alive connections and writes each chunk at its
+    offset into a preallocated file. Falls back to one stream when the server
+    does not honor Range requests.
+    """
+    def __init__(self, segments=4, chunk_size=256 * 1024, min_segment_size=1024 * 1024,
+                 timeout=30, session=None):
+        self.segments = segments
+        self.chunk_size = chunk_size
+        self.min_segment_size = min_segment_size
+        self.timeout = timeout
+        self._session = session
+
+    @property
+    def session(self):
+        # Created on first use so building an engine at startup costs nothing
+        if self._session is None:
+            self._session = make_session(pool_size=self.segments * 2)
+        return self._session
+
+    def probe(self, url):
+        """One-byte range GET: tells us size, range support and validators in one round trip."""
+        response = self.session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=self.timeout)
+        try:
+            response.raise_for_status()
+            size = None
+            ranges = response.status_code == 206
+            if ranges:
+                content_range = response.headers.get('Content-Range', '')
+                match = re.match(r'bytes \d+-\d+/(\d+)', content_range)
+                if match:
+                    size = int(match.group(1))
+                else:
+                    ranges = False
+            elif response.headers.get('Content-Length'):
+                size = int(response.headers['Content-Length'])
+            if ranges:
+                # Reading the one byte hands the connection back to the pool for the first segment
+                response.content
+            return {
+                'url': response.url,
+                'size': size,
+                'ranges': ranges,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'filename': _filename_from(response, response.url),
+            }
+        finally:
+            response.close()
+
+    def plan_segments(self, size):
+        count = max(1, min(self.segments, size // self.min_segment_size))
+        step = size // count
+        bounds = []
+        for i in range(count):
+            start = i * step
+            end = size - 1 if i == count - 1 else start + step - 1
+            bounds.append((start, end))
+        return bounds
+
+    def download(self, url, folder, progress_callback=None, stop_event=None, state=None, on_state=None,
+                 throttle=None):
+        """
+        Download url into folder and return the final file path.
+        `state` is a resume state from an earlier attempt (see on_state); when
+        it still matches the server's file only the missing ranges are fetched.
+        `on_state(state)` is called periodically with the current segment map
+        so the caller can persist it. `throttle(nbytes)` is called after every
+        chunk and may sleep to hold a rate limit.
+        """
+        info = self.probe(url)
+        state = self._usable_state(state, info)
+        if state is not None:
+            part_path = state['part_path']
+            filepath = part_path[:-len('.part')]
+        else:
+            os.makedirs(folder, exist_ok=True)
+            filepath = os.path.join(folder, info['filename'])
+            part_path = filepath + '.part'
+
+        try:
+            tracker = self._fetch(info, state, part_path, progress_callback, on_state, stop_event, throttle)
+        except SourceChanged as e:
+            # The bytes we have belong to the old file; drop them and the segment map once
+            print(f"{e}, starting over")
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            info = self.probe(url)
+            tracker = self._fetch(info, None, part_path, progress_callback, on_state, stop_event, throttle)
+
+        os.replace(part_path, filepath)
+        tracker.report(force=True)
+        return filepath
+
+    def _fetch(self, info, state, part_path, progress_callback, on_state, stop_event, throttle):
+        if info['ranges'] and info['size']:
+            if state is None:
+                state = {
+                    'part_path': part_path,
+                    'total_size': info['size'],
+                    'etag': info['etag'],
+                    'last_modified': info['last_modified'],
+                    'segments': [[start, end, 0] for start, end in self.plan_segments(info['size'])],
+                }
+            already = sum(segment[2] for segment in state['segments'])
+            tracker = _ProgressTracker(info['size'], progress_callback, done=already)
+            saver = _StateSaver(state, on_state)
+            self._download_segmented(info, state, tracker, saver, stop_event, throttle)
+        else:
+            # No ranges means nothing to resume from; always start over
+            tracker = _ProgressTracker(info['size'], progress_callback)
+            self._download_single(info, part_path, tracker, stop_event, throttle)
+        return tracker
+
+    @staticmethod
+    def _usable_state(state, info):
+        if not state or not state.get('segments') or not info['ranges']:
+            return None
+        if state.get('total_size') != info['size']:
+            return None
+        if not os.path.exists(state.get('part_path') or ''):
+            return None
+        # Same validator type must agree; with none at all we trust the size
+        if state.get('etag') and info['etag']:
+            if state['etag'] != info['etag']:
+                return None
+        elif state.get('last_modified') and info['last_modified']:
+            if state['last_modified'] != info['last_modified']:
+                return None
+        return state
+
+    def _download_single(self, info, part_path, tracker, stop_event, throttle=None):
+        with self.session.get(info['url'], stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            with open(part_path, 'wb') as f:
+                for chunk in response.iter_content(self.chunk_size):
+                    if stop_event is not None and stop_event.is_set():
+                        raise DownloadCancelled()
+                    f.write(chunk)
+                    tracker.add(len(chunk))
+                    if throttle is not None:
+                        throttle(len(chunk))
+
+    def _download_segmented(self, info, state, tracker, saver, stop_event, throttle=None):
+        size = info['size']
+        part_path = state['part_path']
+        fresh = not os.path.exists(part_path)
+        fd = os.open(part_path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+        try:
+            # Reserve the space up front so segments can land anywhere in the file
+            if fresh or os.fstat(fd).st_size != size:
+                if hasattr(os, 'posix_fallocate'):
+                    try:
+                        os.posix_fallocate(fd, 0, size)
+                    except OSError:
+                        os.ftruncate(fd, size)
+                else:
+                    os.ftruncate(fd, size)
+
+            write_lock = threading.Lock()
+            failed = threading.Event()
+            missing = [segment for segment in state['segments'] if segment[2] < segment[1] - segment[0] + 1]
+            errors = []
+            if missing:
+                with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+                    futures = [
+                        pool.submit(self._fetch_range, info, state, segment, fd, write_lock,
+                                    tracker, saver, stop_event, failed, throttle)
+                        for segment in missing
+                    ]
+                    for future in futures:
+                        try:
+                            future.result()
+                        except Exception as e:
+                            errors.append(e)
+            # Bytes must be on disk before the segment map that claims them
+            os.fsync(fd)
+            saver.save(force=True)
+            if errors:
+                # Prefer reporting a cancel, then a changed file, over the follow-on errors they caused
+                for kind in (DownloadCancelled, SourceChanged):
+                    for e in errors:
+                        if isinstance(e, kind):
+                            raise e
+                raise errors[0]
+        finally:
+            os.close(fd)
+
+    def _fetch_range(self, info, state, segment, fd, write_lock, tracker, saver, stop_event, failed, throttle=None):
+        start, end = segment[0], segment[1]
+        offset = start + segment[2]
+        headers = {'Range': f'bytes={offset}-{end}'}
+        # Make sure the file did not change since the segment map was made. If-Range takes
+        # only a strong validator (RFC 7233 3.2): a weak ETag falls back to the date
+        etag = state.get('etag')
+        validator = etag if etag and not etag.startswith('W/') else state.get('last_modified')
+        if validator:
+            headers['If-Range'] = validator
+        try:
+            with self.session.get(info['url'], headers=headers, stream=True, timeout=self.timeout) as response:
+                if response.status_code != 206:
+                    response.raise_for_status() # HTTP errors keep their status and Retry-After
+                    if response.status_code == 200:
+                        # If-Range failed (or the server dropped range support): the full, new file
+                        raise SourceChanged(f"Range request for bytes {offset}-{end} returned the whole file")
+                    raise IOError(f"Range request for bytes {offset}-{end} returned HTTP {response.status_code}")
+                for chunk in response.iter_content(self.chunk_size):
+                    if failed.is_set():
+                        return
+                    if stop_event is not None and stop_event.is_set():
+                        raise DownloadCancelled()
+                    _pwrite(fd, chunk, offset, write_lock)
+                    offset += len(chunk)
+                    segment[2] = offset - start # only this thread writes this segment
+                    tracker.add(len(chunk))
+                    saver.save()
+                    if throttle is not None:
+                        throttle(len(chunk))
+                if offset != end + 1:
+                    raise IOError(f"Segment {start}-{end} ended early at {offset}")
+        except Exception:
+            failed.set()
+            raise
+
+
+class _StateSaver:
+    """Hands a snapshot of the resume state to on_state at most every `interval` seconds."""
+    def __init__(self, state, on_state, interval=1.0):
+        self.state = state
+        self.on_state = on_state
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last_save = 0.0
+
+    def save(self, force=False):
+        if self.on_state is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if not force and now - self.last_save < self.interval:
+                return
+            self.last_save = now
+            snapshot = dict(self.state)
+            snapshot['segments'] = [list(segment) for segment in self.state['segments']]
+        self.on_state(snapshot)
+
+
+class _ProgressTracker:
+    """Thread-safe byte counter that reports (percent, speed_str) at most every `interval` seconds."""
+    def __init__(self, total, callback, interval=0.25, done=0):
+        self.total = total
+        self.callback = callback
+        self.interval = interval
+        self.done = done
+        self.resumed_from = done
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.last_report = 0.0
+
+    def add(self, count):
+        with self.lock:
+            self.done += count
+        self.report()
+
+    def report(self, force=False):
+        if self.callback is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if not force and now - self.last_report < self.interval:
+                return
+            self.last_report = now
+            done = self.done
+        percent = (done * 100.0 / self.total) if self.total else 0.0
+        speed = (done - self.resumed_from) / max(now - self.started, 1e-6)
+        self.callback(percent, f"{format_bytes(speed)}/s", done, self.total)
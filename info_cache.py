@@ -0,0 +1,110 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+# Click trackers (plus utm_*) that only say where a link was shared from; generic names such as
+# ref, si or pp are kept, since on some sites they pick what gets downloaded
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid', '_ga'}
+
+
+def normalize_url(url):
+    """
+    Same link, one spelling (info cache and duplicate keys alike): lower-case
+    scheme and host without www., userinfo and default port, no fragment, no
+    click-tracking params, sorted query, no trailing slash.
+    """
+    parts = urlparse(url.strip())
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if parts.port and not ((parts.scheme == 'http' and parts.port == 80) or (parts.scheme == 'https' and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith('utm_')
+    )
+    path = parts.path.rstrip('/') or '/'
+    return urlunparse((parts.scheme.lower(), host, path, '', urlencode(query), ''))
+
+
+class InfoCache:
+    """
+    On-disk cache of yt-dlp info dicts keyed by normalized URL.
+    Entries expire after `ttl` seconds (format URLs are signed and go stale);
+    once the stored data exceeds `max_bytes` the least recently used entries
+    are evicted.
+    """
+    def __init__(self, path, ttl=3600, max_bytes=20 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS info_cache (
+                key TEXT PRIMARY KEY,
+                data BLOB,
+                size INTEGER,
+                created REAL,
+                last_access REAL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_info_cache_access ON info_cache (last_access)')
+        self.conn.commit()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+
+    def get(self, url):
+        key = normalize_url(url)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute('SELECT data, created FROM info_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            if now - row[1] > self.ttl:
+                self.conn.execute('DELETE FROM info_cache WHERE key = ?', (key,))
+                self.conn.commit()
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            self.conn.execute('UPDATE info_cache SET last_access = ? WHERE key = ?', (now, key))
+            self.conn.commit()
+            self.stats['hits'] += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, url, info):
+        """Store a JSON-serializable info dict (use YoutubeDL.sanitize_info first)."""
+        data = zlib.compress(json.dumps(info).encode('utf-8'))
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO info_cache (key, data, size, created, last_access) VALUES (?, ?, ?, ?, ?)',
+                (normalize_url(url), data, len(data), now, now)
+            )
+            self._evict()
+            self.conn.commit()
+
+    def invalidate(self, url):
+        with self.lock:
+            self.conn.execute('DELETE FROM info_cache WHERE key = ?', (normalize_url(url),))
+            self.conn.commit()
+
+    def _evict(self):
+        # Caller holds self.lock
+        total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM info_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute('SELECT key, size FROM info_cache ORDER BY last_access').fetchall():
+            if total <= self.max_bytes:
+                break
+            self.conn.execute('DELETE FROM info_cache WHERE key = ?', (key,))
+            total -= size
+            self.stats['evictions'] += 1
+
+    def summary(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        ratio = (self.stats['hits'] * 100.0 / lookups) if lookups else 0.0
+        return (f"info cache: {self.stats['hits']} hits, {self.stats['misses']} misses "
+                f"({ratio:.0f}% hit), {self.stats['evictions']} evicted")
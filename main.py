@@ -3,6 +3,9 @@ import sys
 import traceback
 import os
 
+from startup_profile import StartupTimer
+startup_timer = StartupTimer() # startup phases, printed once the main screen is up
+
 # 1. Base Imports for Error Handling
 try:
     from kivy.app import App
@@ -36,116 +39,38 @@ err_msg = ""
 
 try:
     import threading
-    import sqlite3
-    import time
-    import re
-    import subprocess
-    import shlex
-    from datetime import datetime
     
     from kivy.core.window import Window
     from kivy.utils import platform
     from kivy.metrics import dp
     from kivy.clock import Clock
     
+    # Only what the splash and the Home tab need; the Files tab (files_screen.py),
+    # dialogs and menus import their widgets when first opened
     from kivymd.app import MDApp
     from kivymd.uix.screen import MDScreen
     from kivymd.uix.screenmanager import MDScreenManager
     from kivymd.uix.boxlayout import MDBoxLayout
     from kivymd.uix.floatlayout import MDFloatLayout
-    from kivymd.uix.button import MDRaisedButton, MDIconButton, MDFloatingActionButton
+    from kivymd.uix.button import MDRaisedButton, MDIconButton
     from kivymd.uix.textfield import MDTextField
     from kivymd.uix.label import MDLabel
-    from kivymd.uix.list import MDList, TwoLineAvatarIconListItem, IconLeftWidget, IconRightWidget, OneLineIconListItem, OneLineListItem
     from kivymd.uix.progressbar import MDProgressBar
     from kivymd.uix.card import MDCard
-    from kivymd.uix.dialog import MDDialog
     from kivymd.uix.bottomnavigation import MDBottomNavigation, MDBottomNavigationItem
     from kivymd.uix.scrollview import MDScrollView
     from kivymd.toast import toast
-    from kivymd.uix.relativelayout import MDRelativeLayout
-    from kivy.animation import Animation
-    
-    # Native Notification Helper for Android 12+
-    def init_notification_channel():
-        if platform == 'android':
-            try:
-                from jnius import autoclass
-                Build = autoclass('android.os.Build$VERSION')
-                if Build.SDK_INT < 26: return
-                
-                Context = autoclass('android.content.Context')
-                PythonActivity = autoclass('org.kivy.android.PythonActivity')
-                activity = PythonActivity.mActivity
-                channel_id = "download_channel"
-                
-                NotificationChannel = autoclass('android.app.NotificationChannel')
-                NotificationManager = autoclass('android.app.NotificationManager')
-                
-                importance = NotificationManager.IMPORTANCE_HIGH
-                channel = NotificationChannel(channel_id, "Downloads", importance)
-                channel.setDescription("Download progress notifications")
-                
-                notification_manager = activity.getSystemService(Context.NOTIFICATION_SERVICE)
-                notification_manager.createNotificationChannel(channel)
-            except Exception as e:
-                print(f"Channel Creation Error: {e}")
-
-    def send_notification(title, message, progress=-1, notif_id=1):
-        if platform == 'android':
-            try:
-                from jnius import autoclass
-                Context = autoclass('android.content.Context')
-                PythonActivity = autoclass('org.kivy.android.PythonActivity')
-                activity = PythonActivity.mActivity
-                channel_id = "download_channel"
-                
-                # Ensure context is valid
-                if not activity:
-                    print("Notification Error: No Activity Context")
-                    return
 
-                # Use Native Builder (API 26+)
-                NotificationBuilder = autoclass('android.app.Notification$Builder')
-                builder = NotificationBuilder(activity, channel_id)
-                builder.setContentTitle(title)
-                builder.setContentText(message)
-                builder.setOnlyAlertOnce(True) # Prevent spamming popups on update
-
-                # Icon handling - Use App Icon
-                try:
-                    app_icon = activity.getApplicationInfo().icon
-                    builder.setSmallIcon(app_icon)
-                except Exception as e:
-                    print(f"Icon Error: {e}")
-                    builder.setSmallIcon(17301633) # Fallback
-                
-                if progress >= 0:
-                    builder.setProgress(100, int(progress), False)
-                    builder.setOngoing(True)
-                else:
-                    builder.setProgress(0, 0, False)
-                    builder.setAutoCancel(True)
-                    builder.setOngoing(False)
-                
-                # PendingIntent to open app
-                try:
-                    Intent = autoclass('android.content.Intent')
-                    PendingIntent = autoclass('android.app.PendingIntent')
-                    intent = Intent(activity, PythonActivity)
-                    intent.setFlags(Intent.FLAG_ACTIVITY_SINGLE_TOP | Intent.FLAG_ACTIVITY_CLEAR_TOP)
-                    FLAG_IMMUTABLE = 67108864 # PendingIntent.FLAG_IMMUTABLE
-                    pending_intent = PendingIntent.getActivity(activity, 0, intent, FLAG_IMMUTABLE)
-                    builder.setContentIntent(pending_intent)
-                except Exception as e:
-                    print(f"PendingIntent Error: {e}")
-                
-                notification_service = activity.getSystemService(Context.NOTIFICATION_SERVICE)
-                notification_service.notify(notif_id, builder.build())
-            except Exception as e:
-                print(f"Notification Error: {e}")
-                import traceback
-                traceback.print_exc()
+    from database import DBManager
+    from dedup import DedupIndex
+    import bulk_import
+    from progress_bus import ProgressBus
+    from http_engine import SegmentedDownloader
+    from info_cache import InfoCache
+    from platform_utils import WakeLock, init_notification_channel, send_notification, shared_lines
+    import platform_utils
+    from download_service import DownloadManager, RemoteDownloadManager
+    from rpc import JsonRpcClient
 
     def share_file_native(filepath):
         if platform == 'android':
@@ -216,12 +141,7 @@ try:
         except Exception as e:
             toast(f"Error: {e}")
 
-    # Fix SSL on Android
-    import certifi
-    try:
-        os.environ['SSL_CERT_FILE'] = certifi.where()
-    except: pass
-
+    startup_timer.mark("imports")
     safe_start = True
 
 except Exception:
@@ -233,245 +153,22 @@ except Exception:
 if safe_start:
     Window.softinput_mode = "below_target"
     
-    # Needs to be imported inside safe block or global
-    from kivymd.uix.list import IRightBodyTouch
-
-    # --- Database Manager ---
-    class DBManager:
-        def __init__(self, db_path):
-            self.conn = sqlite3.connect(db_path, check_same_thread=False)
-            self.cursor = self.conn.cursor()
-            self.create_table()
-
-        def create_table(self):
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS downloads (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    url TEXT NOT NULL,
-                    title TEXT,
-                    status TEXT, -- Pending, Downloading, Paused, Completed, Error
-                    progress INTEGER DEFAULT 0,
-                    file_path TEXT,
-                    format TEXT DEFAULT 'video', -- video (mp4), audio (mp3)
-                    quality TEXT DEFAULT 'best', -- best, 1080p, 720p, 480p
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            # Handle potential migration for existing users
-            try:
-                self.cursor.execute("ALTER TABLE downloads ADD COLUMN format TEXT DEFAULT 'video'")
-                self.cursor.execute("ALTER TABLE downloads ADD COLUMN quality TEXT DEFAULT 'best'")
-            except sqlite3.OperationalError:
-                # Columns probably already exist
-                pass
-            self.conn.commit()
-
-        def add_task(self, url, format_type='video', quality='best'):
-            self.cursor.execute(
-                'INSERT INTO downloads (url, status, progress, format, quality) VALUES (?, ?, ?, ?, ?)', 
-                (url, 'Pending', 0, format_type, quality)
-            )
-            self.conn.commit()
-            return self.cursor.lastrowid
-
-        def update_status(self, task_id, status, progress=None):
-            if progress is not None:
-                self.cursor.execute('UPDATE downloads SET status = ?, progress = ? WHERE id = ?', (status, progress, task_id))
-            else:
-                self.cursor.execute('UPDATE downloads SET status = ? WHERE id = ?', (status, task_id))
-            self.conn.commit()
-
-        def update_file_path(self, task_id, path, title):
-            self.cursor.execute('UPDATE downloads SET file_path = ?, title = ? WHERE id = ?', (path, title, task_id))
-            self.conn.commit()
-
-        def get_tasks(self, status_filter=None):
-            if isinstance(status_filter, list):
-                 placeholders = ','.join('?' for _ in status_filter)
-                 query = f'SELECT * FROM downloads WHERE status IN ({placeholders}) ORDER BY timestamp DESC'
-                 self.cursor.execute(query, status_filter)
-            elif status_filter:
-                self.cursor.execute('SELECT * FROM downloads WHERE status = ? ORDER BY timestamp DESC', (status_filter,))
-            else:
-                self.cursor.execute('SELECT * FROM downloads ORDER BY timestamp DESC')
-            return self.cursor.fetchall()
-
-        def delete_task(self, task_id):
-            self.cursor.execute('DELETE FROM downloads WHERE id = ?', (task_id,))
-            self.conn.commit()
-        
-        def get_task(self, task_id):
-            self.cursor.execute('SELECT * FROM downloads WHERE id = ?', (task_id,))
-            return self.cursor.fetchone()
-
-    # --- Download Manager (Centralized Thread Management) ---
-    class DownloadManager:
-        def __init__(self):
-            self.threads = {} # task_id: thread
-            self.stop_events = {} # task_id: event
-
-        def start_download(self, task_id, url, on_progress, on_complete, on_error):
-            if task_id in self.threads and self.threads[task_id].is_alive():
-                return
-
-            stop_event = threading.Event()
-            self.stop_events[task_id] = stop_event
-            
-            thread = threading.Thread(
-                target=self._run_download,
-                args=(task_id, url, stop_event, on_progress, on_complete, on_error),
-                daemon=True
-            )
-            self.threads[task_id] = thread
-            thread.start()
-            
-            # WAKE LOCK START
-            curr_app = MDApp.get_running_app()
-            if curr_app:
-                curr_app.acquire_wakelock()
-
-        def stop_download(self, task_id):
-            if task_id in self.stop_events:
-                self.stop_events[task_id].set()
-                # We don't necessarily join here to avoid blocking UI, 
-                # the thread will exit on its own check.
-
-        def is_running(self, task_id):
-            return task_id in self.threads and self.threads[task_id].is_alive()
-        
-        def check_active_count(self):
-            # Check if any threads are still alive
-            active = 0
-            for t in self.threads.values():
-                if t.is_alive():
-                    active += 1
-            return active
-
-        def _run_download(self, task_id, url, stop_event, on_progress, on_complete, on_error):
-            task_data = db.get_task(task_id)
-            # task format: (id, url, title, status, progress, file_path, format, quality, timestamp)
-            # Depending on DB schema index might shift, let's use named indexing if possible or be careful
-            # Current schema: 0:id, 1:url, 2:title, 3:status, 4:progress, 5:path, 6:format, 7:quality, 8:ts
-            dl_format = task_data[6] if len(task_data) > 6 else 'video'
-            dl_quality = task_data[7] if len(task_data) > 7 else 'best'
-
-            folder = get_download_folder()
-            os.makedirs(folder, exist_ok=True)
-            
-            import yt_dlp
-            
-            class MyLogger:
-                def debug(self, msg): pass
-                def info(self, msg): print(f"yt-dlp: {msg}")
-                def warning(self, msg): print(f"yt-dlp Warning: {msg}")
-                def error(self, msg): print(f"yt-dlp Error: {msg}")
-
-            def progress_hook(d):
-                if stop_event.is_set():
-                    raise Exception("Download Cancelled")
-                
-                if d['status'] == 'downloading':
-                    p_str = d.get('_percent_str', '0%').strip().replace('%', '')
-                    try: val = float(p_str)
-                    except: val = 0.0
-                    
-                    speed = d.get('_speed_str', 'Busy...').strip()
-                    # Only update DB periodically to avoid overhead
-                    if int(val) % 5 == 0:
-                         db.update_status(task_id, "Downloading", val)
-                         if platform == 'android':
-                             try:
-                                 # Try to parse filename from hook
-                                 fname = d.get('filename', '')
-                                 if fname: fname = os.path.basename(fname)
-                                 display_title = fname if fname else "Downloading..."
-                                 send_notification(display_title, f"{int(val)}% - {speed}", val, task_id)
-                             except: pass
-                             
-                         Clock.schedule_once(lambda dt: on_progress(val, speed))
-                
-                elif d['status'] == 'finished':
-                    # This hook is called when the download of a component is finished
-                    pass
-
-            ydl_opts = {
-                'outtmpl': os.path.join(folder, '%(title)s.%(ext)s'),
-                'progress_hooks': [progress_hook],
-                'logger': MyLogger(),
-                'nocheckcertificate': True,
-                'ignoreerrors': False,
-                'no_warnings': True,
-                'quiet': True,
-                'no_color': True,
-            }
-
-            if dl_format == 'audio':
-                ydl_opts['format'] = 'bestaudio/best'
-                ydl_opts['postprocessors'] = [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }]
-            else:
-                # Video handling
-                if dl_quality == '1080p':
-                    ydl_opts['format'] = 'bestvideo[height<=1080]+bestaudio/best'
-                elif dl_quality == '720p':
-                    ydl_opts['format'] = 'bestvideo[height<=720]+bestaudio/best'
-                elif dl_quality == '480p':
-                    ydl_opts['format'] = 'bestvideo[height<=480]+bestaudio/best'
-                else:
-                    ydl_opts['format'] = 'bestvideo+bestaudio/best'
+    # --- Config & Helpers ---
+    ACTIVE_STATUSES = ['Pending', 'Downloading', 'Paused', 'Error']
+    MAX_CONCURRENT_DOWNLOADS = 3
+    PER_HOST_LIMIT = 2
+    UI_PROGRESS_HZ = 10
 
-            try:
-                if platform == 'android':
-                    try: send_notification("Download Started", url[:30] + "...", 0, task_id)
-                    except: pass
-
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=True)
-                    if info:
-                        filepath = ydl.prepare_filename(info)
-                        final_title = info.get('title', os.path.basename(filepath))
-                        db.update_status(task_id, "Completed", 100)
-                        db.update_file_path(task_id, filepath, final_title)
-                        Clock.schedule_once(lambda dt: on_complete(filepath, final_title))
-                        
-                        # Check wakelock release
-                        curr_app = MDApp.get_running_app()
-                        if curr_app and dm.check_active_count() <= 1: # This one is about to finish
-                             curr_app.release_wakelock()
-                        
-                        if platform == 'android':
-                            try: send_notification("Download Complete", final_title, -1, task_id)
-                            except: pass
-                    else:
-                        raise Exception("No info extracted")
+    progress_bus = ProgressBus()
+    direct_engine = SegmentedDownloader(segments=4)
 
-            except Exception as e:
-                err_str = str(e)
-                if "Download Cancelled" in err_str:
-                    print(f"Task {task_id} stopped by user")
-                    db.update_status(task_id, "Paused")
-                    if platform == 'android':
-                        try: send_notification("Download Paused", "Tap to resume in app", -1, task_id)
-                        except: pass
-                else:
-                    print(f"Task {task_id} Error: {e}")
-                    db.update_status(task_id, "Error")
-                    Clock.schedule_once(lambda dt: on_error(err_str))
-                    if platform == 'android':
-                        try: send_notification("Download Failed", "Tap to retry", -1, task_id)
-                        except: pass
-
-                # Check wakelock release on error too
-                curr_app = MDApp.get_running_app()
-                if curr_app and dm.check_active_count() <= 1:
-                        curr_app.release_wakelock()
+    INFO_CACHE_TTL = 3600 # seconds; format URLs are signed and expire
+    INFO_CACHE_MAX_BYTES = 20 * 1024 * 1024
 
-    # --- Config & Helpers ---
     db = None
-    dm = DownloadManager()
+    dedup = None # DedupIndex over db: duplicate links resolve to existing tasks
+    info_cache = None
+    dm = None # DownloadManager, or RemoteDownloadManager when the background service runs downloads
 
     def get_db_path():
         if platform == 'android':
@@ -485,43 +182,33 @@ if safe_start:
                     pass
         return 'downloads.db'
 
+    def get_cache_path():
+        # Kept apart from downloads.db so it can be thrown away at any time
+        return os.path.join(os.path.dirname(get_db_path()), 'info_cache.db')
+
     def get_download_folder():
-        if platform == 'android':
-            try:
-                from jnius import autoclass
-                Environment = autoclass('android.os.Environment')
-                Context = autoclass('org.kivy.android.PythonActivity').mActivity
-                
-                # Check if storage is mounted
-                state = Environment.getExternalStorageState()
-                if not state == Environment.MEDIA_MOUNTED:
-                    return Context.getExternalFilesDir(None).getAbsolutePath()
+        app = MDApp.get_running_app()
+        return platform_utils.get_download_folder(fallback_dir=app.user_data_dir if app else None)
 
-                try:
-                    # Preferred: Use standard Download directory via Environment
-                    download_dir = Environment.getExternalStoragePublicDirectory(
-                        Environment.DIRECTORY_DOWNLOADS
-                    ).getAbsolutePath()
-                except Exception:
-                    # Fallback 1: Direct public path
-                    download_dir = "/sdcard/Download"
-                
-                # Ensure our subfolder exists - with robustness
-                try:
-                    os.makedirs(download_dir, exist_ok=True)
-                except:
-                    pass
+    def clock_dispatch(fn, delay=0):
+        Clock.schedule_once(lambda dt: fn(), delay)
 
-                final_path = os.path.join(download_dir, "downloads")
-                os.makedirs(final_path, exist_ok=True)
-                return final_path
-                
-            except Exception as e:
-                print(f"Error getting download folder: {e}")
-                app = MDApp.get_running_app()
-                if app: return app.user_data_dir
-                return '/sdcard/Download'
-        return os.path.join(os.getcwd(), 'downloads')
+    def start_download_service(data_dir):
+        """Start the Android background service and return a manager that talks to it, or None."""
+        try:
+            from jnius import autoclass
+            import json
+            service = autoclass('org.downloads.downloads.ServiceDownloader')
+            activity = autoclass('org.kivy.android.PythonActivity').mActivity
+            service.start(activity, json.dumps({'data_dir': data_dir}))
+            remote = RemoteDownloadManager(
+                JsonRpcClient(os.path.join(data_dir, 'rpc.json')), progress_bus, dispatch=clock_dispatch
+            )
+            remote.connect(timeout=10)
+            return remote
+        except Exception as e:
+            print(f"Download service unavailable, running downloads in-app: {e}")
+            return None
     
 
     # --- UI Components ---
@@ -544,7 +231,8 @@ if safe_start:
             
             # Title
             title_box = MDBoxLayout(size_hint_y=None, height=dp(30))
-            title_box.add_widget(MDLabel(text=display_text, font_style="Subtitle2", theme_text_color="Primary"))
+            self.title_label = MDLabel(text=display_text, font_style="Subtitle2", theme_text_color="Primary")
+            title_box.add_widget(self.title_label)
             self.add_widget(title_box)
             
             # Status & Speed row
@@ -578,11 +266,50 @@ if safe_start:
             
             self.add_widget(controls)
             
-            # Additional Controls Row (Copy)
+            # Additional Controls Row (Copy, Speed)
             copy_btn = MDIconButton(icon="content-copy", theme_text_color="Hint", icon_size="20sp")
             copy_btn.bind(on_release=self.copy_url)
             controls.add_widget(copy_btn)
 
+            speed_btn = MDIconButton(icon="speedometer", theme_text_color="Hint", icon_size="20sp")
+            speed_btn.bind(on_release=self.show_speed_menu)
+            controls.add_widget(speed_btn)
+
+        def show_speed_menu(self, instance):
+            from kivymd.uix.menu import MDDropdownMenu
+            options = [
+                ("No limit", 'limit', None),
+                ("256 KB/s", 'limit', 256 * 1024),
+                ("1 MB/s", 'limit', 1024 * 1024),
+                ("High priority", 'weight', 3),
+                ("Normal priority", 'weight', 1),
+            ]
+            menu_items = [
+                {
+                    "text": text,
+                    "viewclass": "OneLineListItem",
+                    "on_release": lambda t=text, k=kind, v=value: self.set_speed(t, k, v),
+                } for text, kind, value in options
+            ]
+            self.speed_menu = MDDropdownMenu(
+                caller=instance,
+                items=menu_items,
+                width_mult=4,
+            )
+            self.speed_menu.open()
+
+        def set_speed(self, text, kind, value):
+            try:
+                if kind == 'limit':
+                    dm.set_task_limit(self.task_id, value)
+                else:
+                    dm.set_task_weight(self.task_id, value)
+                toast(text)
+            except Exception as e:
+                toast(f"Error: {e}")
+            if hasattr(self, 'speed_menu'):
+                self.speed_menu.dismiss()
+
         def copy_url(self, instance):
             from kivy.core.clipboard import Clipboard
             Clipboard.copy(self.url)
@@ -595,13 +322,8 @@ if safe_start:
             self.progress_bar.value = progress
             if title:
                 # Update title if we learned it (e.g. from yt-dlp)
-                # We need to find the label in title_box
-                for child in self.children:
-                    if isinstance(child, MDBoxLayout) and len(child.children) > 0 and isinstance(child.children[0], MDLabel):
-                         # Note: children order might be reversed in Kivy layout logic, but let's just find the label
-                         pass 
-                # Simpler: just reload list if title changes or assume user doesn't strictly need real-time title update on card until refresh
-                pass
+                if len(title) > 40: title = title[:37] + "..."
+                self.title_label.text = title
             
             # Update action button based on manager state
             if dm.is_running(self.task_id):
@@ -619,15 +341,27 @@ if safe_start:
 
         def cancel_download(self, instance):
             dm.stop_download(self.task_id)
+            # Drop the partial file along with the task; nothing will resume it now
+            state = db.get_download_state(self.task_id)
+            if state and state['part_path'] and os.path.exists(state['part_path']):
+                try: os.remove(state['part_path'])
+                except OSError as e: print(f"Part file remove error: {e}")
             db.delete_task(self.task_id)
-            if self.parent:
-                self.parent.remove_widget(self)
+            self._detach()
             toast("Removed")
 
+        def _detach(self):
+            progress_bus.unsubscribe(self.task_id)
+            curr_app = MDApp.get_running_app()
+            if curr_app:
+                curr_app.remove_active_card(self.task_id)
+            elif self.parent:
+                self.parent.remove_widget(self)
+
         def start_download(self):
             task = db.get_task(self.task_id)
             if not task: return
-            url = task[1]
+            url = task['url']
             
             self.update_view("Downloading", self.progress_bar.value, "Starting...")
             dm.start_download(
@@ -637,6 +371,8 @@ if safe_start:
                 on_complete=self._on_dm_complete,
                 on_error=self._on_dm_error
             )
+            if dm.is_queued(self.task_id):
+                self.update_view("Queued", self.progress_bar.value, "Waiting for slot...")
 
         def _on_dm_progress(self, progress, speed):
             self.update_view("Downloading", progress, speed)
@@ -644,8 +380,7 @@ if safe_start:
         def _on_dm_complete(self, filepath, title):
             self.update_view("Completed", 100, "")
             toast("Download Finished")
-            if self.parent:
-                self.parent.remove_widget(self)
+            self._detach()
             
             curr_app = MDApp.get_running_app()
             if curr_app:
@@ -656,178 +391,6 @@ if safe_start:
             toast(f"Error: {error_msg}")
 
 
-    # ... (HistoryItem, RightActionContainer stay same) ...
-    class HistoryItem(MDCard):
-        def __init__(self, task_id, title, filepath, **kwargs):
-            super().__init__(**kwargs)
-            self.task_id = task_id
-            self.filepath = filepath
-            self.title = title
-            
-            self.orientation = "horizontal"
-            self.padding = dp(15)
-            self.spacing = dp(12)
-            self.size_hint_y = None
-            self.height = dp(90)
-            self.elevation = 2
-            self.radius = [15]
-            self.md_bg_color = (0.12, 0.12, 0.15, 1)
-            self.line_color = (0.2, 0.7, 0.8, 0.2)
-            self.line_width = 1
-            
-            # File icon with background
-            icon_container = MDRelativeLayout(size_hint=(None, None), size=(dp(50), dp(50)))
-            icon_bg = MDCard(
-                md_bg_color=(0.2, 0.7, 0.8, 0.2),
-                radius=[12],
-                size_hint=(1, 1)
-            )
-            icon = MDIconButton(
-                icon="file-check-outline",
-                theme_text_color="Custom",
-                text_color=(0.2, 0.7, 0.8, 1),
-                disabled=True,
-                icon_size="28sp",
-                pos_hint={'center_x': 0.5, 'center_y': 0.5}
-            )
-            icon_container.add_widget(icon_bg)
-            icon_container.add_widget(icon)
-            self.add_widget(icon_container)
-            
-            # Text Info
-            text_box = MDBoxLayout(orientation="vertical", spacing=dp(4))
-            title_label = MDLabel(
-                text=title,
-                font_style="Subtitle2",
-                theme_text_color="Primary",
-                bold=True,
-                shorten=True,
-                shorten_from="right"
-            )
-            path_label = MDLabel(
-                text=filepath,
-                font_style="Caption",
-                theme_text_color="Hint",
-                shorten=True,
-                shorten_from="right"
-            )
-            text_box.add_widget(title_label)
-            text_box.add_widget(path_label)
-            self.add_widget(text_box)
-            
-            # Actions - Fixed width issue by using adaptive_width
-            actions = MDBoxLayout(
-                orientation="horizontal", 
-                adaptive_width=True, 
-                spacing=dp(4),
-                pos_hint={"center_y": .5}
-            )
-            
-            open_btn = MDIconButton(
-                icon="open-in-new", 
-                theme_text_color="Custom", 
-                text_color=app.theme_cls.primary_color,
-                icon_size="24sp",
-                size_hint=(None, None),
-                size=(dp(48), dp(48)),
-            )
-            open_btn.bind(on_release=self.open_file)
-            
-            share_btn = MDIconButton(
-                icon="share-variant-outline", 
-                theme_text_color="Custom", 
-                text_color=(0.2, 0.7, 1, 1),
-                icon_size="24sp",
-                size_hint=(None, None),
-                size=(dp(48), dp(48)),
-            )
-            share_btn.bind(on_release=self.share_file)
-            
-            del_btn = MDIconButton(
-                icon="delete-outline", 
-                theme_text_color="Custom", 
-                text_color=(1, 0.3, 0.3, 1),
-                icon_size="24sp",
-                size_hint=(None, None),
-                size=(dp(48), dp(48)),
-            )
-            del_btn.bind(on_release=self.confirm_delete)
-            
-            actions.add_widget(open_btn)
-            actions.add_widget(share_btn)
-            actions.add_widget(del_btn)
-            self.add_widget(actions)
-            
-            # Entrance animation
-            self.opacity = 0
-            anim = Animation(opacity=1, duration=0.3)
-            anim.start(self)
-
-        def open_file(self, instance):
-            open_file_native(self.filepath)
-
-        def share_file(self, instance):
-            share_file_native(self.filepath)
-        
-        def confirm_delete(self, instance):
-            from kivymd.uix.button import MDFlatButton
-            self.dialog = MDDialog(
-                title="Delete File?",
-                text=f"Are you sure you want to delete '{self.title}'?\nThis will remove it from history and storage.",
-                buttons=[
-                    MDFlatButton(text="CANCEL", on_release=lambda x: self.dialog.dismiss()),
-                    MDRaisedButton(text="DELETE", md_bg_color=(0.9, 0.1, 0.1, 1), on_release=self.delete_file),
-                ],
-            )
-            self.dialog.open()
-
-        def delete_file(self, instance):
-            abs_path = os.path.abspath(self.filepath)
-            print(f"DEBUG: Attempting to delete file at: {abs_path}")
-            
-            if hasattr(self, 'dialog') and self.dialog:
-                self.dialog.dismiss()
-            
-            # 1. Delete from Database
-            try:
-                db.delete_task(self.task_id)
-                db_deleted = True
-            except Exception as e:
-                print(f"DB Delete Error: {e}")
-                db_deleted = False
-
-            # 2. Delete Physical File
-            file_deleted = False
-            if os.path.exists(abs_path):
-                try:
-                    os.remove(abs_path)
-                    file_deleted = True
-                except Exception as e:
-                    print(f"OS Remove Error: {e}")
-                    # Try Android specific if on platform
-                    if platform == 'android':
-                        try:
-                            from jnius import autoclass
-                            File = autoclass('java.io.File')
-                            f = File(abs_path)
-                            if f.delete():
-                                file_deleted = True
-                        except: pass
-            
-            # 3. Final Feedback
-            if db_deleted and file_deleted:
-                toast("Deleted from History and Storage")
-            elif db_deleted:
-                if os.path.exists(abs_path):
-                    toast("History record removed but file deletion failed (Permission?)")
-                else:
-                    toast("History record removed (File was already missing)")
-            else:
-                toast("Failed to delete record from database")
-
-            if self.parent:
-                self.parent.remove_widget(self)
-
     class StartupScreen(MDScreen):
         def __init__(self, **kwargs):
             super().__init__(**kwargs)
@@ -856,25 +419,100 @@ if safe_start:
 
     class DownloadsApp(MDApp):
         def build(self):
-            global db
             global app 
             app = self
             self.theme_cls.primary_palette = "Teal"
             self.theme_cls.theme_style = "Dark"
-            
-            try:
-                db_path = get_db_path()
-                db = DBManager(db_path)
-            except Exception as e:
-                return ErrorApp(f"DB Init Error: {e}").build()
 
             self.selected_format = "video"
             self.selected_quality = "best"
+            self.selected_fragments = None # None = global fragment setting
+            self.files_tab = None # built on the first visit to the Files tab
             self.sm = MDScreenManager()
             
             # --- Splash Screen ---
+            # The only thing built before the first frame; the rest is set up in finish_startup
             self.sm.add_widget(StartupScreen(name="startup"))
-            
+            return self.sm
+
+        def on_start(self):
+            # Heavy setup waits until the splash has actually been drawn once
+            Window.bind(on_flip=self._on_first_frame)
+
+        def _on_first_frame(self, *args):
+            Window.unbind(on_flip=self._on_first_frame)
+            Clock.schedule_once(self.finish_startup)
+
+        def finish_startup(self, dt):
+            global db
+            global dedup
+            global info_cache
+            global dm
+            startup_timer.mark("first frame")
+            try:
+                db_path = get_db_path()
+                db = DBManager(db_path)
+                dedup = DedupIndex(db)
+            except Exception as e:
+                self.show_startup_error(f"DB Init Error: {e}")
+                return
+            startup_timer.mark("database")
+
+            # Fix SSL on Android
+            try:
+                import certifi
+                os.environ['SSL_CERT_FILE'] = certifi.where()
+            except Exception:
+                pass
+
+            try:
+                info_cache = InfoCache(get_cache_path(), ttl=INFO_CACHE_TTL, max_bytes=INFO_CACHE_MAX_BYTES)
+            except Exception as e:
+                # Only an optimization; run without it
+                print(f"Info cache disabled: {e}")
+
+            dm = None
+            if platform == 'android':
+                # Downloads run in the background service so they outlive the activity
+                dm = start_download_service(os.path.dirname(db_path))
+            if dm is None:
+                network = None
+                if platform == 'android':
+                    # No service: pause on mobile data or low battery and widen the pool on chargers here
+                    try:
+                        from network_monitor import AndroidProvider, NetworkMonitor
+                        network = NetworkMonitor(AndroidProvider()).start()
+                    except Exception as e:
+                        print(f"Network monitor disabled: {e}")
+                dm = DownloadManager(
+                    db, progress_bus, get_download_folder,
+                    info_cache=info_cache,
+                    direct_engine=direct_engine,
+                    dispatch=clock_dispatch,
+                    notifier=send_notification,
+                    on_busy=self.acquire_wakelock,
+                    on_idle=self.release_wakelock,
+                    max_concurrent=MAX_CONCURRENT_DOWNLOADS,
+                    per_host_limit=PER_HOST_LIMIT,
+                    network=network
+                )
+            startup_timer.mark("download manager")
+
+            self.sm.add_widget(self.build_main_screen())
+            # Ready: leave the splash now rather than after a fixed delay
+            self.sm.current = "main"
+            startup_timer.mark("home tab")
+            self.after_startup()
+            startup_timer.mark("ready")
+            startup_timer.report()
+
+        def show_startup_error(self, message):
+            screen = MDScreen(name="error")
+            screen.add_widget(ErrorApp(message).build())
+            self.sm.add_widget(screen)
+            self.sm.current = "error"
+
+        def build_main_screen(self):
             # --- Main Screen ---
             main_screen = MDScreen(name="main")
             self.root_nav = MDBottomNavigation(text_color_active="white")
@@ -886,7 +524,10 @@ if safe_start:
             # Input Card (Improved Padding)
             input_card = MDCard(orientation="vertical", padding=dp(20), spacing=dp(15), size_hint_y=None, height=dp(210), elevation=4, radius=[20])
             
-            input_card.add_widget(MDLabel(text="Add New Download", font_style="H6", theme_text_color="Primary", bold=True))
+            input_header = MDBoxLayout(size_hint_y=None, height=dp(30))
+            input_header.add_widget(MDLabel(text="Add New Download", font_style="H6", theme_text_color="Primary", bold=True))
+            input_header.add_widget(MDIconButton(icon="text-box-multiple-outline", theme_text_color="Secondary", on_release=self.show_bulk_dialog))
+            input_card.add_widget(input_header)
             self.url_input = MDTextField(hint_text="Paste Link Here", mode="fill", icon_right="link", radius=[10,10,0,0])
             input_card.add_widget(self.url_input)
 
@@ -895,19 +536,26 @@ if safe_start:
             
             self.format_btn = MDRaisedButton(
                 text="Format: Video", 
-                size_hint_x=0.5, 
+                size_hint_x=0.35, 
                 md_bg_color=(0.2, 0.2, 0.2, 1),
                 on_release=self.show_format_menu
             )
             self.quality_btn = MDRaisedButton(
                 text="Quality: Best", 
-                size_hint_x=0.5, 
+                size_hint_x=0.35, 
                 md_bg_color=(0.2, 0.2, 0.2, 1),
                 on_release=self.show_quality_menu
             )
+            self.fragments_btn = MDRaisedButton(
+                text="Parallel: Auto",
+                size_hint_x=0.3,
+                md_bg_color=(0.2, 0.2, 0.2, 1),
+                on_release=self.show_fragments_menu
+            )
             
             selection_row.add_widget(self.format_btn)
             selection_row.add_widget(self.quality_btn)
+            selection_row.add_widget(self.fragments_btn)
             input_card.add_widget(selection_row)
             
             add_btn = MDRaisedButton(text="DOWNLOAD", size_hint_x=1, elevation=2, font_size='16sp', on_release=self.add_download)
@@ -916,51 +564,39 @@ if safe_start:
             main_layout.add_widget(input_card)
             
             # Active Header
-            main_layout.add_widget(MDLabel(text="Active Downloads", font_style="H6", size_hint_y=None, height=dp(30), theme_text_color="Secondary"))
+            active_header = MDBoxLayout(size_hint_y=None, height=dp(30))
+            active_header.add_widget(MDLabel(text="Active Downloads", font_style="H6", theme_text_color="Secondary"))
+            active_header.add_widget(MDIconButton(icon="chart-bar", theme_text_color="Secondary", on_release=self.show_stats_dialog))
+            active_header.add_widget(MDIconButton(icon="speedometer", theme_text_color="Secondary", on_release=self.show_limit_menu))
+            main_layout.add_widget(active_header)
             
             self.active_scroll = MDScrollView()
             self.active_list = MDBoxLayout(orientation='vertical', spacing=dp(15), padding=[0, dp(5), 0, dp(15)], adaptive_height=True)
             self.active_scroll.add_widget(self.active_list)
+            self.active_cards = {} # task_id: DownloadCard
+            self.active_placeholder = MDLabel(text="No active downloads", halign="center", theme_text_color="Hint")
             main_layout.add_widget(self.active_scroll)
             screen1.add_widget(main_layout)
 
-            # --- Screen 2: Files ---
-            screen2 = MDBottomNavigationItem(name='screen2', text='Files', icon='folder-multiple', on_tab_press=self.refresh_history)
-            history_layout = MDBoxLayout(orientation='vertical')
-            
-            # History Toolbar with Clear All
-            toolbar = MDBoxLayout(size_hint_y=None, height=dp(60), padding=dp(15), md_bg_color=(0.1,0.1,0.1,1))
-            toolbar.add_widget(MDLabel(text="Downloaded Files", font_style="H6", theme_text_color="Primary", bold=True))
-            
-            clear_btn = MDIconButton(icon="delete-sweep", theme_text_color="Error", on_release=self.clear_all_history)
-            toolbar.add_widget(clear_btn)
-            
-            history_layout.add_widget(toolbar)
-            
-            self.history_scroll = MDScrollView()
-            self.history_list = MDBoxLayout(orientation='vertical', spacing=dp(12), padding=[dp(15), dp(5), dp(15), dp(20)], adaptive_height=True)
-            self.history_scroll.add_widget(self.history_list)
-            history_layout.add_widget(self.history_scroll)
-            screen2.add_widget(history_layout)
+            # --- Screen 2: Files (built on first visit, see show_files) ---
+            self.files_screen = MDBottomNavigationItem(name='screen2', text='Files', icon='folder-multiple', on_tab_press=self.show_files)
 
             self.root_nav.add_widget(screen1)
-            self.root_nav.add_widget(screen2)
+            self.root_nav.add_widget(self.files_screen)
             
             main_screen.add_widget(self.root_nav)
-            self.sm.add_widget(main_screen)
-            
-            # Switch to main UI after 2.5 seconds
-            Clock.schedule_once(self.switch_to_main, 2.5)
-            
-            return self.sm
+            return main_screen
+
+        def show_files(self, *args):
+            if self.files_tab is None:
+                from files_screen import FilesTab
+                self.files_tab = FilesTab(db, open_file_native, share_file_native, on_clear=self.clear_all_history)
+                self.files_screen.add_widget(self.files_tab)
+            self.refresh_history()
 
-        def switch_to_main(self, dt):
-            self.sm.current = "main"
-            
         def clear_all_history(self, instance):
             try:
-                db.cursor.execute("DELETE FROM downloads WHERE status='Completed'")
-                db.conn.commit()
+                db.clear_completed()
                 self.refresh_history()
                 toast("History Cleared")
             except Exception as e:
@@ -1017,8 +653,70 @@ if safe_start:
             if hasattr(self, 'quality_menu'):
                 self.quality_menu.dismiss()
 
-        # ... (on_start, add_download, refresh_active stay same or similiar) ...
-        def on_start(self):
+        def show_fragments_menu(self, instance):
+            # Fragments of an HLS/DASH stream fetched at once, for the next download
+            from kivymd.uix.menu import MDDropdownMenu
+            menu_items = [
+                {
+                    "text": "Auto" if n is None else f"{n}x",
+                    "viewclass": "OneLineListItem",
+                    "on_release": lambda x=n: self.set_fragments(x),
+                } for n in (None, 1, 2, 4, 8, 16)
+            ]
+            if self.selected_fragments:
+                menu_items.append({
+                    "text": f"Use {self.selected_fragments}x for all",
+                    "viewclass": "OneLineListItem",
+                    "on_release": self.set_default_fragments,
+                })
+            self.fragments_menu = MDDropdownMenu(
+                caller=instance,
+                items=menu_items,
+                width_mult=4,
+            )
+            self.fragments_menu.open()
+
+        def set_fragments(self, fragments):
+            self.selected_fragments = fragments
+            self.fragments_btn.text = f"Parallel: {fragments}x" if fragments else "Parallel: Auto"
+            if hasattr(self, 'fragments_menu'):
+                self.fragments_menu.dismiss()
+
+        def set_default_fragments(self):
+            try:
+                dm.set_fragments(self.selected_fragments)
+                toast(f"{self.selected_fragments} parallel fragments by default")
+            except Exception as e:
+                toast(f"Error: {e}")
+            self.set_fragments(None)
+
+        def show_limit_menu(self, instance):
+            from kivymd.uix.menu import MDDropdownMenu
+            limits = [("Unlimited", None), ("256 KB/s", 256 * 1024), ("1 MB/s", 1024 ** 2), ("5 MB/s", 5 * 1024 ** 2), ("10 MB/s", 10 * 1024 ** 2)]
+            menu_items = [
+                {
+                    "text": text,
+                    "viewclass": "OneLineListItem",
+                    "on_release": lambda t=text, l=limit: self.set_limit(t, l),
+                } for text, limit in limits
+            ]
+            self.limit_menu = MDDropdownMenu(
+                caller=instance,
+                items=menu_items,
+                width_mult=4,
+            )
+            self.limit_menu.open()
+
+        def set_limit(self, text, limit):
+            try:
+                dm.set_global_limit(limit)
+                toast(f"Speed limit: {text}")
+            except Exception as e:
+                toast(f"Error: {e}")
+            if hasattr(self, 'limit_menu'):
+                self.limit_menu.dismiss()
+
+        def after_startup(self):
             if platform == 'android':
                 init_notification_channel()
                 from android.permissions import request_permissions, Permission
@@ -1030,6 +728,14 @@ if safe_start:
                      'android.permission.POST_NOTIFICATIONS'
                 ]
                 request_permissions(perms)
+                from android import activity as android_activity
+                from jnius import autoclass
+                android_activity.bind(on_new_intent=self.on_new_intent)
+                self.on_new_intent(autoclass('org.kivy.android.PythonActivity').mActivity.getIntent())
+            else:
+                Window.bind(on_drop_file=self.on_drop_file)
+            # Single UI-side consumer for all worker progress updates
+            Clock.schedule_interval(progress_bus.drain, 1 / UI_PROGRESS_HZ)
             try:
                 self.refresh_active()
                 # Check for zombie tasks (Downloads that were 'Downloading' but app was killed)
@@ -1041,6 +747,8 @@ if safe_start:
             return True # Allow pause
 
         def on_resume(self):
+            if db is None:
+                return # still starting up
             try:
                 self.refresh_active()
                 self.check_zombie_tasks(0)
@@ -1052,20 +760,17 @@ if safe_start:
             try:
                 tasks = db.get_tasks(['Downloading'])
                 for task in tasks:
-                    t_id, url, title, status, progress, path, ts = task
+                    t_id, url = task['id'], task['url']
                     # If it says 'Downloading' in DB but NOT running in DM, it's a zombie
                     if not dm.is_running(t_id):
                         print(f"Found Zombie Task: {t_id} {url}")
                         # Option 1: Auto-Restart
-                        card_found = False
-                        for widget in self.active_list.children:
-                            if isinstance(widget, DownloadCard) and widget.task_id == t_id:
-                                widget.start_download()
-                                card_found = True
-                                break
+                        card = self.active_cards.get(t_id)
+                        if card:
+                            card.start_download()
                         
                         # If card was not in list (maybe refresh didn't happen yet?), try force update status
-                        if not card_found:
+                        else:
                             # Set to paused so user can manual restart, OR auto restart
                             # Let's set it to 'Error/Interrupted' so user knows
                             db.update_status(t_id, "Paused") 
@@ -1074,39 +779,23 @@ if safe_start:
                 print(f"Zombie Check Error: {e}")
 
         # --- WakeLock ---
-        wakelock = None
+        wakelock = WakeLock("DownloadsApp:WakeLock")
         def acquire_wakelock(self):
-            if platform == 'android':
-                if self.wakelock:
-                    return # Already has it
-                try:
-                    from jnius import autoclass
-                    Context = autoclass('android.content.Context')
-                    PowerManager = autoclass('android.os.PowerManager')
-                    PythonActivity = autoclass('org.kivy.android.PythonActivity')
-                    activity = PythonActivity.mActivity
-                    pm = activity.getSystemService(Context.POWER_SERVICE)
-                    self.wakelock = pm.newWakeLock(PowerManager.PARTIAL_WAKE_LOCK, "DownloadsApp:WakeLock")
-                    self.wakelock.acquire()
-                    print("WakeLock Acquired")
-                except Exception as e:
-                    print(f"WakeLock Error: {e}")
+            self.wakelock.acquire()
 
         def release_wakelock(self):
-            if platform == 'android' and self.wakelock:
-                try:
-                    if self.wakelock.isHeld():
-                        self.wakelock.release()
-                        self.wakelock = None
-                        print("WakeLock Released")
-                except Exception as e:
-                    print(f"WakeLock Release Error: {e}")
+            self.wakelock.release()
 
         def add_download(self, instance):
             url = self.url_input.text.strip()
             if not url: 
                 toast("Please enter a URL")
                 return
+            if len(url.split()) > 1:
+                # Several links pasted at once (newlines become spaces in a one-line field)
+                self.url_input.text = ""
+                self.import_links(url)
+                return
             
             # --- URL Validation ---
             # Accept only http/https. Reject magnets and .torrent
@@ -1118,48 +807,156 @@ if safe_start:
                 toast("Torrent links are not supported")
                 return
 
+            # Matching the link against known extractors can take a moment the first time
+            format_type, quality, fragments = self.selected_format, self.selected_quality, self.selected_fragments
+            self.url_input.text = ""
+            threading.Thread(target=self._add_task, args=(url, format_type, quality, fragments), daemon=True).start()
+
+        def _add_task(self, url, format_type, quality, fragments):
             try:
-                task_id = db.add_task(url, format_type=self.selected_format, quality=self.selected_quality)
-                self.url_input.text = ""
-                self.refresh_active()
-                toast("Added to downloads")
+                task_id, duplicate = dedup.add(url, format_type=format_type, quality=quality, fragments=fragments)
+                if duplicate == 'queued' and not dm.is_running(task_id):
+                    db.update_status(task_id, 'Pending') # picked up again by refresh_active
+                    db.flush()
+                message = {
+                    None: "Added to downloads",
+                    'queued': "Already in downloads",
+                    'completed': "Already downloaded",
+                }[duplicate]
+                Clock.schedule_once(lambda dt: (self.refresh_active(), toast(message)))
+            except Exception as e:
+                err = str(e)
+                Clock.schedule_once(lambda dt: toast(f"Error: {err}"))
+
+        # --- Download stats ---
+        def show_stats_dialog(self, instance):
+            from kivymd.uix.button import MDFlatButton
+            from kivymd.uix.dialog import MDDialog
+            import net_pool
+            import telemetry
+            text = telemetry.summary_text(db.metrics_summary(telemetry.PHASES), db.get_metrics(limit=10))
+            # Connections live wherever the downloads run
+            try:
+                net = dm.client.call('stats')['net_pool'] if isinstance(dm, RemoteDownloadManager) else net_pool.stats()
+                text += "\n\nConnections: " + net_pool.format_stats(net)
+            except Exception as e:
+                print(f"Connection stats unavailable: {e}")
+            self.stats_dialog = MDDialog(
+                title="Download Stats",
+                text=text,
+                buttons=[MDFlatButton(text="CLOSE", on_release=lambda x: self.stats_dialog.dismiss())],
+            )
+            self.stats_dialog.open()
+
+        # --- Bulk add ---
+        def show_bulk_dialog(self, instance):
+            from kivymd.uix.button import MDFlatButton
+            from kivymd.uix.dialog import MDDialog
+            field = MDTextField(hint_text="One link per line", multiline=True, max_height=dp(300))
+            self.bulk_dialog = MDDialog(
+                title="Add Many Links",
+                type="custom",
+                content_cls=field,
+                buttons=[
+                    MDFlatButton(text="CANCEL", on_release=lambda x: self.bulk_dialog.dismiss()),
+                    MDRaisedButton(text="ADD ALL", on_release=lambda x: self._bulk_dialog_done(field.text)),
+                ],
+            )
+            self.bulk_dialog.open()
+
+        def _bulk_dialog_done(self, text):
+            self.bulk_dialog.dismiss()
+            if text.strip():
+                self.import_links(text)
+
+        def import_links(self, source, close=None):
+            # source: pasted text or an iterable of lines (a file, a share intent)
+            toast("Adding links...")
+            format_type, quality, fragments = self.selected_format, self.selected_quality, self.selected_fragments
+            threading.Thread(target=self._import_links, args=(source, format_type, quality, fragments, close), daemon=True).start()
+
+        def _import_links(self, source, format_type, quality, fragments, close):
+            try:
+                result = bulk_import.import_links(dedup, source, format_type, quality, fragments)
+                for task_id in result['queued']:
+                    if not dm.is_running(task_id):
+                        db.update_status(task_id, 'Pending') # picked up again by refresh_active
+                db.flush()
+                message = bulk_import.summary(result)
+                for text, reason in result['errors']:
+                    print(f"Skipped {text}: {reason}")
+                # One refresh for the whole import
+                Clock.schedule_once(lambda dt: (self.refresh_active(), toast(message)))
             except Exception as e:
+                err = str(e)
+                Clock.schedule_once(lambda dt: toast(f"Error: {err}"))
+            finally:
+                if close:
+                    close()
+
+        def on_drop_file(self, window, path, *args):
+            # Desktop: a text file of links dropped on the window
+            path = path.decode('utf-8') if isinstance(path, bytes) else path
+            try:
+                f = open(path, encoding='utf-8', errors='replace')
+            except OSError as e:
                 toast(f"Error: {e}")
+                return
+            self.import_links(f, close=f.close)
+
+        def on_new_intent(self, intent):
+            # Android: text or a text file shared to the app
+            lines = shared_lines(intent)
+            if lines is not None:
+                Clock.schedule_once(lambda dt: self.import_links(lines))
 
         def refresh_active(self, *args):
+            # Keyed reconciliation: cards are matched to rows by task_id, so only
+            # added/removed rows touch the widget tree and live cards keep their state.
             try:
-                self.active_list.clear_widgets()
-                tasks = db.get_tasks(['Pending', 'Downloading', 'Paused', 'Error'])
+                tasks = db.get_tasks(ACTIVE_STATUSES, top_level_only=True)
+                wanted = {task['id'] for task in tasks}
+
+                for t_id in [t_id for t_id in self.active_cards if t_id not in wanted]:
+                    self.remove_active_card(t_id)
+
                 if not tasks:
-                    self.active_list.add_widget(MDLabel(text="No active downloads", halign="center", theme_text_color="Hint"))
+                    if not self.active_placeholder.parent:
+                        self.active_list.add_widget(self.active_placeholder)
                     return
-                for task in tasks:
-                    t_id, url, title, status, progress, path, ts = task
-                    card = DownloadCard(t_id, url, title, status, progress) # Speed is empty initially
-                    self.active_list.add_widget(card)
-                    if status == 'Pending': card.start_download()
+                if self.active_placeholder.parent:
+                    self.active_list.remove_widget(self.active_placeholder)
+
+                # Surviving cards are already in timestamp order, so inserting the
+                # new ones at their position keeps the whole list ordered.
+                for position, task in enumerate(tasks):
+                    t_id = task['id']
+                    card = self.active_cards.get(t_id)
+                    if card is None:
+                        card = DownloadCard(t_id, task['url'], task['title'], task['status'], task['progress']) # Speed is empty initially
+                        self.active_cards[t_id] = card
+                        # Kivy counts child indexes from the bottom of the layout
+                        self.active_list.add_widget(card, index=len(self.active_list.children) - position)
+                    elif not dm.is_running(t_id):
+                        # Running cards are driven by progress callbacks; don't clobber them with DB state
+                        card.update_view(task['status'], task['progress'], title=task['title'])
+                    if task['status'] == 'Pending' and not dm.is_running(t_id):
+                        card.start_download()
             except Exception as e:
                 print(e)
+
+        def remove_active_card(self, task_id):
+            card = self.active_cards.pop(task_id, None)
+            if card and card.parent:
+                card.parent.remove_widget(card)
+            if not self.active_cards and not self.active_placeholder.parent:
+                self.active_list.add_widget(self.active_placeholder)
                 
         def refresh_history(self, *args):
+            if self.files_tab is None:
+                return # loaded when the tab is first opened
             try:
-                self.history_list.clear_widgets()
-                tasks = db.get_tasks('Completed')
-                if not tasks:
-                    empty_state = MDBoxLayout(orientation="vertical", spacing=dp(10), padding=dp(30), size_hint_y=None, height=dp(200))
-                    empty_icon = MDIconButton(icon="folder-open-outline", theme_text_color="Hint", disabled=True, icon_size="64sp", pos_hint={'center_x': 0.5})
-                    empty_label = MDLabel(text="No downloads yet", halign="center", theme_text_color="Hint", font_style="Subtitle1")
-                    empty_state.add_widget(empty_icon)
-                    empty_state.add_widget(empty_label)
-                    self.history_list.add_widget(empty_state)
-                    return
-                
-                for task in tasks:
-                    t_id, url, title, status, progress, path, ts = task
-                    display_text = title if title else url
-                    display_path = path if path else "Unknown"
-                    item = HistoryItem(t_id, display_text, display_path)
-                    self.history_list.add_widget(item)
+                self.files_tab.reload()
             except Exception as e:
                 print(e)
                 toast(f"History Error: {e}")
@@ -0,0 +1,336 @@
+"""
+Process-wide HTTP networking shared by every download worker and by yt-dlp
+(metadata extraction, fragments and plain streams alike).
+
+    keep-alive pools   one urllib3 pool per host behind shared adapters, so a
+                       connection opened by one task serves the next
+    DNS cache          socket.getaddrinfo answers are kept for `dns_ttl` seconds
+    TLS resumption     the newest session per host:port is offered on the next
+                       handshake, which then skips the full key exchange
+
+install() turns on the DNS cache; session() hands out requests sessions on
+the shared pool (http_engine.make_session uses it) and register_ytdlp()
+adds a yt-dlp request handler that takes precedence over the stock
+requests handler and mounts the shared adapter instead of its own. stats()
+reports connection reuse and an estimate of the handshake time saved.
+"""
+import os
+import socket
+import threading
+import time
+import weakref
+
+DNS_TTL = 300.0 # getaddrinfo hides the record TTL; CDNs rarely rotate faster
+DNS_MAX_ENTRIES = 256
+POOL_HOSTS = 32 # hosts with pooled connections (least recently used pool is dropped)
+POOL_PER_HOST = 16 # idle connections kept per host: MAX_FRAGMENTS
+
+
+class NetPool:
+    def __init__(self, dns_ttl=DNS_TTL, pool_hosts=POOL_HOSTS, per_host=POOL_PER_HOST):
+        self.dns_ttl = dns_ttl
+        self.pool_hosts = pool_hosts
+        self.per_host = per_host
+        self.lock = threading.Lock()
+        self.dns = {} # (host, port, family, type, proto, flags): (expires, answer)
+        self.tls_sessions = {} # (context id, host, port): (weakref to the live socket, last session)
+        self.adapters = {} # key: shared requests adapter
+        self.resolve = None # the real socket.getaddrinfo once installed
+        self.ytdlp_registered = False
+        self.classes = None # {scheme: pool class}, built on first use (urllib3 loads lazily)
+        self.session_class = None
+        self.stats_ = {
+            'requests': 0, 'connections': 0, 'connect_s': 0.0,
+            'dns_lookups': 0, 'dns_hits': 0, 'dns_s': 0.0,
+            'tls_full': 0, 'tls_full_s': 0.0, 'tls_resumed': 0, 'tls_resumed_s': 0.0,
+        }
+
+    def _count(self, **deltas):
+        with self.lock:
+            for name, value in deltas.items():
+                self.stats_[name] += value
+
+    # --- DNS ---
+    def install(self):
+        """Route every getaddrinfo in this process through the cache (idempotent)."""
+        with self.lock:
+            if self.resolve is None:
+                self.resolve = socket.getaddrinfo
+                socket.getaddrinfo = self.getaddrinfo
+        return self
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        key = (host, port, family, type, proto, flags)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.dns.get(key)
+            if entry is not None and entry[0] > now:
+                self.stats_['dns_hits'] += 1
+                return list(entry[1])
+        answer = self.resolve(host, port, family, type, proto, flags)
+        elapsed = time.monotonic() - now
+        with self.lock:
+            self.stats_['dns_lookups'] += 1
+            self.stats_['dns_s'] += elapsed
+            if len(self.dns) >= DNS_MAX_ENTRIES:
+                # Expired first, then the entries closest to expiring
+                for old in sorted(self.dns, key=lambda k: self.dns[k][0])[:DNS_MAX_ENTRIES // 4]:
+                    del self.dns[old]
+            self.dns[key] = (now + self.dns_ttl, tuple(answer))
+        return answer
+
+    def forget_host(self, host):
+        """Drop cached answers for host, e.g. after connections to it keep failing."""
+        with self.lock:
+            for key in [k for k in self.dns if k[0] == host]:
+                del self.dns[key]
+
+    # --- TLS sessions ---
+    def attach_tls(self, context):
+        """Offer cached sessions on every handshake made with this SSLContext."""
+        if getattr(context, 'net_pool', None) is self:
+            return context
+        wrap = context.wrap_socket
+        pool = self
+
+        def wrap_socket(sock, *args, server_hostname=None, session=None, **kwargs):
+            try:
+                port = sock.getpeername()[1]
+            except (OSError, IndexError):
+                port = None
+            # Sessions only resume with the context that made them
+            key = (id(context), server_hostname, port)
+            if session is None and server_hostname and not kwargs.get('server_side'):
+                session = pool._tls_session(key)
+            start = time.monotonic()
+            ssock = wrap(sock, *args, server_hostname=server_hostname, session=session, **kwargs)
+            elapsed = time.monotonic() - start
+            if ssock.session_reused:
+                pool._count(tls_resumed=1, tls_resumed_s=elapsed)
+            else:
+                pool._count(tls_full=1, tls_full_s=elapsed)
+            with pool.lock:
+                pool.tls_sessions[key] = (weakref.ref(ssock), ssock.session)
+            return ssock
+
+        context.wrap_socket = wrap_socket
+        context.net_pool = self
+        return context
+
+    def _tls_session(self, key):
+        with self.lock:
+            entry = self.tls_sessions.get(key)
+        if entry is None:
+            return None
+        ref, session = entry
+        live = ref()
+        # TLS 1.3 tickets arrive after the handshake: a socket still in use has the newer one
+        current = live.session if live is not None else None
+        return current or session
+
+    # --- Pools ---
+    def _pool_classes(self):
+        if self.classes is None:
+            from urllib3.connection import HTTPConnection, HTTPSConnection
+            from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+            pool = self
+
+            def counted(base):
+                class Connection(base):
+                    def _new_conn(self):
+                        start = time.monotonic()
+                        sock = super()._new_conn()
+                        # DNS (through the cache) and the TCP handshake
+                        pool._count(connections=1, connect_s=time.monotonic() - start)
+                        return sock
+                return Connection
+
+            class HTTPPool(HTTPConnectionPool):
+                ConnectionCls = counted(HTTPConnection)
+
+                def urlopen(self, *args, **kwargs):
+                    pool._count(requests=1)
+                    return super().urlopen(*args, **kwargs)
+
+            class HTTPSPool(HTTPSConnectionPool):
+                ConnectionCls = counted(HTTPSConnection)
+
+                def urlopen(self, *args, **kwargs):
+                    pool._count(requests=1)
+                    return super().urlopen(*args, **kwargs)
+
+            self.classes = {'http': HTTPPool, 'https': HTTPSPool}
+        return self.classes
+
+    def shared_adapter(self, key, factory):
+        """The adapter for key, made by factory() (and instrumented) the first time."""
+        with self.lock:
+            adapter = self.adapters.get(key)
+        if adapter is not None:
+            return adapter
+        adapter = factory()
+        manager = adapter.poolmanager
+        manager.pool_classes_by_scheme = self._pool_classes()
+        context = manager.connection_pool_kw.get('ssl_context')
+        if context is not None:
+            self.attach_tls(context)
+        with self.lock:
+            # Another thread may have built the same one meanwhile; keep the first
+            return self.adapters.setdefault(key, adapter)
+
+    def session(self, per_host=None):
+        """requests session on the shared pool; closing it leaves the pool open."""
+        adapter = self.shared_adapter('requests', self._requests_adapter)
+        if per_host and per_host > adapter.poolmanager.connection_pool_kw.get('maxsize', 1):
+            # Applies to hosts first contacted from now on
+            adapter.poolmanager.connection_pool_kw['maxsize'] = per_host
+        if self.session_class is None:
+            self.session_class = _session_class()
+        session = self.session_class()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _requests_adapter(self):
+        import ssl
+        from requests.adapters import HTTPAdapter
+        from requests.utils import DEFAULT_CA_BUNDLE_PATH
+
+        # The bundle requests itself picks: with either variable set it passes verify=<that path>
+        # on every request, which must still count as the default
+        cafile = os.environ.get('REQUESTS_CA_BUNDLE') or os.environ.get('CURL_CA_BUNDLE') or DEFAULT_CA_BUNDLE_PATH
+        context = ssl.create_default_context(cafile=cafile)
+
+        plain = [] # adapter for requests that bring their own verify/cert settings, made on first use
+
+        class Adapter(HTTPAdapter):
+            def init_poolmanager(self, *args, **kwargs):
+                super().init_poolmanager(*args, ssl_context=context, **kwargs)
+
+            def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+                if verify == cafile:
+                    verify = True
+                if verify is not True or cert:
+                    # urllib3 writes verify_mode and CA files into the pool's SSLContext, which every
+                    # download shares; these requests get requests' own behaviour on a separate pool
+                    if not plain:
+                        plain.append(HTTPAdapter(pool_connections=4, pool_maxsize=4))
+                    return plain[0].send(request, stream=stream, timeout=timeout, verify=verify, cert=cert,
+                                         proxies=proxies)
+                return super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+
+            def cert_verify(self, conn, url, verify, cert):
+                # Only the default verification without a client cert gets here: the pool's context
+                # already checks against the CA bundle, loading it again per connection is what this saves
+                pass
+
+        return Adapter(pool_connections=self.pool_hosts, pool_maxsize=self.per_host)
+
+    # --- yt-dlp ---
+    def register_ytdlp(self):
+        """Make YoutubeDL instances created from now on share this pool (idempotent)."""
+        if self.ytdlp_registered:
+            return True
+        try:
+            import requests
+            import urllib3
+            from yt_dlp.networking._requests import RequestsHTTPAdapter, RequestsRH, RequestsSession
+            from yt_dlp.networking.common import register_preference, register_rh
+        except ImportError as e:
+            print(f"yt-dlp keeps its own connections: {e}")
+            return False
+        pool = self
+
+        class SharedRequestsRH(RequestsRH):
+            RH_NAME = 'requests (shared pool)'
+
+            def _create_instance(self, cookiejar, legacy_ssl_support=None):
+                # Everything that shapes the SSLContext or the socket picks the adapter
+                key = ('yt-dlp', self.verify, legacy_ssl_support, self.legacy_ssl_support, self.prefer_system_certs,
+                       self.source_address, tuple(sorted(self._client_cert.items())))
+                adapter = pool.shared_adapter(key, lambda: RequestsHTTPAdapter(
+                    ssl_context=self._make_sslcontext(legacy_ssl_support=legacy_ssl_support),
+                    source_address=self.source_address,
+                    max_retries=urllib3.util.retry.Retry(False),
+                    pool_connections=pool.pool_hosts,
+                    pool_maxsize=pool.per_host,
+                ))
+                session = RequestsSession()
+                session.adapters.clear()
+                session.headers = requests.models.CaseInsensitiveDict()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.cookies = cookiejar
+                session.trust_env = False
+                return session
+
+            def _close_instance(self, session):
+                # The adapter outlives this YoutubeDL; only the session goes
+                session.adapters.clear()
+                session.close()
+
+        register_rh(SharedRequestsRH)
+
+        @register_preference(SharedRequestsRH)
+        def shared_preference(rh, request):
+            return 100 # on top of the stock requests handler's own 100
+
+        self.ytdlp_registered = True
+        return True
+
+    # --- Stats ---
+    def stats(self):
+        with self.lock:
+            s = dict(self.stats_)
+        requests, connections = s['requests'], s['connections']
+        avg_connect = s['connect_s'] / connections if connections else 0.0
+        avg_full = s['tls_full_s'] / s['tls_full'] if s['tls_full'] else 0.0
+        avg_resumed = s['tls_resumed_s'] / s['tls_resumed'] if s['tls_resumed'] else 0.0
+        avg_dns = s['dns_s'] / s['dns_lookups'] if s['dns_lookups'] else 0.0
+        reused = max(0, requests - connections)
+        tls_share = (s['tls_full'] + s['tls_resumed']) / connections if connections else 0.0
+        # A reused connection skips connect and (for that share of connections) a full TLS handshake;
+        # a resumed handshake saves the difference; a DNS hit the average lookup
+        saved = (reused * (avg_connect + tls_share * avg_full)
+                 + s['tls_resumed'] * max(0.0, avg_full - avg_resumed)
+                 + s['dns_hits'] * avg_dns)
+        s.update({
+            'reused': reused,
+            'reuse_ratio': round(reused / requests, 3) if requests else 0.0,
+            'tls_resume_ratio': round(s['tls_resumed'] / (s['tls_full'] + s['tls_resumed']), 3) if tls_share else 0.0,
+            'dns_hit_ratio': round(s['dns_hits'] / (s['dns_hits'] + s['dns_lookups']), 3)
+            if s['dns_hits'] + s['dns_lookups'] else 0.0,
+            'saved_s': round(saved, 3),
+        })
+        for name in ('connect_s', 'dns_s', 'tls_full_s', 'tls_resumed_s'):
+            s[name] = round(s[name], 3)
+        return s
+
+    def reset_stats(self):
+        with self.lock:
+            for name in self.stats_:
+                self.stats_[name] = 0.0 if name.endswith('_s') else 0
+
+
+def _session_class():
+    import requests
+
+    class SharedSession(requests.Session):
+        def close(self):
+            # Session.close() would close the shared adapters with it
+            self.adapters.clear()
+    return SharedSession
+
+
+def format_stats(s):
+    """One line for logs and the CLI."""
+    return (f"{s['requests']} requests on {s['connections']} connections (reuse {s['reuse_ratio'] * 100:.0f}%), "
+            f"TLS {s['tls_full']} full / {s['tls_resumed']} resumed, DNS {s['dns_hits']} cached / "
+            f"{s['dns_lookups']} looked up, about {s['saved_s']:.2f}s of handshakes saved")
+
+
+POOL = NetPool() # the process-wide instance
+install = POOL.install
+session = POOL.session
+register_ytdlp = POOL.register_ytdlp
+stats = POOL.stats
@@ -0,0 +1,166 @@
+"""
+Connectivity and power awareness for the download scheduler.
+
+A provider reports the device's conditions as a dict:
+    connected   any network with internet access
+    unmetered   not charged per byte (Wi-Fi, Ethernet, unlimited plans)
+    cellular    the active network is mobile data
+    battery     charge in percent, None when unknown
+    charging    plugged in
+AndroidProvider asks ConnectivityManager and BatteryManager through pyjnius;
+StaticProvider returns whatever it was last told and stands in on desktops
+and in tests. NetworkPolicy turns conditions into a plan:
+    pause     no network, low battery, or metered data when set to pause
+    throttle  metered data: the global bandwidth cap drops to `metered_limit`
+    burst     unmetered and charging: `burst` extra worker slots
+    normal    anything else
+NetworkMonitor polls the provider (Android offers callbacks only through
+Java subclasses pyjnius cannot create) and tells its listeners when the
+plan changes.
+"""
+import threading
+
+from http_engine import format_bytes
+
+DEFAULT_CONDITIONS = {'connected': True, 'unmetered': True, 'cellular': False, 'battery': None, 'charging': True}
+METERED_ACTIONS = ('allow', 'throttle', 'pause')
+
+
+# --- Providers ---
+class StaticProvider:
+    """Conditions set by hand: a desktop is on unmetered mains power unless told otherwise."""
+    def __init__(self, **conditions):
+        self.state = dict(DEFAULT_CONDITIONS, **conditions)
+
+    def set(self, **conditions):
+        self.state.update(conditions)
+
+    def conditions(self):
+        return dict(self.state)
+
+
+class AndroidProvider:
+    """Active network capabilities and battery state, queried through pyjnius."""
+    def __init__(self):
+        from jnius import autoclass, cast
+        from platform_utils import get_android_context
+        Context = autoclass('android.content.Context')
+        self.caps = autoclass('android.net.NetworkCapabilities')
+        self.battery_manager = autoclass('android.os.BatteryManager')
+        context = get_android_context()
+        self.connectivity = cast('android.net.ConnectivityManager', context.getSystemService(Context.CONNECTIVITY_SERVICE))
+        self.battery = cast('android.os.BatteryManager', context.getSystemService(Context.BATTERY_SERVICE))
+
+    def conditions(self):
+        network = self.connectivity.getActiveNetwork()
+        caps = self.connectivity.getNetworkCapabilities(network) if network else None
+        connected = caps is not None and caps.hasCapability(self.caps.NET_CAPABILITY_INTERNET)
+        level = self.battery.getIntProperty(self.battery_manager.BATTERY_PROPERTY_CAPACITY)
+        return {
+            'connected': connected,
+            'unmetered': connected and caps.hasCapability(self.caps.NET_CAPABILITY_NOT_METERED),
+            'cellular': connected and caps.hasTransport(self.caps.TRANSPORT_CELLULAR),
+            # Integer.MIN_VALUE when the device cannot tell
+            'battery': level if 0 <= level <= 100 else None,
+            'charging': bool(self.battery.isCharging()),
+        }
+
+
+# --- Policy ---
+class NetworkPolicy:
+    def __init__(self, metered='throttle', metered_limit=512 * 1024, low_battery=15, burst=2):
+        self.metered = metered # one of METERED_ACTIONS
+        self.metered_limit = metered_limit # bytes/s while throttled
+        self.low_battery = low_battery # percent; at or below it, not charging, downloads pause
+        self.burst = burst # extra worker slots on unmetered power
+
+    def plan(self, c):
+        """{'mode', 'reason', 'limit' (bytes/s or None), 'boost' (extra slots)} for conditions c."""
+        if not c['connected']:
+            return _plan('pause', "No network")
+        if c['battery'] is not None and not c['charging'] and c['battery'] <= self.low_battery:
+            return _plan('pause', f"Battery at {c['battery']}%")
+        if not c['unmetered']:
+            network = "Mobile data" if c['cellular'] else "Metered network"
+            if self.metered == 'pause':
+                return _plan('pause', f"{network}: waiting for Wi-Fi")
+            if self.metered == 'throttle' and self.metered_limit:
+                return _plan('throttle', f"{network}: capped at {format_bytes(self.metered_limit)}/s",
+                             limit=self.metered_limit)
+            return _plan('normal', network)
+        if c['charging'] and self.burst:
+            return _plan('burst', f"Unmetered and charging: {self.burst} extra downloads", boost=self.burst)
+        return _plan('normal', "Unmetered")
+
+    def settings(self):
+        return {'metered': self.metered, 'metered_limit': self.metered_limit,
+                'low_battery': self.low_battery, 'burst': self.burst}
+
+    def apply_settings(self, settings):
+        metered = settings.get('metered', self.metered)
+        if metered not in METERED_ACTIONS:
+            raise ValueError(f"metered must be one of {', '.join(METERED_ACTIONS)}")
+        self.metered = metered
+        self.metered_limit = settings.get('metered_limit', self.metered_limit) or None
+        self.low_battery = int(settings.get('low_battery', self.low_battery))
+        self.burst = max(0, int(settings.get('burst', self.burst)))
+
+
+def _plan(mode, reason, limit=None, boost=0):
+    return {'mode': mode, 'reason': reason, 'limit': limit, 'boost': boost}
+
+
+# --- Monitor ---
+class NetworkMonitor:
+    """Polls `provider` every `interval` seconds and calls listeners(plan, conditions) when the plan changes."""
+    def __init__(self, provider=None, policy=None, interval=15.0):
+        self.provider = provider or StaticProvider()
+        self.policy = policy or NetworkPolicy()
+        self.interval = interval
+        self.listeners = []
+        self.conditions = dict(DEFAULT_CONDITIONS)
+        self.current = None
+        self.lock = threading.Lock() # the poll thread and refresh() callers
+        self.stopped = threading.Event()
+
+    def start(self):
+        self.refresh()
+        threading.Thread(target=self._poll, daemon=True, name="NetworkMonitor").start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def _poll(self):
+        while not self.stopped.wait(self.interval):
+            self.refresh()
+
+    def refresh(self, force=False):
+        """Query the provider now; listeners hear about the plan if it changed (or force)."""
+        with self.lock:
+            try:
+                self.conditions = self.provider.conditions()
+            except Exception as e:
+                # Keep the last known conditions rather than pausing on a failed query
+                print(f"Network monitor error: {e}")
+            plan = self.policy.plan(self.conditions)
+            if plan == self.current and not force:
+                return plan
+            self.current = plan
+            conditions = dict(self.conditions)
+        print(f"Network: {plan['mode']} ({plan['reason']})")
+        for listener in list(self.listeners):
+            try:
+                listener(plan, conditions)
+            except Exception as e:
+                print(f"Network listener error: {e}")
+        return plan
+
+    def set_policy(self, settings):
+        with self.lock:
+            self.policy.apply_settings(settings)
+        return self.refresh()
+
+    def snapshot(self):
+        with self.lock:
+            return {'conditions': dict(self.conditions), 'plan': self.current, 'policy': self.policy.settings()}
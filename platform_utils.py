@@ -0,0 +1,259 @@
+import os
+import threading
+import time
+import traceback
+
+# Same check kivy.utils.platform uses; kept Kivy-free so the headless service can import it
+IS_ANDROID = 'ANDROID_ARGUMENT' in os.environ or 'P4A_BOOTSTRAP' in os.environ
+
+
+def get_android_context():
+    """The running Activity, or the Service when called from the background service process."""
+    from jnius import autoclass
+    activity = autoclass('org.kivy.android.PythonActivity').mActivity
+    if activity:
+        return activity
+    return autoclass('org.kivy.android.PythonService').mService
+
+
+# Native Notification Helper for Android 12+
+def init_notification_channel():
+    if IS_ANDROID:
+        try:
+            from jnius import autoclass
+            Build = autoclass('android.os.Build$VERSION')
+            if Build.SDK_INT < 26: return
+
+            Context = autoclass('android.content.Context')
+            activity = get_android_context()
+            channel_id = "download_channel"
+
+            NotificationChannel = autoclass('android.app.NotificationChannel')
+            NotificationManager = autoclass('android.app.NotificationManager')
+
+            importance = NotificationManager.IMPORTANCE_HIGH
+            channel = NotificationChannel(channel_id, "Downloads", importance)
+            channel.setDescription("Download progress notifications")
+
+            notification_manager = activity.getSystemService(Context.NOTIFICATION_SERVICE)
+            notification_manager.createNotificationChannel(channel)
+        except Exception as e:
+            print(f"Channel Creation Error: {e}")
+
+
+def send_notification(title, message, progress=-1, notif_id=1):
+    if IS_ANDROID:
+        try:
+            from jnius import autoclass
+            Context = autoclass('android.content.Context')
+            PythonActivity = autoclass('org.kivy.android.PythonActivity')
+            activity = get_android_context()
+            channel_id = "download_channel"
+
+            # Ensure context is valid
+            if not activity:
+                print("Notification Error: No Activity Context")
+                return
+
+            # Use Native Builder (API 26+)
+            NotificationBuilder = autoclass('android.app.Notification$Builder')
+            builder = NotificationBuilder(activity, channel_id)
+            builder.setContentTitle(title)
+            builder.setContentText(message)
+            builder.setOnlyAlertOnce(True) # Prevent spamming popups on update
+
+            # Icon handling - Use App Icon
+            try:
+                app_icon = activity.getApplicationInfo().icon
+                builder.setSmallIcon(app_icon)
+            except Exception as e:
+                print(f"Icon Error: {e}")
+                builder.setSmallIcon(17301633) # Fallback
+
+            if progress >= 0:
+                builder.setProgress(100, int(progress), False)
+                builder.setOngoing(True)
+            else:
+                builder.setProgress(0, 0, False)
+                builder.setAutoCancel(True)
+                builder.setOngoing(False)
+
+            # PendingIntent to open app
+            try:
+                Intent = autoclass('android.content.Intent')
+                PendingIntent = autoclass('android.app.PendingIntent')
+                intent = Intent(activity, PythonActivity)
+                intent.setFlags(Intent.FLAG_ACTIVITY_SINGLE_TOP | Intent.FLAG_ACTIVITY_CLEAR_TOP)
+                FLAG_IMMUTABLE = 67108864 # PendingIntent.FLAG_IMMUTABLE
+                pending_intent = PendingIntent.getActivity(activity, 0, intent, FLAG_IMMUTABLE)
+                builder.setContentIntent(pending_intent)
+            except Exception as e:
+                print(f"PendingIntent Error: {e}")
+
+            notification_service = activity.getSystemService(Context.NOTIFICATION_SERVICE)
+            notification_service.notify(notif_id, builder.build())
+        except Exception as e:
+            print(f"Notification Error: {e}")
+            traceback.print_exc()
+
+
+def get_download_folder(fallback_dir=None):
+    if IS_ANDROID:
+        try:
+            from jnius import autoclass
+            Environment = autoclass('android.os.Environment')
+            Context = get_android_context()
+
+            # Check if storage is mounted
+            state = Environment.getExternalStorageState()
+            if not state == Environment.MEDIA_MOUNTED:
+                return Context.getExternalFilesDir(None).getAbsolutePath()
+
+            try:
+                # Preferred: Use standard Download directory via Environment
+                download_dir = Environment.getExternalStoragePublicDirectory(
+                    Environment.DIRECTORY_DOWNLOADS
+                ).getAbsolutePath()
+            except Exception:
+                # Fallback 1: Direct public path
+                download_dir = "/sdcard/Download"
+
+            # Ensure our subfolder exists - with robustness
+            try:
+                os.makedirs(download_dir, exist_ok=True)
+            except:
+                pass
+
+            final_path = os.path.join(download_dir, "downloads")
+            os.makedirs(final_path, exist_ok=True)
+            return final_path
+
+        except Exception as e:
+            print(f"Error getting download folder: {e}")
+            if fallback_dir: return fallback_dir
+            return '/sdcard/Download'
+    return os.path.join(os.getcwd(), 'downloads')
+
+
+# --- Share intents ---
+def shared_lines(intent):
+    """
+    Lines of text shared to the app with ACTION_SEND: the EXTRA_TEXT payload,
+    or a shared text file read line by line. None if intent shares nothing.
+    """
+    if not IS_ANDROID or intent is None:
+        return None
+    try:
+        from jnius import autoclass, cast
+        Intent = autoclass('android.content.Intent')
+        if intent.getAction() != Intent.ACTION_SEND:
+            return None
+        text = intent.getStringExtra(Intent.EXTRA_TEXT)
+        if text:
+            return text
+        stream = intent.getParcelableExtra(Intent.EXTRA_STREAM)
+        if stream is None:
+            return None
+        uri = cast('android.net.Uri', stream)
+        resolver = get_android_context().getContentResolver()
+        InputStreamReader = autoclass('java.io.InputStreamReader')
+        BufferedReader = autoclass('java.io.BufferedReader')
+        reader = BufferedReader(InputStreamReader(resolver.openInputStream(uri), 'UTF-8'))
+
+        def lines():
+            try:
+                while True:
+                    line = reader.readLine()
+                    if line is None:
+                        return
+                    yield line
+            finally:
+                reader.close()
+        return lines()
+    except Exception as e:
+        print(f"Share intent error: {e}")
+        return None
+
+
+# --- WakeLock ---
+class WakeLock:
+    """PARTIAL_WAKE_LOCK holder; a no-op off Android."""
+    def __init__(self, tag):
+        self.tag = tag
+        self.lock = None
+
+    def acquire(self):
+        if IS_ANDROID:
+            if self.lock:
+                return # Already has it
+            try:
+                from jnius import autoclass
+                Context = autoclass('android.content.Context')
+                PowerManager = autoclass('android.os.PowerManager')
+                pm = get_android_context().getSystemService(Context.POWER_SERVICE)
+                self.lock = pm.newWakeLock(PowerManager.PARTIAL_WAKE_LOCK, self.tag)
+                self.lock.acquire()
+                print("WakeLock Acquired")
+            except Exception as e:
+                print(f"WakeLock Error: {e}")
+
+    def release(self):
+        if IS_ANDROID and self.lock:
+            try:
+                if self.lock.isHeld():
+                    self.lock.release()
+                    self.lock = None
+                    print("WakeLock Released")
+            except Exception as e:
+                print(f"WakeLock Release Error: {e}")
+
+
+class TransferWakeLock:
+    """
+    Holds a wakelock only while bytes keep arriving: pulse() on every chunk
+    acquires it, and it is released once no chunk came for `grace` seconds.
+    pin()/unpin() keep it across byte-less CPU work such as an ffmpeg merge.
+    """
+    def __init__(self, acquire, release, grace=10.0):
+        self.acquire = acquire
+        self.release = release
+        self.grace = grace
+        self.held = False
+        self.pinned = 0
+        self.last = 0.0
+        # Pulses come from every worker thread; acquire/release run under it so the platform lock always matches held
+        self.lock = threading.Lock()
+
+    def pulse(self):
+        self.last = time.monotonic()
+        if not self.held:
+            with self.lock:
+                if self.held:
+                    return
+                self.held = True
+                self.acquire()
+                self._check_later(self.grace)
+
+    def pin(self):
+        with self.lock:
+            self.pinned += 1
+        self.pulse()
+
+    def unpin(self):
+        with self.lock:
+            self.pinned = max(0, self.pinned - 1)
+        self.last = time.monotonic()
+
+    def _check_later(self, delay):
+        timer = threading.Timer(delay, self._check)
+        timer.daemon = True
+        timer.start()
+
+    def _check(self):
+        with self.lock:
+            idle = time.monotonic() - self.last
+            if self.pinned or idle < self.grace:
+                self._check_later(self.grace - idle if not self.pinned else self.grace)
+                return
+            self.held = False
+            self.release()
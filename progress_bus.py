@@ -0,0 +1,71 @@
+import threading
+
+
+class ProgressBus:
+    """
+    Latest-value mailbox between download workers and the UI.
+    Workers publish() as often as they like; each task keeps only its newest
+    state. The UI calls drain() on a fixed interval and every subscriber gets
+    at most one callback per drain, so intermediate values are dropped.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.slots = {} # task_id: latest args tuple
+        self.listeners = {} # task_id: callback
+        self.watchers = [] # callback(task_id, *state) for every task, e.g. RPC subscribers
+        self.stats = {'published': 0, 'delivered': 0, 'dropped': 0}
+
+    def subscribe(self, task_id, callback):
+        with self.lock:
+            self.listeners[task_id] = callback
+
+    def unsubscribe(self, task_id):
+        with self.lock:
+            self.listeners.pop(task_id, None)
+            self.slots.pop(task_id, None)
+
+    def watch(self, callback):
+        with self.lock:
+            self.watchers.append(callback)
+
+    def unwatch(self, callback):
+        with self.lock:
+            if callback in self.watchers:
+                self.watchers.remove(callback)
+
+    def publish(self, task_id, *state):
+        with self.lock:
+            self.stats['published'] += 1
+            if task_id in self.slots:
+                self.stats['dropped'] += 1
+            self.slots[task_id] = state
+
+    def discard(self, task_id):
+        """Forget an undelivered update, e.g. once the task has finished."""
+        with self.lock:
+            if self.slots.pop(task_id, None) is not None:
+                self.stats['dropped'] += 1
+
+    def drain(self, *args):
+        # *args so it can be handed straight to Clock.schedule_interval
+        with self.lock:
+            slots, self.slots = self.slots, {}
+            callbacks = [(self.listeners.get(task_id), state) for task_id, state in slots.items()]
+            watchers = list(self.watchers)
+        for watcher in watchers:
+            for task_id, state in slots.items():
+                try:
+                    watcher(task_id, *state)
+                except Exception as e:
+                    print(f"Progress watcher error: {e}")
+        for callback, state in callbacks:
+            if callback is None:
+                with self.lock:
+                    self.stats['dropped'] += 1
+                continue
+            try:
+                callback(*state)
+            except Exception as e:
+                print(f"Progress callback error: {e}")
+            with self.lock:
+                self.stats['delivered'] += 1
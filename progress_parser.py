@@ -0,0 +1,193 @@
+import json
+import re
+import time
+from collections import namedtuple
+
+# One progress sample from a downloader subprocess. Sizes in bytes, speed in
+# bytes/s, eta in seconds; fields the tool did not report are None.
+# `connections` is aria2's CN (or yt-dlp's fragment concurrency when known),
+# `fragment` a (index, count) tuple for HLS/DASH downloads.
+ProgressEvent = namedtuple('ProgressEvent', [
+    'tool', 'key', 'percent', 'downloaded', 'total', 'speed', 'eta',
+    'connections', 'fragment', 'status',
+])
+
+# yt-dlp prints this prefix (via --progress-template) before a JSON progress dict
+YTDLP_PREFIX = '[progress-json] '
+YTDLP_PROGRESS_ARGS = ['--newline', '--progress-template', 'download:' + YTDLP_PREFIX + '%(progress)j']
+ARIA2_PROGRESS_ARGS = ['--summary-interval=1', '--console-log-level=warn', '--show-console-readout=true']
+
+_UNITS = {'': 1, 'B': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def format_event(event):
+    """Compact one-line summary for logs."""
+    from http_engine import format_bytes
+    parts = [f"[{event.tool}]"]
+    parts.append(f"{event.percent:.1f}%" if event.percent is not None else "?%")
+    if event.total:
+        parts.append(f"of {format_bytes(event.total)}")
+    if event.speed:
+        parts.append(f"at {format_bytes(event.speed)}/s")
+    if event.eta is not None:
+        parts.append(f"ETA {event.eta}s")
+    if event.connections:
+        parts.append(f"CN:{event.connections}")
+    if event.fragment:
+        parts.append(f"frag {event.fragment[0]}/{event.fragment[1]}")
+    return ' '.join(parts)
+
+
+def parse_size(text):
+    """'10.00MiB', '~ 1.2GiB', '400.0KiB', '512B' -> bytes (int), or None."""
+    match = re.match(r'~?\s*([\d.]+)\s*([KMGT]?)(?:i?B)?$', text.strip())
+    if not match:
+        return None
+    return int(float(match.group(1)) * _UNITS[match.group(2)])
+
+
+def parse_duration(text):
+    """'00:05', '1:02:03', '4m51s', '1h2m', '30s' -> seconds, or None."""
+    text = text.strip()
+    if ':' in text:
+        try:
+            seconds = 0
+            for part in text.split(':'):
+                seconds = seconds * 60 + int(part)
+            return seconds
+        except ValueError:
+            return None
+    match = re.match(r'(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?$', text)
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes, seconds = (int(g or 0) for g in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+# [download]  45.3% of ~ 10.00MiB at  1.23MiB/s ETA 00:05 (frag 3/10)
+_YTDLP_LINE = re.compile(
+    r'\[download\]\s+(?P<percent>[\d.]+)%\s+of\s+(?P<total>~?\s*[\d.]+\s*\w+)'
+    r'(?:\s+at\s+(?P<speed>[\d.]+\s*\w+)/s|\s+at\s+Unknown speed)?'
+    r'(?:\s+ETA\s+(?P<eta>[\d:]+|Unknown))?'
+    r'(?:\s+in\s+(?P<elapsed>[\d:]+))?'
+    r'(?:\s+\(frag\s+(?P<frag>\d+)/(?P<frags>\d+)\))?'
+)
+# [#2089b0 400.0KiB/33.2MiB(1%) CN:1 DL:115.7KiB ETA:4m51s]
+_ARIA2_ITEM = re.compile(
+    r'\[#(?P<gid>[0-9a-f]+)\s+(?P<done>[\d.]+\w*)/(?P<total>[\d.]+\w*)\((?P<percent>\d+)%\)'
+    r'(?:\s+CN:(?P<cn>\d+))?(?:\s+SD:(?P<sd>\d+))?(?:\s+DL:(?P<speed>[\d.]+\w*))?'
+    r'(?:\s+UL:[\d.]+\w*\([\d.]+\w*\))?(?:\s+ETA:(?P<eta>\w+))?\]'
+)
+
+
+def parse_ytdlp_line(line):
+    if line.startswith(YTDLP_PREFIX):
+        try:
+            d = json.loads(line[len(YTDLP_PREFIX):])
+        except ValueError:
+            return None
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        done = d.get('downloaded_bytes')
+        percent = (done * 100.0 / total) if done is not None and total else None
+        fragment = (d['fragment_index'], d['fragment_count']) if d.get('fragment_count') else None
+        return ProgressEvent(
+            'yt-dlp', d.get('filename') or d.get('tmpfilename'), percent, done,
+            int(total) if total else None, d.get('speed'), d.get('eta'), None, fragment,
+            d.get('status') or 'downloading'
+        )
+    match = _YTDLP_LINE.match(line)
+    if not match:
+        return None
+    total = parse_size(match.group('total'))
+    percent = float(match.group('percent'))
+    eta = match.group('eta')
+    fragment = (int(match.group('frag')), int(match.group('frags'))) if match.group('frag') else None
+    return ProgressEvent(
+        'yt-dlp', None, percent, int(total * percent / 100) if total else None, total,
+        parse_size(match.group('speed')) if match.group('speed') else None,
+        parse_duration(eta) if eta and eta != 'Unknown' else None,
+        None, fragment, 'finished' if match.group('elapsed') else 'downloading'
+    )
+
+
+def parse_aria2_line(line):
+    """aria2c readout lines can hold several downloads; returns a list of events."""
+    events = []
+    for match in _ARIA2_ITEM.finditer(line):
+        eta = match.group('eta')
+        events.append(ProgressEvent(
+            'aria2c', match.group('gid'), float(match.group('percent')),
+            parse_size(match.group('done')), parse_size(match.group('total')),
+            parse_size(match.group('speed')) if match.group('speed') else None,
+            parse_duration(eta) if eta else None,
+            int(match.group('cn')) if match.group('cn') else None,
+            None, 'downloading'
+        ))
+    return events
+
+
+class ProgressParser:
+    """
+    Streaming parser for yt-dlp and aria2c console output.
+    feed() takes raw text as it is read (\\r redraws included). Progress
+    lines become ProgressEvents handed to on_event at most once per
+    `min_interval` seconds per download; samples in between and repeats are
+    dropped, finishing events always go through. Other lines go to on_line
+    unchanged.
+    """
+    def __init__(self, on_event, on_line=None, min_interval=0.5):
+        self.on_event = on_event
+        self.on_line = on_line
+        self.min_interval = min_interval
+        self.buffer = ''
+        self.last_emit = {} # key: (monotonic time, event)
+        self.stats = {'lines': 0, 'progress_lines': 0, 'events': 0, 'dropped': 0}
+
+    def feed(self, text):
+        self.buffer += text
+        # Both \r (in-place redraw) and \n end a line
+        parts = re.split(r'[\r\n]', self.buffer)
+        self.buffer = parts.pop()
+        for line in parts:
+            self.feed_line(line)
+
+    def close(self):
+        if self.buffer:
+            self.feed_line(self.buffer)
+            self.buffer = ''
+
+    def feed_line(self, line):
+        line = line.strip()
+        if not line:
+            return
+        self.stats['lines'] += 1
+        events = parse_aria2_line(line) if line.startswith('[#') or line.startswith('[DL:') else []
+        if not events:
+            event = parse_ytdlp_line(line)
+            events = [event] if event else []
+        if not events:
+            if line.startswith('[DL:') or line.startswith('[#'):
+                self.stats['progress_lines'] += 1 # aria2 readout without per-download detail
+                return
+            if self.on_line:
+                self.on_line(line)
+            return
+        self.stats['progress_lines'] += 1
+        for event in events:
+            self._offer(event)
+
+    def _offer(self, event):
+        now = time.monotonic()
+        last = self.last_emit.get(event.key)
+        final = event.status == 'finished' or (event.percent is not None and event.percent >= 100)
+        if last is not None:
+            last_time, last_event = last
+            if event == last_event:
+                self.stats['dropped'] += 1 # nothing new
+                return
+            if not final and now - last_time < self.min_interval:
+                self.stats['dropped'] += 1
+                return
+        self.last_emit[event.key] = (now, event)
+        self.stats['events'] += 1
+        self.on_event(event)
@@ -0,0 +1,208 @@
+"""
+Automatic retries for failed downloads.
+
+classify() sorts an exception into
+    transient     timeouts, dropped connections, DNS hiccups, HTTP 408/5xx
+    rate_limited  HTTP 429 (or a 503 that says when to come back)
+    permanent     everything else: 4xx, unsupported/removed media, full disk
+RetryPolicy turns the attempt number into a delay (exponential backoff with
+jitter, never shorter than the server's Retry-After), and HostBreakers stops
+hammering a host whose downloads keep failing: after `threshold` transient
+failures in a row its tasks wait until a cooldown has passed.
+"""
+import errno
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+TRANSIENT, RATE_LIMITED, PERMANENT = 'transient', 'rate_limited', 'permanent'
+
+# Exception class names from requests, urllib3, http.client and yt-dlp's networking layer,
+# matched by name so classifying never imports them
+TRANSIENT_TYPES = {
+    'Timeout', 'ConnectTimeout', 'ReadTimeout', 'TimeoutError', 'timeout',
+    'ConnectionError', 'ChunkedEncodingError', 'ProtocolError', 'IncompleteRead',
+    'RemoteDisconnected', 'TransportError', 'gaierror', 'ContentTooShortError',
+    'SourceChanged', # http_engine: the file changed again right after a restart
+}
+# Not every platform defines every errno name
+TRANSIENT_ERRNOS = {getattr(errno, name, None) for name in (
+    'ECONNRESET', 'ECONNABORTED', 'ECONNREFUSED', 'ETIMEDOUT', 'ENETUNREACH', 'ENETDOWN', 'EHOSTUNREACH', 'EPIPE',
+)} - {None}
+PERMANENT_ERRNOS = {getattr(errno, name, None) for name in ('ENOSPC', 'EACCES', 'EROFS', 'EDQUOT', 'ENAMETOOLONG')} - {None}
+# Last resort for errors that only survive as text (aria2, re-raised yt-dlp messages)
+TRANSIENT_TEXT = re.compile(
+    r'timed? ?out|connection (?:reset|aborted|refused)|remote end closed|network is unreachable|'
+    r'temporary failure in name resolution|name or service not known|ended early|incomplete ?read|'
+    r'unable to download .*fragment|http error 5\d\d|returned http 5\d\d',
+    re.IGNORECASE
+)
+RATE_LIMITED_TEXT = re.compile(r'http error 429|returned http 429|too many requests', re.IGNORECASE)
+
+
+def _chain(error):
+    """error, then whatever caused it: yt-dlp's exc_info and cause, __cause__, __context__."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        exc_info = getattr(error, 'exc_info', None)
+        if isinstance(exc_info, tuple) and len(exc_info) > 1 and isinstance(exc_info[1], BaseException):
+            error = exc_info[1]
+        else:
+            cause = getattr(error, 'cause', None)
+            error = cause if isinstance(cause, BaseException) else (error.__cause__ or error.__context__)
+
+
+def _http_status(error):
+    """(status, headers) of an HTTP error from requests, urllib or yt-dlp, else (None, None)."""
+    response = getattr(error, 'response', None)
+    status = getattr(error, 'status', None) or getattr(error, 'code', None)
+    if response is not None:
+        status = status or getattr(response, 'status_code', None) or getattr(response, 'status', None)
+        headers = getattr(response, 'headers', None)
+    else:
+        headers = getattr(error, 'headers', None)
+    return (status, headers) if isinstance(status, int) else (None, None)
+
+
+def retry_after(headers):
+    """Seconds from a Retry-After header (delta or HTTP date), or None."""
+    value = headers.get('Retry-After') if headers is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify(error):
+    """(TRANSIENT | RATE_LIMITED | PERMANENT, seconds the server asked us to wait or None)."""
+    chain = list(_chain(error))
+    # An HTTP status anywhere in the chain is the most precise answer
+    for e in chain:
+        status, headers = _http_status(e)
+        if status is None:
+            continue
+        wait = retry_after(headers)
+        if status == 429:
+            return RATE_LIMITED, wait
+        if status == 503 and wait is not None:
+            return RATE_LIMITED, wait
+        if status in (408, 425) or status >= 500:
+            return TRANSIENT, wait
+        if status >= 400:
+            return PERMANENT, None
+    for e in chain:
+        if getattr(e, 'expected', False):
+            # yt-dlp ExtractorError the site meant to send: private, removed, geo-blocked...
+            return PERMANENT, None
+        if 'CERTIFICATE_VERIFY_FAILED' in str(e):
+            return PERMANENT, None
+        if type(e).__name__ in TRANSIENT_TYPES:
+            return TRANSIENT, None
+        if isinstance(e, OSError) and e.errno is not None:
+            if e.errno in PERMANENT_ERRNOS:
+                return PERMANENT, None
+            if e.errno in TRANSIENT_ERRNOS:
+                return TRANSIENT, None
+    text = str(error)
+    if RATE_LIMITED_TEXT.search(text):
+        return RATE_LIMITED, None
+    if TRANSIENT_TEXT.search(text):
+        return TRANSIENT, None
+    return PERMANENT, None
+
+
+def host_of(url):
+    return (urlparse(url).hostname or '').lower()
+
+
+class RetryPolicy:
+    """
+    Up to `max_retries` automatic retries per task. Delay n (from 1) is
+    base * 2**(n-1) capped at `cap`, half fixed and half random so tasks
+    that failed together do not come back together. A Retry-After is
+    always honored; rate limiting without one waits `rate_limit_delay`.
+    """
+    def __init__(self, max_retries=5, base=2.0, cap=600.0, rate_limit_delay=60.0, rng=None):
+        self.max_retries = max_retries
+        self.base = base
+        self.cap = cap
+        self.rate_limit_delay = rate_limit_delay
+        self.random = rng or random.Random()
+
+    def delay(self, retry, kind=TRANSIENT, server_wait=None):
+        backoff = min(self.cap, self.base * 2 ** (retry - 1))
+        delay = backoff / 2 + self.random.uniform(0, backoff / 2)
+        if server_wait is not None:
+            return max(delay, min(server_wait, 24 * 3600))
+        if kind == RATE_LIMITED:
+            # No word from the server on how long: back off well beyond a network blip
+            delay = max(delay, self.rate_limit_delay)
+        return delay
+
+    def next_retry(self, error, retries_so_far):
+        """(kind, delay in seconds) for another attempt, or (kind, None) to give up."""
+        kind, server_wait = classify(error)
+        if kind == PERMANENT or retries_so_far >= self.max_retries:
+            return kind, None
+        return kind, self.delay(retries_so_far + 1, kind, server_wait)
+
+
+class HostBreakers:
+    """
+    Per-host circuit breakers. `threshold` transient failures in a row open
+    a host's breaker for `cooldown` seconds (doubling each time it opens
+    again, up to `max_cooldown`); after that one attempt goes through, and a
+    success closes it.
+    """
+    def __init__(self, threshold=5, cooldown=60.0, max_cooldown=900.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.hosts = {} # host: {'failures': n, 'opened': count, 'until': monotonic time}
+        self.lock = threading.Lock() # workers report from their own threads
+
+    def wait_time(self, host):
+        """Seconds until host may be tried again (0 = go ahead)."""
+        with self.lock:
+            state = self.hosts.get(host)
+            if state is None or not state['until']:
+                return 0.0
+            remaining = state['until'] - time.monotonic()
+            if remaining <= 0:
+                # Half-open: attempts go through again, and the next failure reopens it
+                state['until'] = 0
+                state['failures'] = self.threshold - 1
+                return 0.0
+            return remaining
+
+    def record_success(self, host):
+        with self.lock:
+            self.hosts.pop(host, None)
+
+    def record_failure(self, host):
+        with self.lock:
+            state = self.hosts.setdefault(host, {'failures': 0, 'opened': 0, 'until': 0})
+            state['failures'] += 1
+            if state['failures'] < self.threshold:
+                return
+            cooldown = min(self.max_cooldown, self.cooldown * 2 ** state['opened'])
+            state['opened'] += 1
+            state['failures'] = 0
+            state['until'] = time.monotonic() + cooldown
+        print(f"Circuit open for {host}: pausing its downloads for {cooldown:.0f}s")
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            return {host: {'failures': s['failures'], 'open_for': round(max(0.0, s['until'] - now), 1)}
+                    for host, s in self.hosts.items()}
@@ -0,0 +1,262 @@
+import json
+import os
+import secrets
+import socket
+import socketserver
+import threading
+import time
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR = -32603
+UNAUTHORIZED = -32001
+
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def write_endpoint(path, port, token):
+    """Publish where the server listens; only this user may read the token."""
+    tmp_path = path + '.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'host': '127.0.0.1', 'port': port, 'token': token, 'pid': os.getpid()}, f)
+    os.replace(tmp_path, path)
+
+
+def read_endpoint(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # One per connection: newline-delimited JSON-RPC requests in, responses and notifications out
+    def setup(self):
+        super().setup()
+        self.send_lock = threading.Lock()
+        self.authed = False
+
+    def send(self, message):
+        data = (json.dumps(message) + '\n').encode('utf-8')
+        with self.send_lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+    def handle(self):
+        rpc = self.server.rpc
+        try:
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                response = rpc._handle(self, line)
+                if response is not None:
+                    self.send(response)
+        except (OSError, ValueError):
+            pass # client went away
+        finally:
+            rpc._drop_subscriber(self)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class JsonRpcServer:
+    """
+    Newline-delimited JSON-RPC 2.0 over a loopback TCP socket.
+    `methods` maps names to callables taking keyword params. Each connection
+    must first call `auth` with the token from the endpoint file; a
+    connection that calls `subscribe` then receives notify() broadcasts.
+    """
+    def __init__(self, methods, endpoint_path, host='127.0.0.1', port=0):
+        self.methods = dict(methods)
+        self.endpoint_path = endpoint_path
+        self.token = secrets.token_hex(16)
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.server = _Server((host, port), _Handler)
+        self.server.rpc = self
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True, name="JsonRpcServer")
+        self.thread.start()
+        write_endpoint(self.endpoint_path, self.port, self.token)
+        print(f"JSON-RPC listening on 127.0.0.1:{self.port}")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        try:
+            os.remove(self.endpoint_path)
+        except OSError:
+            pass
+
+    def notify(self, method, params):
+        """Push a notification to every subscribed connection."""
+        with self.lock:
+            subscribers = list(self.subscribers)
+        message = {'jsonrpc': '2.0', 'method': method, 'params': params}
+        for handler in subscribers:
+            try:
+                handler.send(message)
+            except OSError:
+                self._drop_subscriber(handler)
+
+    def _drop_subscriber(self, handler):
+        with self.lock:
+            self.subscribers.discard(handler)
+
+    def _handle(self, handler, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return _error(None, PARSE_ERROR, "Parse error")
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            return _error(None, INVALID_REQUEST, "Invalid request")
+        request_id = request.get('id')
+        method = request['method']
+        params = request.get('params') or {}
+
+        try:
+            if method == 'auth':
+                handler.authed = secrets.compare_digest(str(params.get('token', '')), self.token)
+                if not handler.authed:
+                    raise RpcError(UNAUTHORIZED, "Bad token")
+                result = True
+            elif not handler.authed:
+                raise RpcError(UNAUTHORIZED, "Not authenticated")
+            elif method == 'subscribe':
+                with self.lock:
+                    self.subscribers.add(handler)
+                result = True
+            elif method in self.methods:
+                result = self.methods[method](**params)
+            else:
+                raise RpcError(METHOD_NOT_FOUND, f"Unknown method: {method}")
+        except RpcError as e:
+            return _error(request_id, e.code, str(e))
+        except Exception as e:
+            print(f"RPC {method} error: {e}")
+            return _error(request_id, INTERNAL_ERROR, str(e))
+
+        if request_id is None:
+            return None # notification from the client, no reply
+        return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+
+
+def _error(request_id, code, message):
+    return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}}
+
+
+class JsonRpcClient:
+    """Client for JsonRpcServer; finds host, port and token in the endpoint file."""
+    def __init__(self, endpoint_path, timeout=10):
+        self.endpoint_path = endpoint_path
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.sock = None
+        self.reader = None
+        self.next_id = 0
+        self.closed = False
+
+    def _connect(self):
+        endpoint = read_endpoint(self.endpoint_path)
+        sock = socket.create_connection((endpoint['host'], endpoint['port']), timeout=self.timeout)
+        reader = sock.makefile('rb')
+        _send(sock, {'jsonrpc': '2.0', 'id': 0, 'method': 'auth', 'params': {'token': endpoint['token']}})
+        _result(reader.readline())
+        return sock, reader
+
+    def call(self, method, **params):
+        with self.lock:
+            # One reconnect covers a restarted service (new port and token)
+            for attempt in (0, 1):
+                try:
+                    if self.sock is None:
+                        self.sock, self.reader = self._connect()
+                    self.next_id += 1
+                    _send(self.sock, {'jsonrpc': '2.0', 'id': self.next_id, 'method': method, 'params': params})
+                    line = self.reader.readline()
+                    if not line:
+                        raise ConnectionError("Connection closed")
+                    return _result(line)
+                except (OSError, ValueError):
+                    self._close_socket()
+                    if attempt:
+                        raise
+
+    def wait_ready(self, timeout=10):
+        """Poll until the service answers, e.g. right after starting it."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.call('ping')
+            except (OSError, ValueError):
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+
+    def subscribe(self, callback):
+        """Run callback(method, params) for each notification on a background thread, reconnecting as needed."""
+        thread = threading.Thread(target=self._listen, args=(callback,), daemon=True, name="JsonRpcListener")
+        thread.start()
+        return thread
+
+    def _listen(self, callback):
+        delay = 0.5
+        while not self.closed:
+            try:
+                sock, reader = self._connect()
+                sock.settimeout(None) # notifications can be far apart
+                _send(sock, {'jsonrpc': '2.0', 'id': 1, 'method': 'subscribe'})
+                _result(reader.readline())
+                callback('connected', {})
+                delay = 0.5
+                for line in reader:
+                    if self.closed:
+                        break
+                    message = json.loads(line)
+                    if 'method' in message:
+                        callback(message['method'], message.get('params') or {})
+                sock.close()
+            except (OSError, ValueError) as e:
+                print(f"RPC listener: {e}")
+            if not self.closed:
+                time.sleep(delay)
+                delay = min(delay * 2, 10)
+
+    def _close_socket(self):
+        if self.sock is not None:
+            try: self.sock.close()
+            except OSError: pass
+        self.sock = None
+        self.reader = None
+
+    def close(self):
+        self.closed = True
+        with self.lock:
+            self._close_socket()
+
+
+def _send(sock, message):
+    sock.sendall((json.dumps(message) + '\n').encode('utf-8'))
+
+
+def _result(line):
+    if not line:
+        raise ConnectionError("Connection closed")
+    message = json.loads(line)
+    if 'error' in message:
+        raise RpcError(message['error'].get('code'), message['error'].get('message'))
+    return message.get('result')
@@ -0,0 +1,222 @@
+"""
+Headless download service.
+
+Android runs this file as the foreground service declared in buildozer.spec
+(`services = Downloader:service.py:foreground`); the app passes its data
+directory as the service argument. On a desktop it doubles as a CLI:
+
+    python service.py serve [--data-dir DIR] [--download-dir DIR]
+    python service.py add URL [--format audio] [--quality 720p] [--fragments 8]
+    python service.py import FILE|- [--format audio] [--quality 720p]   (one link per line)
+    python service.py list [--status Completed]
+    python service.py pause|resume|remove TASK_ID
+    python service.py limit RATE [--task TASK_ID] [--weight W]   (RATE like 512K, 2M, 0 = none)
+    python service.py schedule 01:00-07:00=0 07:00-01:00=1M
+    python service.py fragments N [--task TASK_ID]
+    python service.py watch
+    python service.py metrics [--task TASK_ID] [--since HOURS] [--format jsonl|prom|text]
+    python service.py network [--metered allow|throttle|pause] [--metered-limit RATE] [--low-battery PCT] [--burst N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from audio_pipeline import format_report
+from bandwidth import parse_rate
+from bulk_import import summary
+from platform_utils import IS_ANDROID
+from telemetry import format_row
+
+
+def serve(data_dir, download_dir=None, port=0, ffmpeg_location=None):
+    from download_service import DownloadService
+    from platform_utils import WakeLock, init_notification_channel, send_notification
+
+    # Fix SSL on Android
+    try:
+        import certifi
+        os.environ['SSL_CERT_FILE'] = certifi.where()
+    except ImportError:
+        pass
+
+    network = None
+    if IS_ANDROID:
+        init_notification_channel()
+        try:
+            from network_monitor import AndroidProvider, NetworkMonitor
+            network = NetworkMonitor(AndroidProvider())
+        except Exception as e:
+            print(f"Network monitor disabled: {e}")
+    service = DownloadService(
+        data_dir,
+        download_dir=download_dir,
+        notifier=send_notification if IS_ANDROID else None,
+        wakelock=WakeLock("DownloadService:WakeLock"),
+        network=network,
+        ffmpeg_location=ffmpeg_location
+    )
+    service.serve(port=port)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+
+
+def android_main():
+    # PYTHON_SERVICE_ARGUMENT is whatever the app passed to ServiceDownloader.start()
+    args = json.loads(os.environ.get('PYTHON_SERVICE_ARGUMENT') or '{}')
+    data_dir = args.get('data_dir') or os.getcwd()
+    serve(data_dir, download_dir=args.get('download_dir'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless download service")
+    parser.add_argument('--data-dir', default=os.getcwd(), help="where downloads.db and rpc.json live")
+    sub = parser.add_subparsers(dest='command')
+
+    serve_cmd = sub.add_parser('serve')
+    serve_cmd.add_argument('--download-dir')
+    serve_cmd.add_argument('--port', type=int, default=0)
+    serve_cmd.add_argument('--ffmpeg', help="ffmpeg binary or folder (default: from PATH)")
+
+    add_cmd = sub.add_parser('add')
+    add_cmd.add_argument('url')
+    add_cmd.add_argument('--format', default='video', choices=['video', 'audio'])
+    add_cmd.add_argument('--quality', default='best')
+    add_cmd.add_argument('--priority', type=int, default=0)
+    add_cmd.add_argument('--fragments', type=int, help="parallel HLS/DASH fragments (default: global setting)")
+
+    import_cmd = sub.add_parser('import')
+    import_cmd.add_argument('file', help="text file with links, or - for stdin")
+    import_cmd.add_argument('--format', default='video', choices=['video', 'audio'])
+    import_cmd.add_argument('--quality', default='best')
+    import_cmd.add_argument('--priority', type=int, default=0)
+    import_cmd.add_argument('--fragments', type=int)
+
+    list_cmd = sub.add_parser('list')
+    list_cmd.add_argument('--status')
+    list_cmd.add_argument('--limit', type=int, default=50)
+
+    for name in ('pause', 'resume', 'remove'):
+        sub.add_parser(name).add_argument('task_id', type=int)
+    limit_cmd = sub.add_parser('limit')
+    limit_cmd.add_argument('rate', help="bytes/s with K/M/G suffix; 0 removes the cap")
+    limit_cmd.add_argument('--task', type=int, help="cap one task instead of the whole app")
+    limit_cmd.add_argument('--weight', type=float, help="share weight for --task (default 1)")
+
+    schedule_cmd = sub.add_parser('schedule')
+    schedule_cmd.add_argument('entries', nargs='*', help="HH:MM-HH:MM=RATE; no entries clears the schedule")
+
+    fragments_cmd = sub.add_parser('fragments')
+    fragments_cmd.add_argument('count', type=int, help="parallel HLS/DASH fragments; 0 with --task resets it")
+    fragments_cmd.add_argument('--task', type=int)
+
+    sub.add_parser('watch')
+    sub.add_parser('stats')
+    metrics_cmd = sub.add_parser('metrics')
+    metrics_cmd.add_argument('--task', type=int)
+    metrics_cmd.add_argument('--since', type=float, help="only tasks finished in the last HOURS")
+    metrics_cmd.add_argument('--limit', type=int)
+    metrics_cmd.add_argument('--format', default='text', choices=['text', 'jsonl', 'prom'])
+    network_cmd = sub.add_parser('network', help="show or change how connectivity and battery steer downloads")
+    network_cmd.add_argument('--metered', choices=['allow', 'throttle', 'pause'], help="on mobile data and metered Wi-Fi")
+    network_cmd.add_argument('--metered-limit', help="cap while throttled, like 512K")
+    network_cmd.add_argument('--low-battery', type=int, help="pause at or below this percent unless charging")
+    network_cmd.add_argument('--burst', type=int, help="extra parallel downloads on unmetered Wi-Fi while charging")
+
+    args = parser.parse_args(argv)
+    if args.command in (None, 'serve'):
+        serve(args.data_dir, getattr(args, 'download_dir', None), getattr(args, 'port', 0), getattr(args, 'ffmpeg', None))
+        return
+
+    from rpc import JsonRpcClient
+    client = JsonRpcClient(os.path.join(args.data_dir, 'rpc.json'))
+    try:
+        if args.command == 'add':
+            task_id = client.call('add', url=args.url, format=args.format, quality=args.quality, priority=args.priority,
+                                  fragments=args.fragments)
+            print(f"Added task {task_id}")
+        elif args.command == 'import':
+            # The service opens local files itself; stdin is sent as text
+            source = {'text': sys.stdin.read()} if args.file == '-' else {'path': os.path.abspath(args.file)}
+            result = client.call('import_links', format=args.format, quality=args.quality, priority=args.priority,
+                                 fragments=args.fragments, **source)
+            for text, reason in result['errors']:
+                print(f"Skipped {text}: {reason}")
+            print(summary(result))
+        elif args.command == 'list':
+            for task in client.call('list', status=args.status, limit=args.limit):
+                print(f"{task['id']:>5}  {task['status']:<12} {task['progress'] or 0:5.1f}%  {task['title'] or task['url']}")
+        elif args.command in ('pause', 'resume', 'remove'):
+            client.call(args.command, task_id=args.task_id)
+        elif args.command == 'limit':
+            rate = parse_rate(args.rate)
+            if args.task is None:
+                client.call('set_global_limit', limit=rate)
+            else:
+                client.call('set_task_limit', task_id=args.task, limit=rate)
+                if args.weight:
+                    client.call('set_task_weight', task_id=args.task, weight=args.weight)
+            print(json.dumps(client.call('bandwidth'), indent=2))
+        elif args.command == 'schedule':
+            schedule = []
+            for entry in args.entries:
+                span, rate = entry.split('=')
+                start, end = span.split('-')
+                schedule.append({'start': start, 'end': end, 'limit': parse_rate(rate)})
+            client.call('set_schedule', schedule=schedule)
+        elif args.command == 'fragments':
+            if args.task is None:
+                client.call('set_fragments', fragments=args.count)
+            else:
+                client.call('set_task_fragments', task_id=args.task, fragments=args.count)
+        elif args.command == 'stats':
+            print(json.dumps(client.call('stats'), indent=2))
+        elif args.command == 'metrics':
+            since = time.time() - args.since * 3600 if args.since else None
+            if args.format == 'text':
+                for row in client.call('metrics', task_id=args.task, since=since, limit=args.limit):
+                    print(f"{row['task_id']:>5}  {format_row(row)}")
+            else:
+                sys.stdout.write(client.call('metrics', task_id=args.task, since=since, limit=args.limit,
+                                             format=args.format))
+        elif args.command == 'network':
+            settings = {'metered': args.metered, 'low_battery': args.low_battery, 'burst': args.burst}
+            if args.metered_limit is not None:
+                settings['metered_limit'] = parse_rate(args.metered_limit) or 0
+            if any(value is not None for value in settings.values()):
+                client.call('set_network_policy', **settings)
+            snapshot = client.call('network')
+            if snapshot is None:
+                print("No network monitor in this service (Android only)")
+            else:
+                print(json.dumps(snapshot, indent=2))
+        elif args.command == 'watch':
+            def show(method, params):
+                if method == 'progress':
+                    print(f"[{params['task_id']}] {params['progress']:.1f}% {params['speed']}")
+                elif method == 'state':
+                    print(f"[{params['task_id']}] {params['state']} {params.get('title') or params.get('message') or ''}")
+                    if params.get('audio'):
+                        print(f"[{params['task_id']}] audio: {format_report(params['audio'])}")
+            client.subscribe(show)
+            while True:
+                time.sleep(1)
+    except FileNotFoundError:
+        sys.exit(f"No service running for {args.data_dir} (start one with 'serve')")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    if IS_ANDROID and 'PYTHON_SERVICE_ARGUMENT' in os.environ:
+        android_main()
+    else:
+        main()
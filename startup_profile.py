@@ -0,0 +1,152 @@
+"""
+Startup profiling.
+
+main.py times its startup phases with StartupTimer and prints them once
+the main screen is up. Run this file for a headless report (no window):
+
+    python startup_profile.py [--db downloads.db] [--top 15]
+
+1. import time of every module main.py imports before the first frame,
+   each measured in a fresh interpreter with `python -X importtime`, plus
+   the heaviest modules they pull in;
+2. the modules main.py only imports on demand (Files tab, dialogs, ...);
+3. the non-UI startup work: opening the database, the info cache and the
+   download manager, and the first queries the Home and Files tabs run.
+"""
+import time
+
+
+class StartupTimer:
+    """Wall time of named startup phases, each measured from the previous mark."""
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+        self.phases = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def report(self):
+        phases = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases)
+        print(f"Startup: {phases} (total {(self.last - self.start) * 1000:.0f}ms)")
+
+
+# --- Headless report ---
+def startup_imports(path='main.py'):
+    """(eager, deferred) module names imported by main.py: at module level vs inside functions."""
+    import ast
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    eager, deferred = [], []
+
+    def visit(node, in_function):
+        for child in ast.iter_child_nodes(node):
+            names = []
+            if isinstance(child, ast.Import):
+                names = [alias.name for alias in child.names]
+            elif isinstance(child, ast.ImportFrom) and child.module and not child.level:
+                names = [child.module]
+            target = deferred if in_function else eager
+            target.extend(name for name in names if name not in target)
+            visit(child, in_function or isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)))
+
+    visit(tree, False)
+    return eager, [name for name in deferred if name not in eager]
+
+
+def import_profile(module):
+    """`python -X importtime -c 'import module'` in a fresh interpreter: {name: (self_us, cumulative_us)} or None."""
+    import os
+    import subprocess
+    import sys
+    # No window provider by that name: kivy.core.window is imported without opening a window
+    env = dict(os.environ, KIVY_NO_ARGS='1', KIVY_NO_CONSOLELOG='1', KIVY_NO_FILELOG='1', KIVY_WINDOW='none')
+    run = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}' if module else 'pass'],
+                         capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if run.returncode != 0:
+        return None
+    timings = {}
+    for line in run.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def phase_profile(db_path):
+    """Time the startup work that does not need a window, against a copy of db_path (or an empty database)."""
+    import os
+    import shutil
+    import tempfile
+    phases = []
+    work = tempfile.mkdtemp(prefix='startup_profile_')
+    try:
+        path = os.path.join(work, 'downloads.db')
+        if db_path:
+            shutil.copy(db_path, path)
+        timer = StartupTimer()
+        from database import DBManager
+        from dedup import DedupIndex
+        timer.mark("import database/dedup")
+        db = DBManager(path)
+        DedupIndex(db)
+        timer.mark("open database")
+        from info_cache import InfoCache
+        cache = InfoCache(os.path.join(work, 'info_cache.db'))
+        timer.mark("info cache")
+        from download_service import DownloadManager
+        from progress_bus import ProgressBus
+        timer.mark("import download manager")
+        DownloadManager(db, ProgressBus(), lambda: work, info_cache=cache)
+        timer.mark("download manager")
+        tasks = db.get_tasks(['Pending', 'Downloading', 'Paused', 'Error'], top_level_only=True)
+        timer.mark(f"Home tab query ({len(tasks)} rows)")
+        rows, _ = db.get_tasks_page('Completed', limit=40, files_only=True)
+        timer.mark(f"Files tab first page ({len(rows)} rows)")
+        phases = timer.phases
+        db.close()
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return phases
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Headless startup report for main.py")
+    parser.add_argument('--db', help="profile against a copy of this downloads.db (default: empty database)")
+    parser.add_argument('--top', type=int, default=15, help="heaviest transitive imports to list")
+    args = parser.parse_args()
+
+    eager, deferred = startup_imports()
+    print(f"Imported before the first frame ({len(eager)} modules):")
+    interpreter = import_profile(None) # loaded by every Python process (site, encodings, ...)
+    heaviest = {}
+    for module in eager:
+        timings = import_profile(module)
+        if timings is None:
+            print(f"  {module:<40} not installed / fails to import")
+            continue
+        _, cumulative_us = timings.get(module, (0, 0))
+        print(f"  {module:<40} {cumulative_us / 1000:8.1f}ms")
+        for name, (self_us, _) in timings.items():
+            if name not in interpreter:
+                heaviest[name] = max(heaviest.get(name, 0), self_us)
+    # Modules shared between entries are only loaded once, so sum self times instead of cumulative ones
+    total = sum(heaviest.values())
+    print(f"  {'all of the above, each module once':<40} {total / 1000:8.1f}ms\n")
+
+    print("Heaviest modules on the startup path (self time):")
+    for name, self_us in sorted(heaviest.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<40} {self_us / 1000:8.1f}ms")
+
+    print(f"\nImported on demand ({len(deferred)}): {', '.join(deferred)}\n")
+
+    print("Startup work without a window:")
+    for name, seconds in phase_profile(args.db):
+        print(f"  {name:<40} {seconds * 1000:8.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+Per-task download telemetry.
+
+TaskMetrics follows one download attempt through its phases:
+
+    queue        added to the scheduler -> a worker picks it up
+    extract      yt-dlp info extraction (0 on an info cache hit)
+    connect      transfer started -> first byte (DNS, TLS, redirects, server think time)
+    transfer     first byte -> last byte
+    merge        yt-dlp's Merger (separate video + audio into one file)
+    postprocess  every other postprocessor (audio extraction, remux, ...)
+    hash         content hash for deduplication
+
+plus bytes, average/peak throughput, retries and the CPU time of
+postprocessing (ffmpeg included). The row is stored in task_metrics (one
+per task, latest attempt) and exported as JSON lines or Prometheus text.
+"""
+import json
+import threading
+import time
+
+from audio_pipeline import CpuMeter
+from http_engine import format_bytes
+
+PHASES = ('queue', 'extract', 'connect', 'transfer', 'merge', 'postprocess', 'hash')
+PEAK_WINDOW = 1.0 # seconds of transfer that make up one throughput sample
+
+
+class TaskMetrics:
+    """Collects one attempt's numbers; called from the worker thread (and yt-dlp's hooks on it)."""
+    def __init__(self, task_id, queued_at=None):
+        self.task_id = task_id
+        self.started = time.time()
+        self.engine = None
+        self.info_cached = False
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        if queued_at:
+            self.seconds['queue'] = max(0.0, self.started - queued_at)
+        self.bytes = 0
+        self.peak_bps = 0.0
+        self.retries = 0
+        self.pp_cpu = 0.0
+        self.transfer_start = None
+        self.first_byte = None
+        self.last_byte = None
+        self.window = None # (time, bytes) at the start of the current throughput sample
+        self.running = {} # postprocessor name: (start time, CpuMeter)
+        self.base = None # first running total reported by an engine that resumes on its own
+        self.lock = threading.Lock() # segment threads report bytes concurrently
+
+    # --- Phases ---
+    def timed(self, phase):
+        """Context manager adding the time spent inside it to phase."""
+        return _Timed(self, phase)
+
+    def begin_transfer(self):
+        if self.transfer_start is None:
+            self.transfer_start = time.monotonic()
+
+    def add_bytes(self, count):
+        """count new bytes arrived (the same numbers the bandwidth limiter sees)."""
+        if count > 0:
+            with self.lock:
+                self._set_bytes(self.bytes + count)
+
+    def track_total(self, done):
+        """Engines that only report a running total, including what earlier attempts fetched."""
+        if self.base is None:
+            self.base = done
+        with self.lock:
+            self._set_bytes(done - self.base)
+
+    def _set_bytes(self, total):
+        now = time.monotonic()
+        if self.first_byte is None:
+            if total <= 0:
+                return
+            self.begin_transfer()
+            self.first_byte = now
+            self.window = (now, self.bytes)
+        self.bytes = total
+        self.last_byte = now
+        start, start_bytes = self.window
+        if now - start >= PEAK_WINDOW:
+            self.peak_bps = max(self.peak_bps, (total - start_bytes) / (now - start))
+            self.window = (now, total)
+
+    def postprocessor_hook(self, d):
+        """yt-dlp postprocessor_hooks entry: times each postprocessor and its CPU use."""
+        name = d.get('postprocessor') or 'postprocess'
+        if d['status'] == 'started':
+            self.running[name] = (time.monotonic(), CpuMeter())
+        elif d['status'] == 'finished' and name in self.running:
+            self._end_postprocessor(name)
+
+    def _end_postprocessor(self, name):
+        start, meter = self.running.pop(name)
+        self.seconds['merge' if name == 'Merger' else 'postprocess'] += time.monotonic() - start
+        self.pp_cpu += meter.elapsed()
+
+    def log_message(self, msg):
+        # yt-dlp reports every retry (HTTP, fragment, extractor) as "... Retrying (n/m)..."
+        if 'Retrying' in msg:
+            self.retries += 1
+
+    # --- Result ---
+    def row(self, status, error=None):
+        # A postprocessor that raised never reported 'finished'; it ran until now
+        for name in list(self.running):
+            self._end_postprocessor(name)
+        if self.first_byte is not None:
+            self.seconds['connect'] = self.first_byte - self.transfer_start
+            self.seconds['transfer'] = self.last_byte - self.first_byte
+        transfer = self.seconds['transfer']
+        avg = self.bytes / transfer if transfer > 0 else 0.0
+        row = {
+            'engine': self.engine,
+            'status': status,
+            'started': self.started,
+            'finished': time.time(),
+            'info_cached': int(self.info_cached),
+            'bytes': self.bytes,
+            'avg_bps': round(avg, 1),
+            # Transfers shorter than one sample window only have their average
+            'peak_bps': round(max(self.peak_bps, avg), 1),
+            'retries': self.retries,
+            'pp_cpu_s': round(self.pp_cpu, 3),
+            'error': error,
+        }
+        row.update((f'{phase}_s', round(seconds, 3)) for phase, seconds in self.seconds.items())
+        return row
+
+
+class _Timed:
+    def __init__(self, metrics, phase):
+        self.metrics = metrics
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self.metrics
+
+    def __exit__(self, *exc):
+        self.metrics.seconds[self.phase] += time.monotonic() - self.start
+        return False
+
+
+def slowest_phase(row):
+    return max(PHASES, key=lambda phase: row[f'{phase}_s'] or 0)
+
+
+def format_row(row):
+    """One line for logs and the stats view."""
+    phases = " ".join(f"{phase} {row[f'{phase}_s']:.1f}s" for phase in PHASES if row[f'{phase}_s'])
+    return (f"{row['engine'] or '?'} {row['status']}: {phases or 'no phases'}; {format_bytes(row['bytes'] or 0)} "
+            f"avg {format_bytes(row['avg_bps'] or 0)}/s peak {format_bytes(row['peak_bps'] or 0)}/s, "
+            f"{row['retries']} retries, postprocess CPU {row['pp_cpu_s'] or 0:.2f}s")
+
+
+# --- Export ---
+def export_jsonl(rows, out):
+    """One JSON object per task, for fleet analysis."""
+    count = 0
+    for row in rows:
+        out.write(json.dumps(dict(row), sort_keys=True) + '\n')
+        count += 1
+    return count
+
+
+def prometheus_text(summary):
+    """Prometheus text exposition of DBManager.metrics_summary()."""
+    lines = [
+        '# HELP downloads_total Download attempts by final status and engine.',
+        '# TYPE downloads_total counter',
+    ]
+    lines += [f'downloads_total{{status="{s["status"]}",engine="{s["engine"] or "unknown"}"}} {s["count"]}'
+              for s in summary['by_status']]
+    lines += [
+        '# HELP download_phase_seconds Time spent per download phase.',
+        '# TYPE download_phase_seconds summary',
+    ]
+    for phase in PHASES:
+        lines.append(f'download_phase_seconds_sum{{phase="{phase}"}} {summary["phase_sum"][phase]:.3f}')
+        lines.append(f'download_phase_seconds_count{{phase="{phase}"}} {summary["count"]}')
+    lines += [
+        '# HELP download_bytes_total Bytes received by downloads.',
+        '# TYPE download_bytes_total counter',
+        f'download_bytes_total {summary["bytes"]}',
+        '# HELP download_peak_bytes_per_second Highest one-second throughput of any download.',
+        '# TYPE download_peak_bytes_per_second gauge',
+        f'download_peak_bytes_per_second {summary["peak_bps"]:.1f}',
+        '# HELP download_retries_total Retries reported while downloading.',
+        '# TYPE download_retries_total counter',
+        f'download_retries_total {summary["retries"]}',
+        '# HELP download_postprocess_cpu_seconds_total CPU time of postprocessing, ffmpeg included.',
+        '# TYPE download_postprocess_cpu_seconds_total counter',
+        f'download_postprocess_cpu_seconds_total {summary["pp_cpu_s"]:.3f}',
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def summary_text(summary, recent):
+    """Plain-text stats view: totals, where the time goes, and the latest tasks."""
+    if not summary['count']:
+        return "No downloads measured yet."
+    total = sum(summary['phase_sum'].values()) or 1
+    lines = [
+        f"{summary['count']} downloads, {format_bytes(summary['bytes'])}, peak {format_bytes(summary['peak_bps'])}/s, "
+        f"{summary['retries']} retries",
+        "Time spent: " + ", ".join(
+            f"{phase} {summary['phase_sum'][phase] / total * 100:.0f}%" for phase in PHASES if summary['phase_sum'][phase]
+        ),
+        "",
+    ]
+    for row in recent:
+        lines.append(f"#{row['task_id']} (slowest: {slowest_phase(row)}) {format_row(row)}")
+    return "\n".join(lines)